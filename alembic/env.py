@@ -9,7 +9,7 @@ from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 from app.core.config import settings
-from app.core.database import Base
+from app.core.database import Base, _ensure_asyncpg_url
 
 # Import all models to ensure they are registered
 from app.models import education
@@ -34,9 +34,9 @@ target_metadata = Base.metadata
 
 
 def get_url():
-    """Get database URL from settings"""
+    """Get sync database URL from settings (offline mode)"""
     # Use sync URL for Alembic
-    url = settings.database_url
+    url = settings.DATABASE_URL
     # Convert async URL to sync URL for Alembic
     if url.startswith("postgresql+asyncpg://"):
         url = url.replace("postgresql+asyncpg://", "postgresql://")
@@ -86,7 +86,8 @@ async def run_async_migrations() -> None:
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
-        url=get_url(),
+        url=_ensure_asyncpg_url(settings.DATABASE_URL),
+        connect_args={"statement_cache_size": 0},  # Supabase pooler
     )
 
     async with connectable.connect() as connection:
@@ -101,8 +102,7 @@ def run_migrations_online() -> None:
     asyncio.run(run_async_migrations())
 
 
-# Only run migrations when explicitly called, not on import
-# if context.is_offline_mode():
-#     run_migrations_offline()
-# else:
-#     run_migrations_online()
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
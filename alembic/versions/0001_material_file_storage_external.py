@@ -0,0 +1,26 @@
+"""course_materials.file_data: storage EXTERNAL for byte-range reads
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Без сжатия TOAST Postgres читает для substring() только нужные чанки,
+    # а не распаковывает значение с начала. Действует на новые/перезаписанные значения.
+    op.execute("ALTER TABLE course_materials ALTER COLUMN file_data SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE course_materials ALTER COLUMN file_data SET STORAGE EXTENDED")
@@ -0,0 +1,40 @@
+"""blob storage: blobs table and course_materials.file_hash
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'blobs',
+        sa.Column('sha256', sa.String(length=64), primary_key=True),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('mimetype', sa.String(length=100), nullable=True),
+        sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.add_column('course_materials', sa.Column('file_hash', sa.String(length=64), nullable=True))
+    op.create_foreign_key(
+        'course_materials_file_hash_fkey', 'course_materials', 'blobs', ['file_hash'], ['sha256']
+    )
+    op.create_index('idx_course_materials_file_hash', 'course_materials', ['file_hash'])
+    # Дальше: python -m app.services.blobs migrate-file-data, затем alembic upgrade 0003
+
+
+def downgrade() -> None:
+    op.drop_index('idx_course_materials_file_hash', table_name='course_materials')
+    op.drop_constraint('course_materials_file_hash_fkey', 'course_materials', type_='foreignkey')
+    op.drop_column('course_materials', 'file_hash')
+    op.drop_table('blobs')
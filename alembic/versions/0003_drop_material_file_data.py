@@ -0,0 +1,35 @@
+"""drop course_materials.file_data after moving files to blob storage
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    pending = conn.execute(sa.text(
+        "SELECT count(*) FROM course_materials WHERE file_data IS NOT NULL AND file_hash IS NULL"
+    )).scalar()
+    if pending:
+        raise RuntimeError(
+            f"{pending} материалов ещё хранят file_data в строке. "
+            "Сначала выполните: python -m app.services.blobs migrate-file-data"
+        )
+    op.drop_column('course_materials', 'file_data')
+
+
+def downgrade() -> None:
+    # Содержимое файлов обратно в строки не переносится — оно остаётся в blob-хранилище
+    op.add_column('course_materials', sa.Column('file_data', sa.LargeBinary(), nullable=True))
+    op.execute("ALTER TABLE course_materials ALTER COLUMN file_data SET STORAGE EXTERNAL")
@@ -0,0 +1,33 @@
+"""messages: composite index for keyset pagination of student history
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись бота, но не может выполняться в транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_messages_student_created',
+            'messages',
+            ['student_id', 'created_at', 'message_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('idx_messages_student_created', table_name='messages', postgresql_concurrently=True)
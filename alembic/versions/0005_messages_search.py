@@ -0,0 +1,48 @@
+"""messages: full-text search vector, trigram and created_at indexes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:00:00.000000
+
+ADD COLUMN ... GENERATED STORED переписывает таблицу под ACCESS EXCLUSIVE —
+запускать в окно обслуживания. Индексы строятся CONCURRENTLY.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('russian'::regconfig, coalesce(text_content, '')), 'A') || "
+        "setweight(to_tsvector('english'::regconfig, coalesce(text_content, '')), 'B')"
+        ") STORED"
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_search_vector "
+            "ON messages USING gin (search_vector)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_text_trgm "
+            "ON messages USING gin (text_content gin_trgm_ops)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_created_at ON messages (created_at)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_messages_created_at")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_messages_text_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_messages_search_vector")
+    op.drop_column('messages', 'search_vector')
@@ -0,0 +1,45 @@
+"""latency rollups: per-hour/per-day processing_ms histograms and job watermarks
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'latency_rollups',
+        sa.Column('rollup_id', sa.BigInteger(), primary_key=True),
+        sa.Column('granularity', sa.String(length=10), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('program_id', sa.BigInteger(),
+                  sa.ForeignKey('programs.program_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('message_type', sa.String(length=50), server_default='', nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.Column('sum_ms', sa.BigInteger(), nullable=False),
+        sa.Column('max_ms', sa.Integer(), nullable=False),
+        sa.Column('histogram', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.UniqueConstraint('granularity', 'bucket_start', 'program_id', 'message_type'),
+    )
+    op.create_table(
+        'job_watermarks',
+        sa.Column('job_name', sa.String(length=100), primary_key=True),
+        sa.Column('watermark', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_watermarks')
+    op.drop_table('latency_rollups')
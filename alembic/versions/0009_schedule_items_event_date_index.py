@@ -0,0 +1,32 @@
+"""schedule_items: event_date index for the reminder scheduler
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_schedule_items_event_date',
+            'schedule_items',
+            ['event_date'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('idx_schedule_items_event_date', table_name='schedule_items', postgresql_concurrently=True)
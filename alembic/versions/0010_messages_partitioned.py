@@ -0,0 +1,127 @@
+"""messages: monthly range partitions on created_at (staging table)
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 15:00:00.000000
+
+Создаёт рядом с messages пустую секционированную messages_partitioned (секции на месяцы
+существующих данных и на три месяца вперёд, messages_default) и триггер, повторяющий
+в ней UPDATE/DELETE старой таблицы. Сами строки переносит
+    python -m app.services.message_partitions migrate
+он же меняет таблицы местами; после этого — миграция 0011. Нужен PostgreSQL 12+.
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    sequence = conn.execute(sa.text("SELECT pg_get_serial_sequence('messages', 'message_id')")).scalar()
+    if sequence is None:
+        raise RuntimeError("У messages.message_id нет последовательности (ожидался bigserial)")
+    first = conn.execute(sa.text("SELECT min(created_at) FROM messages")).scalar()
+
+    op.execute(f"""
+        CREATE TABLE messages_partitioned (
+            message_id bigint NOT NULL DEFAULT nextval('{sequence}'),
+            student_id bigint NOT NULL,
+            role varchar(20),
+            sender_type varchar(20) NOT NULL,
+            text_content text NOT NULL,
+            processing_ms integer DEFAULT 0,
+            telegram_user_id bigint,
+            message_type varchar(50),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('russian'::regconfig, coalesce(text_content, '')), 'A') ||
+                setweight(to_tsvector('english'::regconfig, coalesce(text_content, '')), 'B')
+            ) STORED,
+            CONSTRAINT messages_partitioned_pkey PRIMARY KEY (message_id, created_at),
+            CONSTRAINT messages_partitioned_student_id_fkey FOREIGN KEY (student_id)
+                REFERENCES students (student_id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    month = (first.astimezone(timezone.utc).date() if first else current).replace(day=1)
+    while month <= _add_months(current, MONTHS_AHEAD):
+        op.execute(
+            f"CREATE TABLE messages_y{month.year:04d}m{month.month:02d} PARTITION OF messages_partitioned "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+            f"TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+        )
+        month = _add_months(month, 1)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages_partitioned DEFAULT")
+
+    # Таблица пуста — индексы строятся мгновенно и наследуются секциями
+    op.execute(
+        "CREATE INDEX idx_messages_partitioned_student_created "
+        "ON messages_partitioned (student_id, created_at, message_id)"
+    )
+    op.execute("CREATE INDEX idx_messages_partitioned_created_at ON messages_partitioned (created_at)")
+    op.execute(
+        "CREATE INDEX idx_messages_partitioned_search_vector ON messages_partitioned USING gin (search_vector)"
+    )
+    op.execute(
+        "CREATE INDEX idx_messages_partitioned_text_trgm ON messages_partitioned USING gin (text_content gin_trgm_ops)"
+    )
+
+    # Правки и удаления уже скопированных строк, пока идёт перенос.
+    # Удаление студента каскадом чистит обе таблицы само.
+    op.execute("""
+        CREATE FUNCTION messages_partitioned_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM messages_partitioned WHERE message_id = OLD.message_id;
+                RETURN OLD;
+            END IF;
+            UPDATE messages_partitioned SET
+                message_id = NEW.message_id,
+                student_id = NEW.student_id,
+                role = NEW.role,
+                sender_type = NEW.sender_type,
+                text_content = NEW.text_content,
+                processing_ms = NEW.processing_ms,
+                telegram_user_id = NEW.telegram_user_id,
+                message_type = NEW.message_type,
+                created_at = coalesce(NEW.created_at, created_at)
+            WHERE message_id = OLD.message_id;
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute(
+        "CREATE TRIGGER messages_partitioned_sync AFTER UPDATE OR DELETE ON messages "
+        "FOR EACH ROW EXECUTE FUNCTION messages_partitioned_sync()"
+    )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    switched = conn.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('messages'))"
+    )).scalar()
+    if switched:
+        raise RuntimeError(
+            "messages уже переключена на секционированную таблицу — "
+            "обратный перенос строк в обычную таблицу не автоматизирован"
+        )
+    op.execute("DROP TRIGGER IF EXISTS messages_partitioned_sync ON messages")
+    op.execute("DROP FUNCTION IF EXISTS messages_partitioned_sync()")
+    op.execute("DROP TABLE IF EXISTS messages_partitioned")
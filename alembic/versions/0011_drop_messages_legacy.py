@@ -0,0 +1,34 @@
+"""drop messages_legacy after switching messages to partitions
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    switched = conn.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('messages'))"
+    )).scalar()
+    if not switched:
+        raise RuntimeError(
+            "messages ещё не переведена на секции. "
+            "Сначала выполните: python -m app.services.message_partitions migrate"
+        )
+    op.execute("DROP TABLE IF EXISTS messages_legacy")
+
+
+def downgrade() -> None:
+    # Старая таблица не восстанавливается — все строки уже в секциях messages
+    pass
@@ -0,0 +1,42 @@
+"""message archive: per-student monthly segments in blob storage
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'message_archive_segments',
+        sa.Column('segment_id', sa.BigInteger(), primary_key=True),
+        sa.Column('student_id', sa.BigInteger(),
+                  sa.ForeignKey('students.student_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('blob_sha256', sa.String(length=64), sa.ForeignKey('blobs.sha256'), nullable=False),
+        sa.Column('codec', sa.String(length=10), nullable=False),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('first_created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('student_id', 'month'),
+    )
+    op.create_index('idx_message_archive_segments_month', 'message_archive_segments', ['month'])
+    op.create_index('idx_message_archive_segments_blob', 'message_archive_segments', ['blob_sha256'])
+
+
+def downgrade() -> None:
+    # Сначала верните сообщения: python -m app.services.message_archive restore --month ...
+    op.drop_index('idx_message_archive_segments_blob', table_name='message_archive_segments')
+    op.drop_index('idx_message_archive_segments_month', table_name='message_archive_segments')
+    op.drop_table('message_archive_segments')
@@ -0,0 +1,28 @@
+"""blobs.updated_at: grace period for gc after put_file
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Существующие строки получают время миграции — первый gc после неё их не тронет
+    op.add_column(
+        'blobs',
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('blobs', 'updated_at')
@@ -0,0 +1,80 @@
+"""
+Построение плоских SELECT по колонкам представления админки.
+
+Связанные объекты (ScheduleItem.student, TestResult.test, ...) подтягиваются через
+LEFT JOIN и сразу превращаются в SQL-выражение, совпадающее с __str__ модели,
+вместо загрузки ORM-объектов и selectin-связей по каждой строке.
+"""
+
+from typing import List, Sequence
+
+from sqlalchemy import Select, cast, inspect, select, String
+from sqlalchemy.orm import aliased
+
+from app.models.education import (
+    Program, Student, CourseModule, Topic, CourseMaterial, AttestationTest,
+)
+
+# SQL-аналоги __str__ для моделей, которые встречаются как связанные колонки
+DISPLAY_EXPRESSIONS = {
+    Program: lambda m: m.name,
+    Student: lambda m: m.last_name + " " + m.first_name,
+    CourseModule: lambda m: m.name,
+    Topic: lambda m: m.name,
+    CourseMaterial: lambda m: m.title,
+    AttestationTest: lambda m: m.title,
+}
+
+
+def related_pk_label(name: str) -> str:
+    return f"{name}__pk"
+
+
+def display_expression(model_cls, entity):
+    """Выражение, которое даёт то же, что str(obj); по умолчанию — первичный ключ"""
+    factory = DISPLAY_EXPRESSIONS.get(model_cls)
+    if factory is not None:
+        return factory(entity)
+    pk = inspect(model_cls).primary_key[0]
+    return cast(getattr(entity, pk.key), String)
+
+
+def supports_projection(model_cls, prop_names: Sequence[str]) -> bool:
+    """Все колонки — обычные столбцы или связи многие-к-одному"""
+    mapper = inspect(model_cls)
+    for name in prop_names:
+        if name in mapper.relationships:
+            if mapper.relationships[name].uselist:
+                return False
+        elif name not in mapper.column_attrs:
+            return False
+    return True
+
+
+def build_select(model_cls, prop_names: Sequence[str], related_pks: bool = False) -> Select:
+    """
+    SELECT с колонкой на каждое имя из prop_names (метка = имя).
+    related_pks=True добавляет для связей колонку <имя>__pk — для ссылок на связанные объекты.
+    """
+    mapper = inspect(model_cls)
+    columns: List = []
+    joins = []
+    for name in prop_names:
+        if name in mapper.relationships:
+            relationship = mapper.relationships[name]
+            if relationship.uselist:
+                raise ValueError(f"{model_cls.__name__}.{name}: связь один-ко-многим нельзя спроецировать")
+            target_cls = relationship.mapper.class_
+            target = aliased(target_cls, name=f"rel_{name}")
+            joins.append((target, getattr(model_cls, name).of_type(target)))
+            columns.append(display_expression(target_cls, target).label(name))
+            if related_pks:
+                target_pk = relationship.mapper.primary_key[0]
+                columns.append(getattr(target, target_pk.key).label(related_pk_label(name)))
+        else:
+            columns.append(getattr(model_cls, name).label(name))
+
+    stmt = select(*columns).select_from(model_cls)
+    for target, onclause in joins:
+        stmt = stmt.outerjoin(target, onclause)
+    return stmt
@@ -0,0 +1,70 @@
+"""
+Оценочный count для больших списков в админке.
+
+sqladmin на каждой странице списка делает точный SELECT count(*), что на больших таблицах
+дороже самой страницы. Представление с estimate_count = True без поиска берёт оценку
+из pg_class.reltuples (обновляется VACUUM/ANALYZE), если она выше порога; при поиске,
+а также для маленьких и ещё не проанализированных таблиц считает точно.
+Результаты кэшируются на count_cache_ttl секунд, не больше count_cache_max_size штук
+(LRU: каждый поисковый запрос — своя запись).
+"""
+
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+from starlette.requests import Request
+
+from app.core.config import settings
+
+# Для секционированной таблицы reltuples родителя пуст — суммируем по секциям
+ESTIMATE_SQL = text(
+    "SELECT sum(c.reltuples)::bigint FROM pg_class c "
+    "WHERE c.reltuples >= 0 AND (c.oid = to_regclass(:table) "
+    "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(:table)))"
+)
+
+
+class EstimatedCountMixin:
+    estimate_count: bool = False
+    estimate_count_threshold: int = settings.ADMIN_ESTIMATED_COUNT_THRESHOLD
+    count_cache_ttl: float = settings.ADMIN_COUNT_CACHE_TTL
+    count_cache_max_size: int = settings.ADMIN_COUNT_CACHE_MAX_SIZE
+
+    _count_cache: "OrderedDict[Tuple, Tuple[int, float]]"
+
+    async def count(self, request: Request, stmt=None) -> int:
+        if not hasattr(self, "_count_cache"):
+            self._count_cache = OrderedDict()
+        # sqladmin передаёт stmt только для отфильтрованного (поиском) списка
+        if stmt is None:
+            key: Tuple = ("all",)
+        else:
+            compiled = stmt.compile()
+            key = (str(compiled), repr(sorted(compiled.params.items())))
+
+        cached = self._count_cache.get(key)
+        if cached is not None:
+            if cached[1] > time.monotonic():
+                self._count_cache.move_to_end(key)
+                return cached[0]
+            del self._count_cache[key]
+
+        value = None
+        if self.estimate_count and stmt is None:
+            estimate = await self._estimated_rows()
+            if estimate is not None and estimate >= self.estimate_count_threshold:
+                value = estimate
+        if value is None:
+            value = await super().count(request, stmt)
+
+        self._count_cache[key] = (value, time.monotonic() + self.count_cache_ttl)
+        self._count_cache.move_to_end(key)
+        while len(self._count_cache) > self.count_cache_max_size:
+            self._count_cache.popitem(last=False)
+        return value
+
+    async def _estimated_rows(self) -> Optional[int]:
+        async with self.session_maker() as session:
+            return await session.scalar(ESTIMATE_SQL, {"table": self.model.__table__.name})
@@ -0,0 +1,189 @@
+"""
+Колоночный экспорт (Parquet) для аналитики: messages, test_results, student_module_progress.
+
+Строки читаются серверным курсором так же, как в CSV-экспорте, копятся до
+ADMIN_PARQUET_ROW_GROUP_SIZE и пишутся отдельными row group'ами прямо в ответ —
+в памяти одновременно не больше одной группы. Перечислимые строковые колонки
+(sender_type, role, status, ...) сохраняются со словарным кодированием.
+
+Инкрементальная выгрузка: ?since=<ISO datetime> отдаёт строки с since < created_at <= until,
+где until = now() - ADMIN_EXPORT_WATERMARK_LAG (отставание нужно, чтобы не потерять строки,
+которые ещё лежат в write-behind буфере). until возвращается в заголовке X-Export-Watermark —
+его и нужно передать как since в следующей выгрузке.
+
+pyarrow — опциональная зависимость, импортируется только при экспорте.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Sequence
+
+from fastapi.responses import StreamingResponse
+from sqladmin import ModelView
+from sqladmin.helpers import secure_filename
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Integer, Numeric, inspect
+from starlette.exceptions import HTTPException
+
+from app.admin.columns import build_select
+from app.core.config import settings
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail="Для экспорта в Parquet установите pyarrow") from e
+    return pyarrow
+
+
+def parquet_columns(model_view: ModelView) -> List[str]:
+    """Колонки выгрузки: parquet_columns представления или все не-deferred колонки таблицы"""
+    columns = getattr(model_view, "parquet_columns", None)
+    if columns:
+        return list(columns)
+    mapper = inspect(model_view.model)
+    return [attr.key for attr in mapper.column_attrs if not attr.deferred]
+
+
+def arrow_schema(model_view: ModelView, columns: Sequence[str]):
+    pa = _import_pyarrow()
+    mapper = inspect(model_view.model)
+    dictionary_columns = set(getattr(model_view, "parquet_dictionary_columns", ()))
+    fields = []
+    for name in columns:
+        if name in mapper.relationships:
+            # Связь выгружается отображаемым именем (см. app.admin.columns)
+            arrow_type = pa.string()
+        else:
+            arrow_type = _arrow_type(pa, mapper.column_attrs[name].columns[0].type)
+        if name in dictionary_columns:
+            arrow_type = pa.dictionary(pa.int32(), arrow_type)
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _arrow_type(pa, column_type):
+    if isinstance(column_type, BigInteger):
+        return pa.int64()
+    if isinstance(column_type, Integer):
+        return pa.int32()
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC" if column_type.timezone else None)
+    if isinstance(column_type, Date):
+        return pa.date32()
+    if isinstance(column_type, Numeric):
+        return pa.decimal128(column_type.precision or 38, column_type.scale or 0)
+    return pa.string()
+
+
+def parse_watermark(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный since: ожидается ISO 8601")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class _ChunkSink:
+    """Файлоподобный приёмник для ParquetWriter: накопленные байты забираются через drain()"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ParquetExport:
+    def __init__(self, model_view: ModelView, since: Optional[datetime] = None):
+        self.model_view = model_view
+        self.since = since
+        self.watermark_column = getattr(model_view, "export_watermark_column", None)
+        if since is not None and self.watermark_column is None:
+            raise HTTPException(status_code=400, detail="Инкрементальная выгрузка для этой таблицы не поддерживается")
+        self.until = (
+            datetime.now(timezone.utc) - timedelta(seconds=settings.ADMIN_EXPORT_WATERMARK_LAG)
+            if self.watermark_column else None
+        )
+        self.columns = parquet_columns(model_view)
+        self.schema = arrow_schema(model_view, self.columns)
+
+    def query(self):
+        model = self.model_view.model
+        stmt = build_select(model, self.columns)
+        if self.watermark_column is None:
+            return stmt.order_by(*self.model_view.pk_columns)
+        watermark = getattr(model, self.watermark_column)
+        stmt = stmt.where(watermark <= self.until)
+        if self.since is not None:
+            stmt = stmt.where(watermark > self.since)
+        return stmt.order_by(watermark, *self.model_view.pk_columns)
+
+    async def generate(self) -> AsyncIterator[bytes]:
+        pa = _import_pyarrow()
+        sink = _ChunkSink()
+        writer = pa.parquet.ParquetWriter(sink, self.schema, compression="zstd")
+        batch_size = settings.ADMIN_EXPORT_BATCH_SIZE
+        group: List[tuple] = []
+
+        stmt = self.query().execution_options(yield_per=batch_size)
+        async with self.model_view.session_maker() as session:
+            result = await session.stream(stmt)
+            async for rows in result.partitions(batch_size):
+                group.extend(rows)
+                if len(group) >= settings.ADMIN_PARQUET_ROW_GROUP_SIZE:
+                    # Кодирование и сжатие группы — CPU-работа, не держим ею event loop
+                    await asyncio.to_thread(self._write_group, writer, group)
+                    group = []
+                    yield sink.drain()
+        if group:
+            await asyncio.to_thread(self._write_group, writer, group)
+        writer.close()
+        yield sink.drain()
+
+    def _write_group(self, writer, rows: Sequence[tuple]) -> None:
+        pa = _import_pyarrow()
+        arrays = [
+            pa.array(values, type=field.type)
+            for values, field in zip(zip(*rows), self.schema)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def response(self) -> StreamingResponse:
+        filename = secure_filename(self.model_view.get_export_name(export_type="parquet"))
+        headers = {"Content-Disposition": f"attachment;filename={filename}"}
+        if self.until is not None:
+            headers["X-Export-Watermark"] = self.until.isoformat()
+        return StreamingResponse(
+            content=self.generate(),
+            media_type="application/vnd.apache.parquet",
+            headers=headers,
+        )
+
+
+def stream_parquet(model_view: ModelView, since: Optional[datetime] = None) -> StreamingResponse:
+    return ParquetExport(model_view, since).response()
@@ -0,0 +1,127 @@
+"""
+Проекционный режим списков админки.
+
+По умолчанию sqladmin грузит страницу списка ORM-объектами: целые строки плюс связи
+(joinedload для колонок-связей, а lazy='selectin' у CourseModule.program, Topic.module,
+CourseMaterial.* и AttestationTest.module — ещё по запросу на каждую связь). Представление
+с list_projection = True вместо этого выполняет один SELECT только колонок column_list,
+связанные объекты приходят как SQL-аналог __str__ и первичный ключ (для ссылки) через
+LEFT JOIN (app.admin.columns.build_select). Строки — лёгкие ProjectedRow поверх Row.
+
+Поиск (search_query представления) и сортировка работают как раньше; сортировка по
+колонке-связи идёт по отображаемому имени связанного объекта.
+"""
+
+from typing import Any, List, Sequence, Tuple
+
+from sqladmin.helpers import get_object_identifier, slugify_class_name
+from sqladmin.pagination import Pagination
+from sqlalchemy import Select, asc, desc, func, inspect, select
+from starlette.datastructures import URL
+from starlette.requests import Request
+
+from app.admin.columns import build_select, related_pk_label, supports_projection
+
+
+def _identifier(values: Sequence[Any]) -> Any:
+    # Тот же формат, что у sqladmin.helpers.get_object_identifier
+    if len(values) == 1:
+        return values[0]
+    return ";".join(str(v).replace("\\", "\\\\").replace(";", r"\;") for v in values)
+
+
+class ProjectedRow:
+    """Строка списка: значения колонок по имени (как атрибуты) и идентификатор для ссылок"""
+
+    __slots__ = ("_row", "identifier")
+
+    def __init__(self, row, pk_names: Sequence[str]):
+        self._row = row
+        self.identifier = _identifier([getattr(row, name) for name in pk_names])
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._row, name)
+
+
+def object_identifier(obj: Any) -> Any:
+    """get_object_identifier для шаблонов: понимает и ORM-объекты, и ProjectedRow"""
+    if isinstance(obj, ProjectedRow):
+        return obj.identifier
+    return get_object_identifier(obj)
+
+
+class ProjectionListMixin:
+    list_projection: bool = False
+
+    def _projection_enabled(self) -> bool:
+        return self.list_projection and supports_projection(self.model, self._list_prop_names)
+
+    def _projection_columns(self) -> Tuple[List[str], List[str]]:
+        pk_names = [inspect(self.model).get_property_by_column(pk).key for pk in self.pk_columns]
+        return [*self._list_prop_names, *(name for name in pk_names if name not in self._list_prop_names)], pk_names
+
+    def _projection_sort(self, stmt: Select, request: Request) -> Select:
+        sort_by = request.query_params.get("sortBy", None)
+        if sort_by:
+            sort_fields = [(sort_by, request.query_params.get("sort", "asc") == "desc")]
+        else:
+            sort_fields = self._get_default_sort()
+
+        selected = stmt.selected_columns
+        for field, is_desc in sort_fields:
+            name = field if isinstance(field, str) else field.key
+            # Колонка из проекции (для связи — отображаемое имя), иначе — атрибут модели
+            column = selected[name] if name in selected else getattr(self.model, name)
+            stmt = stmt.order_by(desc(column) if is_desc else asc(column))
+        return stmt
+
+    async def list(self, request: Request) -> Pagination:
+        if not self._projection_enabled():
+            return await super().list(request)
+
+        page = int(request.query_params.get("page", 1))
+        page_size = int(request.query_params.get("pageSize", 0))
+        page_size = min(page_size or self.page_size, max(self.page_size_options))
+        search = request.query_params.get("search", None)
+
+        prop_names, pk_names = self._projection_columns()
+        stmt = build_select(self.model, prop_names, related_pks=True)
+        if search:
+            stmt = self.search_query(stmt=stmt, term=search)
+            # Считаем по отфильтрованным ключам, без JOIN'ов проекции
+            keys = self.search_query(stmt=select(*self.pk_columns), term=search)
+            count = await self.count(request, select(func.count()).select_from(keys.subquery()))
+        else:
+            count = await self.count(request)
+
+        stmt = self._projection_sort(stmt, request)
+        stmt = stmt.limit(page_size).offset((page - 1) * page_size)
+        async with self.session_maker(expire_on_commit=False) as session:
+            rows = (await session.execute(stmt)).all()
+
+        return Pagination(
+            rows=[ProjectedRow(row, pk_names) for row in rows],
+            page=page,
+            page_size=page_size,
+            count=count,
+        )
+
+    def _build_url_for(self, name: str, request: Request, obj: Any) -> URL:
+        if isinstance(obj, ProjectedRow):
+            return request.url_for(name, identity=self.identity, pk=obj.identifier)
+        return super()._build_url_for(name, request, obj)
+
+    def _url_for_delete(self, request: Request, obj: Any) -> str:
+        if isinstance(obj, ProjectedRow):
+            url = request.url_for("admin:delete", identity=self.identity)
+            return str(url.include_query_params(pks=obj.identifier))
+        return super()._url_for_delete(request, obj)
+
+    def _url_for_details_with_prop(self, request: Request, obj: Any, prop: str) -> URL:
+        if isinstance(obj, ProjectedRow):
+            pk = getattr(obj, related_pk_label(prop), None)
+            if pk is None:
+                return URL()
+            target = inspect(self.model).relationships[prop].mapper.class_
+            return request.url_for("admin:details", identity=slugify_class_name(target.__name__), pk=pk)
+        return super()._url_for_details_with_prop(request, obj, prop)
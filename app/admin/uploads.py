@@ -0,0 +1,168 @@
+"""
+Загрузка файлов через формы админки без копии в памяти.
+
+Тело multipart-запроса разбирается потоково (Starlette MultiPartParser): файл пишется
+кусками во временный SpooledTemporaryFile (в памяти до 1 МБ, дальше — на диске), а
+SHA-256 и размер считаются по тем же кускам. Лимит upload_max_size представления
+проверяется по Content-Length до чтения тела и по мере разбора — запрос с файлом больше
+лимита обрывается на первом лишнем куске с ответом 413, временные файлы закрываются.
+
+Тип файла определяется по первым байтам (сигнатуры форматов); заявленный браузером
+Content-Type и расширение имени используются, только если сигнатура не распознана.
+"""
+
+import hashlib
+import mimetypes
+from dataclasses import dataclass
+from typing import Optional
+
+from starlette.datastructures import UploadFile
+from starlette.exceptions import HTTPException
+from starlette.formparsers import MultiPartException, MultiPartParser, parse_options_header
+from starlette.requests import Request
+
+# Запас на остальные поля формы и заголовки частей multipart
+FORM_OVERHEAD = 64 * 1024
+SNIFF_SIZE = 512
+
+# Сигнатура в начале файла -> MIME
+SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"ID3", "audio/mpeg"),
+    (b"OggS", "audio/ogg"),
+    (b"fLaC", "audio/flac"),
+    (b"\x1a\x45\xdf\xa3", "video/webm"),
+    (b"Rar!\x1a\x07", "application/vnd.rar"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (b"\x1f\x8b", "application/gzip"),
+]
+# Контейнеры, у которых конкретный формат различим только по расширению (docx/xlsx/pptx, doc/xls)
+CONTAINERS = {
+    b"PK\x03\x04": "application/zip",
+    b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1": "application/x-ole-storage",
+}
+
+
+class UploadTooLarge(MultiPartException):
+    pass
+
+
+def format_size(size: int) -> str:
+    """Размер для сообщений: МБ с округлением до десятых, меньше мегабайта — КБ"""
+    if size >= 1024 * 1024:
+        return f"{round(size / (1024 * 1024), 1):g} МБ".replace(".", ",")
+    return f"{max(round(size / 1024), 1)} КБ"
+
+
+def too_large_message(max_size: int) -> str:
+    return f"Файл больше {format_size(max_size)}"
+
+
+def sniff_mimetype(head: bytes, filename: Optional[str] = None, declared: Optional[str] = None) -> str:
+    """MIME по первым байтам файла; для zip/OLE-контейнеров уточняется по расширению"""
+    guessed = mimetypes.guess_type(filename)[0] if filename else None
+    for magic, mimetype in CONTAINERS.items():
+        if head.startswith(magic):
+            return guessed or mimetype
+    for magic, mimetype in SIGNATURES:
+        if head.startswith(magic):
+            return mimetype
+    if head[4:8] == b"ftyp":
+        return guessed if guessed and guessed.startswith(("video/", "audio/")) else "video/mp4"
+    if head[:4] == b"RIFF":
+        kind = head[8:12]
+        if kind == b"WAVE":
+            return "audio/wav"
+        if kind == b"WEBP":
+            return "image/webp"
+        if kind == b"AVI ":
+            return "video/x-msvideo"
+    if _looks_like_text(head):
+        if guessed and (guessed.startswith("text/") or guessed in ("application/json", "image/svg+xml")):
+            return guessed
+        return "text/plain"
+    return declared or guessed or "application/octet-stream"
+
+
+def _looks_like_text(head: bytes) -> bool:
+    if not head or b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Кусок мог оборваться посреди многобайтового символа
+        return e.end == len(head) and e.start >= len(head) - 3
+    return True
+
+
+class LimitedMultiPartParser(MultiPartParser):
+    """MultiPartParser, который считает SHA-256 и размер каждого файла и обрывает разбор на лимите"""
+
+    def __init__(self, *args, max_size: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_size = max_size
+
+    def on_headers_finished(self) -> None:
+        super().on_headers_finished()
+        upload = self._current_part.file
+        if upload is not None:
+            upload.sha256 = hashlib.sha256()
+            upload.received = 0
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        upload = self._current_part.file
+        if upload is not None:
+            upload.received += end - start
+            if upload.received > self.max_size:
+                raise UploadTooLarge(too_large_message(self.max_size))
+            upload.sha256.update(data[start:end])
+        super().on_part_data(data, start, end)
+
+
+async def parse_form(request: Request, max_size: int) -> None:
+    """
+    Разбирает multipart-форму с лимитом на размер файла. Результат кладётся в кэш формы
+    запроса: дальнейшие request.form() (sqladmin, on_model_change) вернут её же.
+    """
+    content_type, _ = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data":
+        return
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + FORM_OVERHEAD:
+        raise HTTPException(status_code=413, detail=too_large_message(max_size))
+
+    parser = LimitedMultiPartParser(request.headers, request.stream(), max_size=max_size)
+    try:
+        request._form = await parser.parse()
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=e.message)
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+
+@dataclass
+class UploadInfo:
+    # None — форма разобрана без parse_form, хэш и размер посчитает blobs.put_file
+    sha256: Optional[str]
+    size: Optional[int]
+    mimetype: str
+    empty: bool
+
+
+def upload_info(upload: UploadFile) -> UploadInfo:
+    """Хэш и размер, посчитанные при разборе (если форма прошла через parse_form), и MIME по сигнатуре"""
+    fileobj = upload.file
+    fileobj.seek(0)
+    head = fileobj.read(SNIFF_SIZE)
+    fileobj.seek(0)
+    digest = getattr(upload, "sha256", None)
+    return UploadInfo(
+        sha256=digest.hexdigest() if digest is not None else None,
+        size=upload.received if digest is not None else None,
+        mimetype=sniff_mimetype(head, upload.filename, upload.content_type),
+        empty=not head,
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import time
 import csv
 import sqladmin.helpers
@@ -17,17 +18,45 @@ sqladmin.helpers.stream_to_csv = patched_stream_to_csv
 sqladmin.models.stream_to_csv = patched_stream_to_csv
 
 from sqladmin import Admin, ModelView
-from sqladmin.authentication import AuthenticationBackend
+from sqladmin.authentication import AuthenticationBackend, login_required
 from app.core.config import settings
 from starlette.requests import Request
 from wtforms import FileField, BooleanField
-from app.core.database import engine
+from app.core.database import RoutingSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.admin.counts import EstimatedCountMixin
+from app.admin.projection import ProjectionListMixin, object_identifier
+from app.admin import export, parquet, uploads
+from app.services import blobs
+from app.services.identity_cache import identity_cache
+from app.services.curriculum import curriculum_cache
+from app.services.progress import progress_scheduler
+from app.services.reminders import reminder_scheduler
+from app.services import message_search
 from app.models.education import (
     Student, Program, CourseModule, Topic, CourseMaterial,
     StudentModuleProgress, Message, RateLimit, ScheduleItem,
-    AttestationTest, TestResult, Feedback
+    AttestationTest, TestResult, Feedback, LatencyRollup, MessageArchiveSegment
 )
 
+class CurriculumInvalidationMixin:
+    """Перестраивает снапшот учебного плана программы после правок в админке"""
+
+    async def on_model_change(self, data, model, is_created, request: Request):
+        await super().on_model_change(data, model, is_created, request)
+        # До применения формы: если объект переносят в другую программу, старую тоже обновляем
+        request.state.curriculum_programs = set() if is_created else await curriculum_cache.programs_for(model)
+
+    async def after_model_change(self, data, model, is_created, request: Request):
+        await super().after_model_change(data, model, is_created, request)
+        previous = getattr(request.state, "curriculum_programs", set())
+        curriculum_cache.invalidate(previous | await curriculum_cache.programs_for(model))
+
+    async def after_model_delete(self, model, request: Request):
+        await super().after_model_delete(model, request)
+        curriculum_cache.invalidate(await curriculum_cache.programs_for(model))
+
+
 class StudentAdmin(ModelView, model=Student):
     name = "Студент"
     name_plural = "Студенты"
@@ -87,8 +116,15 @@ class StudentAdmin(ModelView, model=Student):
         Student.max_chat_id
     ]
 
+    async def after_model_change(self, data, model, is_created, request: Request):
+        # Бот сразу видит новые/изменённые Telegram и Max ID
+        identity_cache.update_from_model(model)
+
+    async def after_model_delete(self, model, request: Request):
+        identity_cache.invalidate_student(model.student_id)
+
 
-class ProgramAdmin(ModelView, model=Program):
+class ProgramAdmin(CurriculumInvalidationMixin, ModelView, model=Program):
     name = "Программа"
     name_plural = "Программы"
     icon = "fa-solid fa-graduation-cap"
@@ -110,11 +146,12 @@ class ProgramAdmin(ModelView, model=Program):
     column_searchable_list = [Program.name]
 
 
-class CourseModuleAdmin(ModelView, model=CourseModule):
+class CourseModuleAdmin(CurriculumInvalidationMixin, ProjectionListMixin, ModelView, model=CourseModule):
     name = "Модуль"
     name_plural = "Модули"
     icon = "fa-solid fa-book"
     can_export = True
+    list_projection = True
     column_list = [
         CourseModule.module_id, 
         CourseModule.name, 
@@ -148,11 +185,12 @@ class CourseModuleAdmin(ModelView, model=CourseModule):
         }
     }
 
-class TopicAdmin(ModelView, model=Topic):
+class TopicAdmin(CurriculumInvalidationMixin, ProjectionListMixin, ModelView, model=Topic):
     name = "Тема"
     name_plural = "Темы"
     icon = "fa-solid fa-chalkboard-teacher"
     can_export = True
+    list_projection = True
     column_list = [
         Topic.topic_id, 
         Topic.name, 
@@ -188,11 +226,25 @@ class TopicAdmin(ModelView, model=Topic):
         }
     }
 
-class CourseMaterialAdmin(ModelView, model=CourseMaterial):
+    async def on_model_change(self, data, model, is_created, request: Request):
+        await super().on_model_change(data, model, is_created, request)
+        # Тему могут перенести в другой модуль — пересчитаем и старый
+        request.state.previous_module_id = None if is_created else model.module_id
+
+    async def after_model_change(self, data, model, is_created, request: Request):
+        await super().after_model_change(data, model, is_created, request)
+        progress_scheduler.schedule({getattr(request.state, "previous_module_id", None), model.module_id})
+
+    async def after_model_delete(self, model, request: Request):
+        await super().after_model_delete(model, request)
+        progress_scheduler.schedule({model.module_id})
+
+class CourseMaterialAdmin(CurriculumInvalidationMixin, ProjectionListMixin, ModelView, model=CourseMaterial):
     name = "Материал"
     name_plural = "Материалы"
     icon = "fa-solid fa-file-alt"
     can_export = True
+    list_projection = True
     column_list = [
         CourseMaterial.material_id, 
         CourseMaterial.title, 
@@ -237,26 +289,43 @@ class CourseMaterialAdmin(ModelView, model=CourseMaterial):
     form_extra_fields = {
         "upload": FileField("Загрузить файл вручную (PDF/и др.)")
     }
+    # Больше — 413 до чтения тела целиком (app.admin.uploads)
+    upload_max_size = settings.MATERIAL_UPLOAD_MAX_SIZE
 
     async def on_model_change(self, data, model, is_created, request: Request):
+        await super().on_model_change(data, model, is_created, request)
+        # Форма уже разобрана TutorAdmin._handle_form_data: файл лежит во временном файле, хэш посчитан
         form = await request.form()
         file_obj = form.get("upload")
         # Проверяем, что объект файла существует и имеет имя (т.е. файл был выбран)
         if file_obj and hasattr(file_obj, "filename") and file_obj.filename:
-            try:
-                content = await file_obj.read()
-                if content:
-                    model.file_data = content
-                    model.file_size = len(content)
-                    model.file_mimetype = file_obj.content_type
-            except Exception:
-                pass # Пропускаем если не удалось прочитать файл
-
-class ScheduleItemAdmin(ModelView, model=ScheduleItem):
+            info = await asyncio.to_thread(uploads.upload_info, file_obj)
+            if info.empty:
+                return
+            # Ошибки хранилища не глотаем: sqladmin покажет их в форме, материал не сохранится
+            stored = await blobs.put_file(file_obj.file, info.mimetype, digest=info.sha256, size=info.size)
+            # Старый файл отпускаем только после успешного сохранения материала
+            request.state.replaced_file_hash = model.file_hash
+            model.file_hash = stored.sha256
+            model.file_size = stored.size
+            model.file_mimetype = stored.mimetype
+
+    async def after_model_change(self, data, model, is_created, request: Request):
+        await super().after_model_change(data, model, is_created, request)
+        replaced = getattr(request.state, "replaced_file_hash", None)
+        if replaced and replaced != model.file_hash:
+            await blobs.release(replaced)
+
+    async def after_model_delete(self, model, request: Request):
+        await super().after_model_delete(model, request)
+        await blobs.release(model.file_hash)
+
+class ScheduleItemAdmin(ProjectionListMixin, ModelView, model=ScheduleItem):
     name = "Занятие"
     name_plural = "Расписание"
     icon = "fa-solid fa-calendar-day"
     can_export = True
+    list_projection = True
     column_list = [
         ScheduleItem.schedule_id, 
         ScheduleItem.student, 
@@ -281,11 +350,20 @@ class ScheduleItemAdmin(ModelView, model=ScheduleItem):
     ]
     column_searchable_list = [ScheduleItem.event_name]
 
-class AttestationTestAdmin(ModelView, model=AttestationTest):
+    async def after_model_change(self, data, model, is_created, request: Request):
+        await super().after_model_change(data, model, is_created, request)
+        await reminder_scheduler.notify_changed(model.schedule_id)
+
+    async def after_model_delete(self, model, request: Request):
+        await super().after_model_delete(model, request)
+        await reminder_scheduler.notify_changed(model.schedule_id)
+
+class AttestationTestAdmin(ProjectionListMixin, ModelView, model=AttestationTest):
     name = "Тест"
     name_plural = "Тесты"
     icon = "fa-solid fa-vial"
     can_export = True
+    list_projection = True
     column_list = [
         AttestationTest.test_id, 
         AttestationTest.title, 
@@ -314,11 +392,15 @@ class AttestationTestAdmin(ModelView, model=AttestationTest):
     ]
     column_searchable_list = [AttestationTest.title]
 
-class StudentModuleProgressAdmin(ModelView, model=StudentModuleProgress):
+class StudentModuleProgressAdmin(EstimatedCountMixin, ProjectionListMixin, ModelView, model=StudentModuleProgress):
     name = "Прогресс"
     name_plural = "Прогресс студентов"
     icon = "fa-solid fa-chart-line"
     can_export = True
+    list_projection = True
+    export_types = ["csv", "parquet"]
+    parquet_dictionary_columns = ["status"]
+    estimate_count = True
     column_list = [
         StudentModuleProgress.progress_id, 
         StudentModuleProgress.student, 
@@ -345,12 +427,17 @@ class StudentModuleProgressAdmin(ModelView, model=StudentModuleProgress):
         StudentModuleProgress.progress_percentage
     ]
 
-class MessageAdmin(ModelView, model=Message):
+class MessageAdmin(EstimatedCountMixin, ProjectionListMixin, ModelView, model=Message):
     name = "Сообщение"
     name_plural = "История чатов"
     icon = "fa-solid fa-comment-dots"
     can_create = False
     can_export = True
+    list_projection = True
+    export_types = ["csv", "parquet"]
+    parquet_dictionary_columns = ["sender_type", "role", "message_type"]
+    export_watermark_column = "created_at"
+    estimate_count = True
     column_list = [
         Message.message_id, 
         Message.student, 
@@ -374,13 +461,24 @@ class MessageAdmin(ModelView, model=Message):
         Message.role,
         Message.created_at
     ]
+    # По created_at список читает секции messages от новой к старой и останавливается на первой же
+    column_default_sort = [(Message.created_at, True)]
     column_searchable_list = [Message.text_content]
+    column_details_exclude_list = [Message.search_vector]
+    form_excluded_columns = [Message.search_vector]
 
-class RateLimitAdmin(ModelView, model=RateLimit):
+    def search_query(self, stmt, term):
+        # Вместо ILIKE по всей таблице — GIN-индексы search_vector и pg_trgm
+        condition, _ = message_search.search_clause(term)
+        return stmt.filter(condition)
+
+class RateLimitAdmin(EstimatedCountMixin, ProjectionListMixin, ModelView, model=RateLimit):
     name = "Лимит"
     name_plural = "Лимиты GPT"
     icon = "fa-solid fa-stopwatch"
     can_export = True
+    list_projection = True
+    estimate_count = True
     column_list = [RateLimit.limit_id, RateLimit.student, RateLimit.limit_date, RateLimit.request_count]
     column_labels = {
         RateLimit.limit_id: "ID",
@@ -395,11 +493,15 @@ class RateLimitAdmin(ModelView, model=RateLimit):
         RateLimit.request_count
     ]
 
-class TestResultAdmin(ModelView, model=TestResult):
+class TestResultAdmin(EstimatedCountMixin, ProjectionListMixin, ModelView, model=TestResult):
     name = "Результат"
     name_plural = "Результаты тестов"
     icon = "fa-solid fa-poll"
     can_export = True
+    list_projection = True
+    export_types = ["csv", "parquet"]
+    export_watermark_column = "created_at"
+    estimate_count = True
     column_list = [
         TestResult.result_id, 
         TestResult.student, 
@@ -424,11 +526,12 @@ class TestResultAdmin(ModelView, model=TestResult):
         TestResult.created_at
     ]
 
-class FeedbackAdmin(ModelView, model=Feedback):
+class FeedbackAdmin(ProjectionListMixin, ModelView, model=Feedback):
     name = "Отзыв"
     name_plural = "Отзывы"
     icon = "fa-solid fa-star"
     can_export = True
+    list_projection = True
     column_list = [
         Feedback.id, 
         Feedback.student, 
@@ -452,6 +555,85 @@ class FeedbackAdmin(ModelView, model=Feedback):
     ]
     column_searchable_list = [Feedback.comment]
 
+class LatencyRollupAdmin(ModelView, model=LatencyRollup):
+    """Только чтение rollup'ов: сырые сообщения для перцентилей не читаются"""
+    name = "Задержки"
+    name_plural = "Задержки ответов"
+    icon = "fa-solid fa-gauge-high"
+    can_create = False
+    can_edit = False
+    can_delete = False
+    can_export = True
+    column_list = [
+        LatencyRollup.bucket_start,
+        LatencyRollup.granularity,
+        LatencyRollup.program,
+        LatencyRollup.message_type,
+        LatencyRollup.count,
+        "avg_ms",
+        "p50_ms",
+        "p95_ms",
+        "p99_ms",
+        LatencyRollup.max_ms,
+    ]
+    column_details_exclude_list = [LatencyRollup.histogram]
+    column_labels = {
+        LatencyRollup.bucket_start: "Период",
+        LatencyRollup.granularity: "Шаг",
+        LatencyRollup.program: "Программа",
+        LatencyRollup.message_type: "Тип сообщения",
+        LatencyRollup.count: "Сообщений",
+        "avg_ms": "Среднее, мс",
+        "p50_ms": "p50, мс",
+        "p95_ms": "p95, мс",
+        "p99_ms": "p99, мс",
+        LatencyRollup.max_ms: "Макс., мс",
+    }
+    column_sortable_list = [
+        LatencyRollup.bucket_start,
+        LatencyRollup.granularity,
+        LatencyRollup.message_type,
+        LatencyRollup.count,
+        LatencyRollup.max_ms,
+    ]
+    column_default_sort = [(LatencyRollup.bucket_start, True)]
+
+class MessageArchiveSegmentAdmin(ProjectionListMixin, ModelView, model=MessageArchiveSegment):
+    """Только чтение: сегменты пишет и удаляет app/services/message_archive.py"""
+    name = "Архив сообщений"
+    name_plural = "Архив сообщений"
+    icon = "fa-solid fa-box-archive"
+    can_create = False
+    can_edit = False
+    can_delete = False
+    list_projection = True
+    column_list = [
+        MessageArchiveSegment.month,
+        MessageArchiveSegment.student,
+        MessageArchiveSegment.message_count,
+        MessageArchiveSegment.first_created_at,
+        MessageArchiveSegment.last_created_at,
+        MessageArchiveSegment.codec,
+        MessageArchiveSegment.archived_at,
+    ]
+    column_labels = {
+        MessageArchiveSegment.month: "Месяц",
+        MessageArchiveSegment.student: "Студент",
+        MessageArchiveSegment.message_count: "Сообщений",
+        MessageArchiveSegment.first_created_at: "Первое",
+        MessageArchiveSegment.last_created_at: "Последнее",
+        MessageArchiveSegment.codec: "Сжатие",
+        MessageArchiveSegment.blob_sha256: "Файл (SHA-256)",
+        MessageArchiveSegment.archived_at: "Заархивирован",
+    }
+    column_sortable_list = [
+        MessageArchiveSegment.month,
+        MessageArchiveSegment.student,
+        MessageArchiveSegment.message_count,
+        MessageArchiveSegment.archived_at,
+    ]
+    column_default_sort = [(MessageArchiveSegment.month, True)]
+
 class AdminAuth(AuthenticationBackend):
     async def login(self, request: Request) -> bool:
         form = await request.form()
@@ -469,9 +651,40 @@ class AdminAuth(AuthenticationBackend):
     async def authenticate(self, request: Request) -> bool:
         return bool(request.session.get("authenticated"))
 
+class TutorAdmin(Admin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Списки в проекционном режиме отдают ProjectedRow вместо ORM-объектов
+        self.templates.env.globals["get_object_identifier"] = object_identifier
+
+    async def _handle_form_data(self, request: Request, obj=None):
+        # Формы с файлами разбираем потоково, с лимитом размера и хэшем по ходу записи
+        model_view = self._find_model_view(request.path_params["identity"])
+        max_size = getattr(model_view, "upload_max_size", None)
+        if max_size and request.method == "POST":
+            await uploads.parse_form(request, max_size)
+        return await super()._handle_form_data(request, obj)
+
+    @login_required
+    async def export(self, request: Request):
+        # CSV пишем потоково серверным курсором; остальное — стандартным путём sqladmin
+        model_view = self._find_model_view(request.path_params["identity"])
+        export_type = request.path_params["export_type"]
+        if export_type == "parquet":
+            await self._export(request)
+            since = parquet.parse_watermark(request.query_params.get("since"))
+            return parquet.stream_parquet(model_view, since)
+        if export_type == "csv" and export.can_stream_export(model_view):
+            await self._export(request)
+            return export.stream_csv(model_view)
+        return await super().export(request)
+
 def setup_admin(app):
     auth_backend = AdminAuth(secret_key=settings.SECRET_KEY)
-    admin = Admin(app, engine, title="TutorAI Admin", authentication_backend=auth_backend)
+    # Отдельная фабрика: sqladmin перенастраивает переданный session_maker (autoflush=False)
+    # Движок выбирает RoutingSession.get_bind при первом запросе — настройка админки не подключается к БД
+    session_maker = async_sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession)
+    admin = TutorAdmin(app, session_maker=session_maker, title="TutorAI Admin", authentication_backend=auth_backend)
     admin.add_view(StudentAdmin)
     admin.add_view(ProgramAdmin)
     admin.add_view(CourseModuleAdmin)
@@ -484,4 +697,6 @@ def setup_admin(app):
     admin.add_view(RateLimitAdmin)
     admin.add_view(TestResultAdmin)
     admin.add_view(FeedbackAdmin)
+    admin.add_view(LatencyRollupAdmin)
+    admin.add_view(MessageArchiveSegmentAdmin)
     return admin
@@ -1,7 +1,88 @@
-from fastapi import APIRouter
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.http import etag_matches, parse_range_header, RangeNotSatisfiable
+from app.core.storage import get_blob_store
+from app.services.curriculum import curriculum_cache
+from app.models.education import CourseMaterial
 
 router = APIRouter(prefix="/materials", tags=["materials"])
 
 @router.get("/")
 async def get_materials():
     return {"message": "Materials API - coming soon"}
+
+
+@router.get("/curriculum/{program_id}")
+async def get_curriculum(program_id: int, request: Request):
+    """
+    Учебный план программы (модули, темы, материалы, часы, порядок) из снапшота в памяти.
+    Клиент может присылать If-None-Match и получать 304, пока план не менялся.
+    """
+    snapshot = await curriculum_cache.get(program_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Программа не найдена")
+
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+
+@router.get("/{material_id}/download")
+async def download_material(material_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """Скачивание файла материала с поддержкой Range/206 и ETag/304"""
+    row = (await db.execute(
+        select(
+            CourseMaterial.title,
+            CourseMaterial.file_mimetype,
+            CourseMaterial.file_size,
+            CourseMaterial.file_hash,
+        ).where(CourseMaterial.material_id == material_id)
+    )).first()
+    if row is None or row.file_hash is None:
+        raise HTTPException(status_code=404, detail="Файл материала не найден")
+
+    size = row.file_size or 0
+    # Файл адресуется по содержимому, так что SHA-256 — готовый сильный ETag
+    etag = f'"{row.file_hash}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(row.title)}",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        # Файл изменился с момента частичной загрузки — отдаём целиком
+        range_header = None
+
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except RangeNotSatisfiable:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        get_blob_store().iter_range(row.file_hash, start, end, settings.MATERIAL_DOWNLOAD_CHUNK_SIZE),
+        status_code=status_code,
+        media_type=row.file_mimetype or "application/octet-stream",
+        headers=headers,
+    )
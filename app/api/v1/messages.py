@@ -1,7 +1,266 @@
-from fastapi import APIRouter
+import base64
+import json
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Dict, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_db
+from app.models.education import Message, Student
+from app.services.message_buffer import message_buffer, BufferFull
+from app.services import message_archive, message_search
+from app.services.latency_rollup import query_percentiles
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
-@router.get("/")
-async def get_messages():
-    return {"message": "Messages API - coming soon"}
+
+class MessageOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    message_id: int
+    student_id: int
+    role: Optional[str] = None
+    sender_type: str
+    text_content: str
+    processing_ms: Optional[int] = None
+    telegram_user_id: Optional[int] = None
+    message_type: Optional[str] = None
+    created_at: datetime
+
+
+class MessagePage(BaseModel):
+    items: List[MessageOut]
+    next_cursor: Optional[str] = None
+
+
+class MessageSearchHit(MessageOut):
+    rank: Optional[float] = None
+
+
+class MessageSearchPage(BaseModel):
+    items: List[MessageSearchHit]
+
+
+class LatencyPointOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    bucket_start: Optional[datetime] = None
+    program_id: Optional[int] = None
+    message_type: Optional[str] = None
+    count: int
+    avg_ms: Optional[float] = None
+    max_ms: int
+    percentiles: Dict[str, Optional[float]]
+
+
+class LatencyReport(BaseModel):
+    granularity: str
+    series: List[LatencyPointOut]
+    total: LatencyPointOut
+
+
+class MessageIn(BaseModel):
+    student_id: int
+    role: Optional[str] = Field(None, max_length=20)
+    sender_type: str = Field(max_length=20)
+    text_content: str
+    processing_ms: Optional[int] = 0
+    telegram_user_id: Optional[int] = None
+    message_type: Optional[str] = Field(None, max_length=50)
+    # Если не передано — время приёма API
+    created_at: Optional[datetime] = None
+
+
+class MessageBatchIn(BaseModel):
+    messages: List[MessageIn] = Field(min_length=1, max_length=1000)
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), message_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+
+
+def _position(item) -> Tuple[datetime, int]:
+    # Строка из messages (ORM) или запись архивного сегмента (dict)
+    if isinstance(item, dict):
+        return item["created_at"], item["message_id"]
+    return item.created_at, item.message_id
+
+
+@router.get("/", response_model=MessagePage)
+async def get_messages(
+    student_id: int,
+    role: Optional[str] = None,
+    sender_type: Optional[str] = None,
+    message_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    order: Literal["desc", "asc"] = "desc",
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    История сообщений студента с keyset-пагинацией по (created_at, message_id).
+    Страница читается по индексу idx_messages_student_created с позиции курсора,
+    поэтому время ответа не зависит от глубины страницы (в отличие от OFFSET).
+    Старые месяцы, вынесенные в архив (app/services/message_archive.py), дочитываются
+    из сегментов: при desc — когда горячие строки кончились, при asc — до горячих.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    filters = {"role": role, "sender_type": sender_type, "message_type": message_type}
+
+    async def hot(after: Optional[Tuple[datetime, int]], count: int) -> list:
+        stmt = select(Message).where(Message.student_id == student_id)
+        for name, value in filters.items():
+            if value is not None:
+                stmt = stmt.where(getattr(Message, name) == value)
+
+        key = tuple_(Message.created_at, Message.message_id)
+        if after is not None:
+            created_at, message_id = after
+            position_key = tuple_(created_at, message_id)
+            # Сравнение кортежей не отсекает секции messages — дублируем границу по created_at
+            if order == "desc":
+                stmt = stmt.where(key < position_key, Message.created_at <= created_at)
+            else:
+                stmt = stmt.where(key > position_key, Message.created_at >= created_at)
+
+        if order == "desc":
+            stmt = stmt.order_by(Message.created_at.desc(), Message.message_id.desc())
+        else:
+            stmt = stmt.order_by(Message.created_at.asc(), Message.message_id.asc())
+        return list((await db.scalars(stmt.limit(count))).all())
+
+    async def archived(after: Optional[Tuple[datetime, int]], count: int) -> list:
+        return await message_archive.read_history(db, student_id, order, count, after, filters)
+
+    # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+    first, second = (hot, archived) if order == "desc" else (archived, hot)
+    rows = await first(position, limit + 1)
+    if len(rows) <= limit:
+        rows += await second(_position(rows[-1]) if rows else position, limit + 1 - len(rows))
+
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(*_position(items[-1]))
+
+    return MessagePage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/search", response_model=MessageSearchPage)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    mode: Optional[Literal["fulltext", "substring"]] = None,
+    student_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Поиск по тексту сообщений: fulltext (словоформы, ранжирование ts_rank_cd),
+    substring (подстрока через pg_trgm) или оба сразу, если mode не указан.
+    Фильтры по студенту и датам сужают выборку по btree-индексам.
+    """
+    condition, rank = message_search.search_clause(q, mode)
+    columns = [Message] if rank is None else [Message, rank.label("rank")]
+    stmt = select(*columns).where(condition)
+    if student_id is not None:
+        stmt = stmt.where(Message.student_id == student_id)
+    if date_from is not None:
+        stmt = stmt.where(Message.created_at >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Message.created_at < date_to)
+
+    if rank is not None:
+        stmt = stmt.order_by(rank.desc(), Message.created_at.desc())
+    else:
+        stmt = stmt.order_by(Message.created_at.desc())
+
+    result = await db.execute(stmt.limit(limit).offset(offset))
+    items = []
+    for row in result:
+        hit = MessageSearchHit.model_validate(row[0])
+        if rank is not None:
+            hit.rank = row[1]
+        items.append(hit)
+    return MessageSearchPage(items=items)
+
+
+@router.get("/latency", response_model=LatencyReport)
+async def latency_percentiles(
+    date_from: datetime,
+    date_to: datetime,
+    granularity: Literal["hour", "day"] = "hour",
+    percentiles: List[float] = Query([50, 95, 99]),
+    program_id: Optional[int] = None,
+    message_type: Optional[str] = None,
+    group_by: Optional[Literal["program", "message_type"]] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Перцентили processing_ms за период по часовым/суточным rollup'ам (latency_rollups).
+    Сырые сообщения не читаются; последние LATENCY_ROLLUP_LAG секунд ещё не свёрнуты.
+    message_type="" — сообщения без типа.
+    """
+    if any(not 0 < q <= 100 for q in percentiles):
+        raise HTTPException(status_code=422, detail="Перцентили должны быть в диапазоне (0, 100]")
+    series, total = await query_percentiles(
+        db, granularity, date_from, date_to, percentiles,
+        program_id=program_id, message_type=message_type, group_by=group_by,
+    )
+    return LatencyReport(granularity=granularity, series=series, total=total)
+
+
+@router.post("/batch", status_code=202)
+async def ingest_messages(
+    batch: MessageBatchIn,
+    response: Response,
+    wait: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Пакетный приём сообщений бота. Записи попадают в write-behind буфер и пишутся
+    в БД пачками через COPY; 202 — принято в буфер, 201 (wait=true) — уже записано.
+    При переполнении буфера — 503 с Retry-After.
+    """
+    student_ids = {m.student_id for m in batch.messages}
+    known = set(await db.scalars(select(Student.student_id).where(Student.student_id.in_(student_ids))))
+    unknown = student_ids - known
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Неизвестные student_id: {sorted(unknown)}")
+
+    now = datetime.now(timezone.utc)
+    records = [
+        (m.student_id, m.role, m.sender_type, m.text_content, m.processing_ms,
+         m.telegram_user_id, m.message_type, m.created_at or now)
+        for m in batch.messages
+    ]
+    try:
+        await message_buffer.put_many(records, wait=wait)
+    except BufferFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    if wait:
+        response.status_code = 201
+    return {"accepted": len(records)}
+
+
+@router.get("/batch/stats")
+async def ingest_stats():
+    """Состояние write-behind буфера"""
+    return asdict(message_buffer.get_stats())
@@ -1,7 +1,63 @@
-from fastapi import APIRouter
+from dataclasses import asdict
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.services.identity_cache import identity_cache, IDENTITY_FIELDS
+from app.services.rate_limiter import rate_limiter
 
 router = APIRouter(prefix="/students", tags=["students"])
 
 @router.get("/")
 async def get_students():
     return {"message": "Students API - coming soon"}
+
+
+@router.get("/resolve")
+async def resolve_student(
+    telegram_user_id: Optional[int] = None,
+    telegram_chat_id: Optional[int] = None,
+    max_user_id: Optional[int] = None,
+    max_chat_id: Optional[int] = None,
+):
+    """Находит студента и его программу по одному из идентификаторов мессенджера (через кэш)"""
+    given = {
+        field: value
+        for field, value in zip(IDENTITY_FIELDS, (telegram_user_id, telegram_chat_id, max_user_id, max_chat_id))
+        if value is not None
+    }
+    if len(given) != 1:
+        raise HTTPException(status_code=400, detail=f"Укажите ровно один из параметров: {', '.join(IDENTITY_FIELDS)}")
+    (field, value), = given.items()
+    identity = await identity_cache.resolve(field, value)
+    if identity is None:
+        raise HTTPException(status_code=404, detail="Студент не найден")
+    return asdict(identity)
+
+
+@router.get("/identity-cache/stats")
+async def identity_cache_stats():
+    """Попадания/промахи кэша идентификаторов — для подбора IDENTITY_CACHE_MAX_SIZE"""
+    return identity_cache.get_stats()
+
+
+@router.get("/rate-limit/stats")
+async def rate_limit_stats():
+    """Счётчики лимитера, в том числе сэкономленные записи в rate_limits"""
+    return rate_limiter.get_stats()
+
+
+@router.post("/{student_id}/rate-limit")
+async def consume_rate_limit(student_id: int, cost: int = Query(1, ge=1, le=100)):
+    """
+    Проверяет и списывает квоту GPT-запросов студента без обращения к БД.
+    429 с Retry-After — квота или лимит всплеска исчерпаны.
+    """
+    if cost > rate_limiter.burst:
+        # Ведро вмещает не больше burst токенов — такой запрос не пройдёт никогда, повтор бесполезен
+        raise HTTPException(status_code=422, detail=f"cost больше лимита всплеска ({rate_limiter.burst})")
+    decision = rate_limiter.check_and_consume(student_id, cost)
+    if not decision.allowed:
+        headers = {"Retry-After": str(int(decision.retry_after) + 1)} if decision.retry_after is not None else None
+        raise HTTPException(status_code=429, detail={"remaining": decision.remaining}, headers=headers)
+    return {"allowed": True, "remaining": decision.remaining}
@@ -0,0 +1,235 @@
+"""
+Сжатие ответов (gzip / brotli) по Accept-Encoding.
+
+Кодировка выбирается по q-значениям заголовка; brotli доступен, если установлен пакет
+`brotli`, при равных q он предпочтительнее gzip. Сжимаются только текстовые типы
+(HTML, CSS, JS, JSON, CSV, ...) и только ответы от COMPRESSION_MIN_SIZE байт: мелкий ответ
+сжатием не ускорить. Потоковые ответы (CSV-экспорт) сжимаются на лету: каждый кусок
+тела сбрасывается в сеть сразу (sync flush), клиент видит данные по мере выгрузки.
+
+Не трогаем: ответы с Content-Encoding, частичные (Range/206), HEAD и Cache-Control:
+no-transform. Сильный ETag сжатого ответа получает суффикс кодировки ("<etag>-gzip"):
+у сжатого и несжатого представления разные байты. Во входящем If-None-Match суффикс
+снимается, так что обработчики сравнивают свой исходный ETag и отвечают 304 как раньше.
+"""
+
+import zlib
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+}
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type in COMPRESSIBLE_TYPES
+        or media_type.endswith("+json")
+        or media_type.endswith("+xml")
+    )
+
+
+def available_encodings() -> List[str]:
+    # В порядке предпочтения при равных q
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Выбирает кодировку по Accept-Encoding (RFC 9110, 12.5.3); None — отдаём без сжатия"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in available_encodings():
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _etag_suffix(encoding: str) -> str:
+    return f'-{encoding}"'
+
+
+def strip_etag_encoding(if_none_match: str) -> str:
+    """Снимает суффиксы кодировок с тегов If-None-Match: "<etag>-gzip" -> "<etag>" """
+    tags = []
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        for encoding in ("br", "gzip"):
+            suffix = _etag_suffix(encoding)
+            if tag.endswith(suffix):
+                tag = tag[: -len(suffix)] + '"'
+                break
+        tags.append(tag)
+    return ", ".join(tags)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    # Слабый ETag допускает разные байты у одного представления — его не меняем
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return etag[:-1] + _etag_suffix(encoding)
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits=31 — формат gzip (заголовок и CRC)
+            self._obj = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data) + self._obj.flush()
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data) + self._obj.finish()
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_FINISH)
+
+
+def _add_vary(headers: MutableHeaders) -> None:
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower() and vary.strip() != "*":
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding"))
+        if encoding is None or "range" in request_headers:
+            return await self.app(scope, receive, send)
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            stripped = strip_etag_encoding(if_none_match)
+            if stripped != if_none_match:
+                scope = dict(scope)
+                scope["headers"] = [
+                    (name, stripped.encode("latin-1") if name == b"if-none-match" else value)
+                    for name, value in scope["headers"]
+                ]
+        await self.app(scope, receive, _CompressingSender(send, encoding, if_none_match))
+
+
+class _CompressingSender:
+    """Обёртка send: решает по заголовкам и первым кускам тела, сжимать ли ответ"""
+
+    def __init__(self, send, encoding: str, if_none_match: Optional[str]):
+        self.send = send
+        self.encoding = encoding
+        self.if_none_match = if_none_match or ""
+        self.start = None
+        self.active = False
+        self.compressor = None
+        self.buffer: List[bytes] = []
+        self.buffered = 0
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=list(message.get("headers", [])))
+            self._prepare(message["status"], headers)
+            self.start = {**message, "headers": headers.raw}
+            if not self.active:
+                await self.send(self.start)
+            return
+        if message["type"] != "http.response.body" or not self.active:
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is not None:
+            data = self.compressor.compress(body) if more_body else self.compressor.finish(body)
+            return await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        self.buffer.append(body)
+        self.buffered += len(body)
+        if more_body and self.buffered < settings.COMPRESSION_MIN_SIZE:
+            return
+
+        data = b"".join(self.buffer)
+        self.buffer = []
+        headers = MutableHeaders(raw=self.start["headers"])
+        if not more_body and len(data) < settings.COMPRESSION_MIN_SIZE:
+            # Весь ответ меньше порога — отдаём как есть
+            await self.send(self.start)
+            return await self.send({"type": "http.response.body", "body": data, "more_body": False})
+
+        self.compressor = _Compressor(self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        if "etag" in headers:
+            headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+        if more_body:
+            del headers["content-length"]
+            data = self.compressor.compress(data)
+        else:
+            data = self.compressor.finish(data)
+            headers["Content-Length"] = str(len(data))
+        await self.send(self.start)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _prepare(self, status: int, headers: MutableHeaders) -> None:
+        if status == 304:
+            # 304 на сжатое представление: клиент прислал "<etag>-<кодировка>", возвращаем его же
+            etag = headers.get("etag")
+            if etag and encoded_etag(etag, self.encoding) in self.if_none_match:
+                headers["ETag"] = encoded_etag(etag, self.encoding)
+                _add_vary(headers)
+            return
+        if not is_compressible(headers.get("content-type")):
+            return
+        _add_vary(headers)
+        if (
+            status != 200
+            or "content-encoding" in headers
+            or "content-range" in headers
+            or "no-transform" in headers.get("cache-control", "").lower()
+        ):
+            return
+        self.active = True
@@ -0,0 +1,122 @@
+"""
+Условные GET-запросы: сильные ETag по содержимому и 304 Not Modified.
+
+ConditionalGetMiddleware добавляет ETag (хэш тела) к успешным GET-ответам API под
+префиксами HTTP_ETAG_PATHS, у которых своего ETag нет, и отвечает 304, если клиент
+прислал совпадающий If-None-Match. Тело копится до MAX_BUFFERED_BODY; ответ больше
+(потоковый экспорт, файлы) уходит без ETag. Ответы со своим ETag (учебный план, файлы
+материалов) обработчики проверяют сами.
+
+ContentHashStaticFiles — StaticFiles для /static, у которого ETag — хэш содержимого
+файла, а не mtime и размер: после деплоя с новым mtime кэш браузера остаётся валидным,
+пока файл не поменялся.
+"""
+
+import hashlib
+import os
+from typing import Dict, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app.core.config import settings
+from app.core.http import etag_matches
+
+# Заголовки, которые сохраняются в 304 (RFC 9110, 15.4.5)
+NOT_MODIFIED_HEADERS = {"cache-control", "content-location", "date", "etag", "expires", "vary"}
+# Тело больше этого не держим в памяти ради ETag
+MAX_BUFFERED_BODY = 1024 * 1024
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _etag_prefixes() -> Tuple[str, ...]:
+    return tuple(prefix.strip() for prefix in settings.HTTP_ETAG_PATHS.split(",") if prefix.strip())
+
+
+class ConditionalGetMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.prefixes = _etag_prefixes()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(self.prefixes)
+        ):
+            return await self.app(scope, receive, send)
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start = None
+        chunks = []
+        buffered = 0
+
+        async def wrapped(message):
+            nonlocal start, buffered
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                if message["status"] == 200 and "etag" not in headers:
+                    start = message
+                    return
+                return await send(message)
+            if message["type"] != "http.response.body" or start is None:
+                return await send(message)
+
+            body = message.get("body", b"")
+            chunks.append(body)
+            buffered += len(body)
+            more_body = message.get("more_body", False)
+            if more_body and buffered <= MAX_BUFFERED_BODY:
+                return
+
+            pending, start = start, None
+            body, chunks[:] = b"".join(chunks), []
+            if more_body:
+                # Большой потоковый ответ — отдаём без ETag
+                await send(pending)
+                return await send({"type": "http.response.body", "body": body, "more_body": True})
+
+            etag = content_etag(body)
+            headers = MutableHeaders(raw=list(pending.get("headers", [])))
+            headers["ETag"] = etag
+            if etag_matches(if_none_match, etag):
+                raw = [(k, v) for k, v in headers.raw if k.decode("latin-1") in NOT_MODIFIED_HEADERS]
+                await send({"type": "http.response.start", "status": 304, "headers": raw})
+                return await send({"type": "http.response.body", "body": b"", "more_body": False})
+            await send({**pending, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, wrapped)
+
+
+class ContentHashStaticFiles(StaticFiles):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (путь, mtime_ns, размер) -> ETag; статики в проекте немного
+        self._etags: Dict[Tuple[str, int, int], str] = {}
+
+    def _etag(self, full_path, stat_result: os.stat_result) -> str:
+        key = (str(full_path), stat_result.st_mtime_ns, stat_result.st_size)
+        etag = self._etags.get(key)
+        if etag is None:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(full_path, "rb") as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b""):
+                    digest.update(chunk)
+            etag = f'"{digest.hexdigest()}"'
+            self._etags[key] = etag
+        return etag
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["ETag"] = self._etag(full_path, stat_result)
+        # Браузер кэширует, но каждый раз сверяет ETag
+        response.headers.setdefault("Cache-Control", "no-cache")
+        if etag_matches(Headers(scope=scope).get("if-none-match"), response.headers["etag"]):
+            return NotModifiedResponse(response.headers)
+        return response
+
@@ -6,6 +6,14 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", case_sensitive=False)
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    # Реплики для чтения через запятую; GET-запросы читают из них (см. app/core/db_routing.py)
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    # Сколько секунд после записи клиент читает из primary
+    DB_READ_AFTER_WRITE_SECONDS: float = float(os.getenv("DB_READ_AFTER_WRITE_SECONDS", "10"))
+    # Сколько соединений открыть при старте (lifespan); 0 — пул заполняется по мере запросов
+    DB_POOL_WARMUP: int = int(os.getenv("DB_POOL_WARMUP", "0"))
+    # Сколько одинаковых SELECT за запрос считать признаком N+1 (метрика db_n_plus_one_total)
+    METRICS_N_PLUS_ONE_THRESHOLD: int = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "10"))
     
     # Supabase
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
@@ -17,6 +25,13 @@ class Settings(BaseSettings):
     VERSION: str = "1.0.0"
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
 
+    # Logging (app/core/log.py)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "")  # пусто — DEBUG при DEBUG=true, иначе INFO
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # json | text
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")  # "app.services=DEBUG,sqlalchemy.pool=INFO"
+    SQL_ECHO_SAMPLE_RATE: float = float(os.getenv("SQL_ECHO_SAMPLE_RATE", "0"))
+    SQL_ECHO_ROUTE_RATES: str = os.getenv("SQL_ECHO_ROUTE_RATES", "")  # "/admin/message/list=1,background=0"
+
     # Admin auth
     ADMIN_USERNAME: str = os.getenv("ADMIN_USERNAME", "admin")
     ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD", "admin")
@@ -28,4 +43,85 @@ class Settings(BaseSettings):
     # Feature flags
     ADMIN_I18N_ENABLED: bool = os.getenv("ADMIN_I18N_ENABLED", "true").lower() == "true"
 
+    # Admin list counts
+    ADMIN_ESTIMATED_COUNT_THRESHOLD: int = int(os.getenv("ADMIN_ESTIMATED_COUNT_THRESHOLD", "100000"))
+    ADMIN_COUNT_CACHE_TTL: float = float(os.getenv("ADMIN_COUNT_CACHE_TTL", "30"))
+    ADMIN_COUNT_CACHE_MAX_SIZE: int = int(os.getenv("ADMIN_COUNT_CACHE_MAX_SIZE", "256"))
+    # Строк за одну выборку серверного курсора при CSV-экспорте
+    ADMIN_EXPORT_BATCH_SIZE: int = int(os.getenv("ADMIN_EXPORT_BATCH_SIZE", "2000"))
+    # Parquet: строк в row group; отставание watermark инкрементальной выгрузки от now() (сек)
+    ADMIN_PARQUET_ROW_GROUP_SIZE: int = int(os.getenv("ADMIN_PARQUET_ROW_GROUP_SIZE", "50000"))
+    ADMIN_EXPORT_WATERMARK_LAG: float = float(os.getenv("ADMIN_EXPORT_WATERMARK_LAG", "60"))
+
+    # Сжатие ответов: порог в байтах, уровень gzip (1-9), качество brotli (0-11, нужен пакет brotli)
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    # Префиксы путей, GET-ответам которых ставится ETag по содержимому (и 304)
+    HTTP_ETAG_PATHS: str = os.getenv("HTTP_ETAG_PATHS", "/api/")
+
+    # Materials
+    MATERIAL_DOWNLOAD_CHUNK_SIZE: int = int(os.getenv("MATERIAL_DOWNLOAD_CHUNK_SIZE", str(256 * 1024)))
+    # Максимальный размер файла, загружаемого в материал через админку (байт)
+    MATERIAL_UPLOAD_MAX_SIZE: int = int(os.getenv("MATERIAL_UPLOAD_MAX_SIZE", str(100 * 1024 * 1024)))
+
+    # Blob storage (local | s3)
+    BLOB_STORAGE_BACKEND: str = os.getenv("BLOB_STORAGE_BACKEND", "local")
+    BLOB_STORAGE_PATH: str = os.getenv("BLOB_STORAGE_PATH", "storage/blobs")
+    # gc не пересчитывает файлы, сохранённые за последние N секунд (ссылка на них может быть ещё не закоммичена)
+    BLOB_GC_GRACE_SECONDS: float = float(os.getenv("BLOB_GC_GRACE_SECONDS", "600"))
+    S3_BUCKET: str = os.getenv("S3_BUCKET", "")
+    S3_ENDPOINT_URL: str = os.getenv("S3_ENDPOINT_URL", "")
+    S3_PREFIX: str = os.getenv("S3_PREFIX", "")
+    S3_REGION: str = os.getenv("S3_REGION", "")
+    S3_ACCESS_KEY_ID: str = os.getenv("S3_ACCESS_KEY_ID", "")
+    S3_SECRET_ACCESS_KEY: str = os.getenv("S3_SECRET_ACCESS_KEY", "")
+
+    # Message write-behind buffer
+    MESSAGE_BUFFER_MAX_SIZE: int = int(os.getenv("MESSAGE_BUFFER_MAX_SIZE", "20000"))
+    MESSAGE_BUFFER_FLUSH_SIZE: int = int(os.getenv("MESSAGE_BUFFER_FLUSH_SIZE", "500"))
+    MESSAGE_BUFFER_FLUSH_INTERVAL: float = float(os.getenv("MESSAGE_BUFFER_FLUSH_INTERVAL", "0.5"))
+    MESSAGE_BUFFER_PUT_TIMEOUT: float = float(os.getenv("MESSAGE_BUFFER_PUT_TIMEOUT", "2.0"))
+
+    # Monthly partitions of messages: how many months ahead to create, check interval (seconds)
+    MESSAGE_PARTITIONS_AHEAD: int = int(os.getenv("MESSAGE_PARTITIONS_AHEAD", "3"))
+    MESSAGE_PARTITIONS_INTERVAL: float = float(os.getenv("MESSAGE_PARTITIONS_INTERVAL", "21600"))
+
+    # Cold archive of old messages (app/services/message_archive.py): age in days, run interval (seconds),
+    # codec gzip | zstd (needs zstandard), how many decoded segments to keep in memory
+    MESSAGE_ARCHIVE_ENABLED: bool = os.getenv("MESSAGE_ARCHIVE_ENABLED", "false").lower() == "true"
+    MESSAGE_ARCHIVE_AFTER_DAYS: float = float(os.getenv("MESSAGE_ARCHIVE_AFTER_DAYS", "180"))
+    MESSAGE_ARCHIVE_INTERVAL: float = float(os.getenv("MESSAGE_ARCHIVE_INTERVAL", "86400"))
+    MESSAGE_ARCHIVE_CODEC: str = os.getenv("MESSAGE_ARCHIVE_CODEC", "gzip")
+    MESSAGE_ARCHIVE_CACHE_SEGMENTS: int = int(os.getenv("MESSAGE_ARCHIVE_CACHE_SEGMENTS", "256"))
+
+    # GPT rate limits
+    RATE_LIMIT_DAILY: int = int(os.getenv("RATE_LIMIT_DAILY", "50"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "5"))
+    RATE_LIMIT_REFILL_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_REFILL_PER_MINUTE", "10"))
+    RATE_LIMIT_FLUSH_INTERVAL: float = float(os.getenv("RATE_LIMIT_FLUSH_INTERVAL", "5"))
+    RATE_LIMIT_TIMEZONE: str = os.getenv("RATE_LIMIT_TIMEZONE", "UTC")
+
+    # Student identity cache (Telegram/Max IDs -> student)
+    IDENTITY_CACHE_MAX_SIZE: int = int(os.getenv("IDENTITY_CACHE_MAX_SIZE", "200000"))
+    IDENTITY_CACHE_TTL: float = float(os.getenv("IDENTITY_CACHE_TTL", "600"))
+    IDENTITY_CACHE_NEGATIVE_TTL: float = float(os.getenv("IDENTITY_CACHE_NEGATIVE_TTL", "30"))
+
+    # Curriculum snapshots
+    CURRICULUM_CACHE_TTL: float = float(os.getenv("CURRICULUM_CACHE_TTL", "300"))
+
+    # Latency rollups (processing_ms percentiles)
+    LATENCY_ROLLUP_INTERVAL: float = float(os.getenv("LATENCY_ROLLUP_INTERVAL", "300"))
+    LATENCY_ROLLUP_LAG: float = float(os.getenv("LATENCY_ROLLUP_LAG", "300"))
+    LATENCY_ROLLUP_MAX_HOURS: int = int(os.getenv("LATENCY_ROLLUP_MAX_HOURS", "168"))
+    LATENCY_ROLLUP_TIMEZONE: str = os.getenv("LATENCY_ROLLUP_TIMEZONE", "UTC")
+
+    # Schedule reminders (seconds): lead before event, look-ahead window, how far back to catch up after restart
+    REMINDER_SCHEDULER_ENABLED: bool = os.getenv("REMINDER_SCHEDULER_ENABLED", "true").lower() == "true"
+    REMINDER_LEAD: float = float(os.getenv("REMINDER_LEAD", "3600"))
+    REMINDER_WINDOW: float = float(os.getenv("REMINDER_WINDOW", "3600"))
+    REMINDER_CATCH_UP: float = float(os.getenv("REMINDER_CATCH_UP", "21600"))
+    REMINDER_BATCH_SIZE: int = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+    REMINDER_TIMEZONE: str = os.getenv("REMINDER_TIMEZONE", "UTC")
+
 settings = Settings()
\ No newline at end of file
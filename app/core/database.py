@@ -1,6 +1,15 @@
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core import log, metrics, startup
 
 
 def _ensure_asyncpg_url(url: str) -> str:
@@ -32,23 +41,127 @@ def _ensure_asyncpg_url(url: str) -> str:
     return url
 
 
-# Async engine with Supabase pooler compatibility
-engine = create_async_engine(
-    _ensure_asyncpg_url(settings.DATABASE_URL),
-    echo=settings.DEBUG,
-    future=True,
-    connect_args={
-        "server_settings": {
-            "application_name": "TutorAI Admin",
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который пишет в метрики время ожидания соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe_pool_wait(self._orig_logging_name or "primary", elapsed)
+            # Первый checkout открывает соединение — это время попадает в отчёт о старте
+            startup.record_once("first_db_connection", elapsed)
+
+
+def _create_engine(url: str, application_name: str, pool_name: str):
+    async_engine = create_async_engine(
+        _ensure_asyncpg_url(url),
+        # SQL пишет app.core.log с сэмплированием по маршрутам, а не синхронный echo движка
+        echo=False,
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_logging_name=pool_name,
+        connect_args={
+            "server_settings": {
+                "application_name": application_name,
+            },
+            "statement_cache_size": 0,  # Disable prepared statements for Supabase pooler
         },
-        "statement_cache_size": 0,  # Disable prepared statements for Supabase pooler
-    },
-)
+    )
+    metrics.instrument_engine(async_engine)
+    log.instrument_engine(async_engine)
+    return async_engine
+
+
+# Движки создаются при первом обращении, а не при импорте: импорт моделей, alembic и утилиты
+# не требуют DATABASE_URL, а холодный старт не тратит время на пул до первого запроса к БД
+_engine = None
+_replica_engines: Optional[List] = None
+
+
+def get_engine():
+    """Async engine primary (с совместимостью с пулером Supabase)"""
+    global _engine
+    if _engine is None:
+        _engine = _create_engine(settings.DATABASE_URL, "TutorAI Admin", "primary")
+    return _engine
+
+
+def get_replica_engines() -> List:
+    """Реплики для чтения (DATABASE_REPLICA_URLS через запятую); пусто — всё идёт в primary"""
+    global _replica_engines
+    if _replica_engines is None:
+        urls = [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+        _replica_engines = [
+            _create_engine(url, "TutorAI Admin (replica)", f"replica-{i}") for i, url in enumerate(urls)
+        ]
+    return _replica_engines
+
+
+async def warm_up_pool(connections: int) -> None:
+    """Открывает соединения заранее (не больше размера пула), чтобы первые запросы не ждали подключения"""
+    primary = get_engine()
+    connections = min(connections, primary.pool.size())
+    if connections <= 0:
+        return
+
+    async def ping():
+        async with primary.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(connections)))
+
+
+async def dispose_engines() -> None:
+    """Закрывает пулы; следующий get_engine() создаст движок заново"""
+    global _engine, _replica_engines
+    for async_engine in [_engine, *(_replica_engines or [])]:
+        if async_engine is not None:
+            await async_engine.dispose()
+    _engine, _replica_engines = None, None
+
+PRIMARY = "primary"
+REPLICA = "replica"
+
+# Маршрут текущего запроса: индекс реплики или None (primary). Ставится DatabaseRoutingMiddleware;
+# фоновые задачи вне запроса всегда работают с primary.
+db_route: ContextVar[Optional[int]] = ContextVar("db_route", default=None)
+
+
+def choose_replica() -> Optional[int]:
+    replicas = get_replica_engines()
+    return random.randrange(len(replicas)) if replicas else None
+
+
+def route_name(replica: Optional[int]) -> str:
+    return PRIMARY if replica is None else f"{REPLICA}-{replica}"
+
+
+class RoutingSession(Session):
+    """
+    Чтения в запросах, помеченных как read-only, идут в реплику; flush и DML — всегда в primary.
+    Сессия, однажды записавшая в primary, дальше читает оттуда же (read-after-write).
+    """
+
+    _pinned_primary = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = db_route.get()
+        is_write = self._flushing or (clause is not None and getattr(clause, "is_dml", False))
+        if is_write:
+            self._pinned_primary = True
+        replicas = get_replica_engines()
+        if replica is None or self._pinned_primary or replica >= len(replicas):
+            return get_engine().sync_engine
+        return replicas[replica].sync_engine
+
 
-# Session factory для async
+# Session factory для async; bind не нужен — движок выбирает RoutingSession.get_bind
 async_session = async_sessionmaker(
-    engine,
     class_=AsyncSession,
+    sync_session_class=RoutingSession,
     expire_on_commit=False
 )
 
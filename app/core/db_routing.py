@@ -0,0 +1,65 @@
+"""
+Маршрутизация запросов между primary и репликами.
+
+GET/HEAD-запросы (списки и карточки админки, экспорт, чтения API) читают из реплики,
+всё остальное — из primary. После записи браузер/клиент получает cookie, и следующие
+DB_READ_AFTER_WRITE_SECONDS секунд его чтения тоже идут в primary — чтобы после сохранения
+в админке сразу видеть свою правку, а не отстающую реплику. Выбранный маршрут
+возвращается в заголовке X-DB-Route (primary / replica-<N>).
+"""
+
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from app.core.config import settings
+from app.core.database import db_route, choose_replica, route_name, get_replica_engines
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+COOKIE_NAME = "db_primary_until"
+
+
+class DatabaseRoutingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        is_read = scope["method"] in READ_METHODS
+        replicas = get_replica_engines()
+        replica = None
+        if replicas and is_read and not self._recently_wrote(scope):
+            replica = choose_replica()
+        token = db_route.set(replica)
+        try:
+            wrote = bool(replicas) and not is_read
+            await self.app(scope, receive, self._with_route_header(send, replica, wrote))
+        finally:
+            db_route.reset(token)
+
+    @staticmethod
+    def _recently_wrote(scope) -> bool:
+        value = HTTPConnection(scope).cookies.get(COOKIE_NAME)
+        try:
+            return value is not None and float(value) > time.time()
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _with_route_header(send, replica, wrote: bool = False):
+        async def wrapped(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Route"] = route_name(replica)
+                if wrote and settings.DB_READ_AFTER_WRITE_SECONDS > 0:
+                    until = time.time() + settings.DB_READ_AFTER_WRITE_SECONDS
+                    headers.append(
+                        "Set-Cookie",
+                        f"{COOKIE_NAME}={until:.0f}; Max-Age={settings.DB_READ_AFTER_WRITE_SECONDS:.0f}; "
+                        "Path=/; HttpOnly; SameSite=Lax",
+                    )
+            await send(message)
+        return wrapped
@@ -0,0 +1,53 @@
+"""
+Лог-гистограммы задержек для rollup'ов processing_ms.
+
+Корзина i (0..len(BOUNDS_MS)) — то, что возвращает width_bucket(ms, BOUNDS_MS) в Postgres:
+0 — меньше BOUNDS_MS[0], i — [BOUNDS_MS[i-1], BOUNDS_MS[i]), последняя — от BOUNDS_MS[-1] и выше.
+Соседние границы отличаются примерно в 1.25 раза, так что ошибка перцентиля — в пределах ~12%.
+Границы зашиты в сохранённые гистограммы: менять их можно только вместе с пересборкой rollup'ов.
+"""
+
+from typing import List, Optional, Sequence
+
+BOUNDS_MS = (
+    1, 2, 3, 4, 5, 6, 7, 9, 12, 15, 18, 23, 28, 36, 44, 56, 69, 87, 108, 136, 169, 212, 265, 331,
+    414, 517, 646, 808, 1010, 1262, 1578, 1972, 2465, 3081, 3852, 4815, 6019, 7523, 9404, 11755,
+    14694, 18367, 22959, 28699, 35873, 44842, 56052, 70065, 87581, 109476, 136846, 171057, 213821,
+    267276,
+)
+BUCKETS = len(BOUNDS_MS) + 1
+
+
+def empty() -> List[int]:
+    return [0] * BUCKETS
+
+
+def merge(target: List[int], histogram: Sequence[int]) -> List[int]:
+    """Складывает гистограмму в target поэлементно"""
+    for i, count in enumerate(histogram):
+        target[i] += count
+    return target
+
+
+def percentile(histogram: Sequence[int], q: float, max_ms: Optional[int] = None) -> Optional[float]:
+    """
+    Оценка q-перцентиля (0 < q <= 100) с линейной интерполяцией внутри корзины.
+    max_ms ограничивает верх последней корзины и саму оценку.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = q / 100 * total
+    cumulative = 0
+    for i, count in enumerate(histogram):
+        if not count:
+            continue
+        if cumulative + count >= rank:
+            low = BOUNDS_MS[i - 1] if i > 0 else 0
+            high = BOUNDS_MS[i] if i < len(BOUNDS_MS) else (max_ms if max_ms is not None else low)
+            value = low + (high - low) * (rank - cumulative) / count
+            if max_ms is not None:
+                value = min(value, max_ms)
+            return round(value, 1)
+        cumulative += count
+    return float(max_ms) if max_ms is not None else float(BOUNDS_MS[-1])
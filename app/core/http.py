@@ -0,0 +1,57 @@
+"""
+HTTP-хелперы для условных запросов (ETag / If-None-Match) и диапазонов (Range)
+"""
+
+from typing import Optional, Tuple
+
+
+class RangeNotSatisfiable(Exception):
+    """Запрошенный диапазон лежит за пределами ресурса (ответ 416)"""
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверяет заголовок If-None-Match против текущего ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Слабое сравнение (RFC 9110, 13.1.2): W/"x" совпадает с "x"
+    normalized = {tag[2:] if tag.startswith("W/") else tag for tag in candidates}
+    return etag in normalized
+
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает заголовок Range вида ``bytes=start-end``.
+    Возвращает (start, end) включительно или None, если заголовок
+    отсутствует/не поддерживается (тогда отдаём весь ресурс).
+    Несколько диапазонов не поддерживаем — отдаём 200 целиком, это допустимо по RFC.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_str == "":
+            # Суффикс: последние N байт
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise RangeNotSatisfiable(range_header)
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable(range_header)
+    if start < 0 or start > end:
+        return None
+    return start, min(end, size - 1)
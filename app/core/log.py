@@ -0,0 +1,154 @@
+"""
+Логирование: JSON-записи через QueueHandler/QueueListener.
+
+Обработчики в event loop только кладут запись в очередь; форматирование и запись в stdout
+делает фоновый поток QueueListener, поэтому медленный вывод не тормозит обработку запросов.
+
+Уровни: LOG_LEVEL для корня и LOG_LEVELS для отдельных логгеров
+("app.services=DEBUG,sqlalchemy.pool=INFO").
+
+SQL-echo (логгер app.sql) заменяет create_async_engine(echo=...): запросы пишутся
+только у сэмплированных HTTP-запросов — целиком по запросу, чтобы в логе была вся его
+последовательность SQL. Доля задаётся SQL_ECHO_SAMPLE_RATE и переопределяется для маршрутов
+в SQL_ECHO_ROUTE_RATES ("/admin/message/list=1,/api/v1/messages/=0.1,background=0").
+"""
+
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core import metrics
+
+sql_logger = logging.getLogger("app.sql")
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, _, val = item.rpartition("=")
+            pairs[key.strip()] = val.strip()
+    return pairs
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        # Поля из extra={...}
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        elif record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _ContextQueueHandler(QueueHandler):
+    """Добавляет маршрут текущего запроса и готовит запись к передаче в другой поток"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        stats = metrics.current_stats.get()
+        if stats is not None and not hasattr(record, "route"):
+            record.route = stats.route
+        # Сообщение и traceback вычисляем здесь: аргументы могут измениться, пока запись в очереди
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging() -> None:
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _queue_handler = _ContextQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(settings.LOG_LEVEL or ("DEBUG" if settings.DEBUG else "INFO"))
+    for name, level in _parse_pairs(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """
+    Дописывает очередь и останавливает поток вывода. Дальнейшие записи (конец остановки,
+    ошибки в atexit) идут в вывод напрямую, а не в очередь, которую уже никто не читает.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    # Сначала переключаем root на прямой вывод, затем дописываем то, что уже в очереди
+    root = logging.getLogger()
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+        _queue_handler = None
+    _listener.stop()
+    _listener = None
+
+
+# --- SQL echo с сэмплированием по маршрутам ---
+
+_route_rates: Dict[str, float] = {key: float(value) for key, value in _parse_pairs(settings.SQL_ECHO_ROUTE_RATES).items()}
+
+
+def _echo_enabled() -> bool:
+    stats = metrics.current_stats.get()
+    if stats is None:
+        rate = _route_rates.get(metrics.BACKGROUND, settings.SQL_ECHO_SAMPLE_RATE)
+        return rate > 0 and random.random() < rate
+    if stats.sql_echo is None:
+        # Решение принимается один раз на HTTP-запрос
+        rate = _route_rates.get(stats.route, settings.SQL_ECHO_SAMPLE_RATE)
+        stats.sql_echo = rate > 0 and random.random() < rate
+    return stats.sql_echo
+
+
+def _echo_statement(conn, cursor, statement, parameters, context, executemany):
+    if sql_logger.isEnabledFor(logging.INFO) and _echo_enabled():
+        sql_logger.info(" ".join(statement.split()), extra={"sql_params": repr(parameters)[:500]})
+
+
+def instrument_engine(async_engine) -> None:
+    if not (settings.SQL_ECHO_SAMPLE_RATE > 0 or any(rate > 0 for rate in _route_rates.values())):
+        return
+    sync_engine = async_engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _echo_statement):
+        event.listen(sync_engine, "before_cursor_execute", _echo_statement)
@@ -0,0 +1,151 @@
+"""
+Метрики Prometheus: HTTP-запросы, SQL по запросам и маршрутам, ожидание соединения из пула.
+
+SQL считается через события SQLAlchemy before/after_cursor_execute; статистика текущего
+HTTP-запроса лежит в contextvar (SQLAlchemy переносит контекст в greenlet драйвера).
+Если один и тот же SELECT (одинаковый текст запроса) выполняется за запрос не меньше
+METRICS_N_PLUS_ONE_THRESHOLD раз — это похоже на N+1 (ленивые/selectin-связи в цикле):
+растёт db_n_plus_one_total и пишется предупреждение с маршрутом и текстом запроса.
+
+Маршрут в метках — шаблон пути FastAPI (/api/v1/messages/{...}), для админки — путь
+с числовыми сегментами, заменёнными на {id}: число значений меток ограничено.
+"""
+
+import logging
+import re
+import time
+from collections import Counter as _Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND = "background"
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+)
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "Число SQL-запросов на HTTP-запрос", ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233, 377),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Суммарное время SQL на HTTP-запрос", ["route"],
+)
+DB_STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds", "Время одного SQL-запроса", ["route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_N_PLUS_ONE = Counter(
+    "db_n_plus_one_total", "Запросы, в которых один и тот же SELECT повторялся подозрительно часто", ["route"],
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Ожидание соединения из пула (включая открытие нового)", ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+STARTUP_SECONDS = Gauge(
+    "app_startup_seconds", "Этапы холодного старта: import, create_app, admin, lifespan, first_db_connection", ["phase"],
+)
+
+_NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+@dataclass
+class RequestStats:
+    scope: dict
+    path: str
+    statements: int = 0
+    db_seconds: float = 0.0
+    selects: _Counter = field(default_factory=_Counter)
+    flagged: set = field(default_factory=set)
+    # Сэмплирование SQL-echo (app.core.log): решается при первом запросе к БД
+    sql_echo: Optional[bool] = None
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope, self.path)
+
+
+current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_db_stats", default=None)
+
+
+def route_label(scope, path: str) -> str:
+    # scope["route"] появляется после маршрутизации FastAPI; у смонтированной админки его нет
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    return _NUMERIC_SEGMENT.sub("/{id}", path) or "/"
+
+
+def observe_pool_wait(pool: str, seconds: float) -> None:
+    DB_POOL_CHECKOUT_WAIT.labels(pool=pool).observe(seconds)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_stats.get()
+    route = stats.route if stats is not None else BACKGROUND
+    DB_STATEMENT_DURATION.labels(route=route).observe(elapsed)
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_seconds += elapsed
+    if statement.lstrip()[:6].upper() == "SELECT":
+        stats.selects[statement] += 1
+        if stats.selects[statement] == settings.METRICS_N_PLUS_ONE_THRESHOLD and statement not in stats.flagged:
+            stats.flagged.add(statement)
+            DB_N_PLUS_ONE.labels(route=route).inc()
+            logger.warning("Возможный N+1 в %s: запрос выполнен %s раз: %s",
+                           route, settings.METRICS_N_PLUS_ONE_THRESHOLD, " ".join(statement.split())[:300])
+
+
+def instrument_engine(async_engine) -> None:
+    sync_engine = async_engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """Время HTTP-запроса и его SQL-статистика; наблюдения пишутся после отправки тела целиком"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        stats = RequestStats(scope=scope, path=scope["path"])
+        token = current_stats.set(stats)
+        status = 500
+
+        async def wrapped(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped)
+        finally:
+            current_stats.reset(token)
+            route = stats.route
+            if status == 404 and scope.get("route") is None:
+                route = "unmatched"
+            HTTP_REQUEST_DURATION.labels(method=scope["method"], route=route, status=str(status)) \
+                .observe(time.perf_counter() - started)
+            DB_STATEMENTS_PER_REQUEST.labels(route=route).observe(stats.statements)
+            DB_TIME_PER_REQUEST.labels(route=route).observe(stats.db_seconds)
@@ -0,0 +1,47 @@
+"""
+Замер холодного старта: импорт приложения, create_app() (в том числе настройка админки),
+lifespan и первое соединение с БД. Этапы пишутся в лог одной записью после старта
+и в метрику app_startup_seconds{phase=...}; этап, завершившийся позже (например, первое
+соединение без прогрева пула), логируется отдельно, когда случится.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+timings: Dict[str, float] = {}
+_reported = False
+
+
+def record(phase: str, seconds: float) -> None:
+    timings[phase] = seconds
+    metrics.STARTUP_SECONDS.labels(phase=phase).set(seconds)
+    if _reported:
+        logger.info("Старт: %s — %.1f ms", phase, seconds * 1000, extra={"startup_phase": phase})
+
+
+def record_once(phase: str, seconds: float) -> None:
+    if phase not in timings:
+        record(phase, seconds)
+
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def report() -> None:
+    global _reported
+    _reported = True
+    summary = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+    logger.info("Старт приложения: %s", summary,
+                extra={"startup_ms": {name: round(seconds * 1000, 1) for name, seconds in timings.items()}})
@@ -0,0 +1,199 @@
+"""
+Хранилище файлов, адресуемое по SHA-256 содержимого.
+
+Ключ объекта — hex-дайджест, поэтому одинаковые файлы хранятся один раз.
+Учёт ссылок ведётся в таблице blobs (см. app/services/blobs.py), здесь только байты.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import AsyncIterator, BinaryIO, Optional, Tuple
+
+from app.core.config import settings
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(fileobj: BinaryIO) -> Tuple[str, int]:
+    """Считает SHA-256 и размер файлового объекта кусками, затем возвращает курсор в начало"""
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+class BlobStore(ABC):
+    """Бэкенд хранения байтов. Все методы идемпотентны по ключу"""
+
+    @abstractmethod
+    async def exists(self, digest: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def save(self, digest: str, fileobj: BinaryIO) -> None:
+        """Сохраняет содержимое fileobj (курсор в начале) под ключом digest"""
+
+    @abstractmethod
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int) -> AsyncIterator[bytes]:
+        """Отдаёт байты [start, end] включительно кусками не больше chunk_size"""
+
+    @abstractmethod
+    async def delete(self, digest: str) -> None:
+        ...
+
+
+class LocalBlobStore(BlobStore):
+    """Файлы на локальном диске: <root>/ab/cd/abcd..."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    async def exists(self, digest: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(digest))
+
+    def _save_sync(self, digest: str, fileobj: BinaryIO) -> None:
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Пишем во временный файл рядом и атомарно переименовываем
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(fileobj, out, HASH_CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    async def save(self, digest: str, fileobj: BinaryIO) -> None:
+        await asyncio.to_thread(self._save_sync, digest, fileobj)
+
+    async def iter_range(self, digest: str, start: int, end: int, chunk_size: int) -> AsyncIterator[bytes]:
+        fh = await asyncio.to_thread(open, self._path(digest), "rb")
+        try:
+            await asyncio.to_thread(fh.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(fh.read, min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(fh.close)
+
+    async def delete(self, digest: str) -> None:
+        try:
+            await asyncio.to_thread(os.unlink, self._path(digest))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore(BlobStore):
+    """
+    S3-совместимое хранилище (AWS S3, MinIO, Yandex Object Storage и т.п.).
+    Для локальной проверки достаточно поднять MinIO и указать S3_ENDPOINT_URL.
+    boto3 — опциональная зависимость, импортируется только при использовании.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        prefix: str = "",
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+    ):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("Для BLOB_STORAGE_BACKEND=s3 установите boto3") from e
+        if not bucket:
+            raise ValueError("S3_BUCKET не установлен")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key_id or None,
+            aws_secret_access_key=secret_access_key or None,
+        )
+
+    def _key(self, digest: str) -> str:
+        key = f"{digest[:2]}/{digest}"
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    async def exists(self, digest: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def save(self, digest: str, fileobj: BinaryIO) -> None:
+        # upload_fileobj сам делает multipart-загрузку и не читает файл целиком
+        await asyncio.to_thread(self.client.upload_fileobj, fileobj, self.bucket, self._key(digest))
+
+    async def iter_range(self, digest: str, start: int, end: int, chunk_size: int) -> AsyncIterator[bytes]:
+        if end < start:
+            return
+        response = await asyncio.to_thread(
+            self.client.get_object,
+            Bucket=self.bucket,
+            Key=self._key(digest),
+            Range=f"bytes={start}-{end}",
+        )
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, digest: str) -> None:
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self._key(digest))
+
+
+@lru_cache()
+def get_blob_store() -> BlobStore:
+    """Бэкенд хранилища согласно настройкам (один экземпляр на процесс)"""
+    backend = settings.BLOB_STORAGE_BACKEND.lower()
+    if backend == "local":
+        return LocalBlobStore(settings.BLOB_STORAGE_PATH)
+    if backend == "s3":
+        return S3BlobStore(
+            bucket=settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            prefix=settings.S3_PREFIX,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+        )
+    raise ValueError(f"Неизвестный BLOB_STORAGE_BACKEND: {settings.BLOB_STORAGE_BACKEND}")
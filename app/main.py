@@ -1,33 +1,83 @@
+import time
+
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from pathlib import Path
 from fastapi import FastAPI, Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.admin.views import setup_admin
+from app.api.v1 import materials, messages, students
 from starlette.middleware.sessions import SessionMiddleware
+from app.core import startup
+from app.core.compression import CompressionMiddleware
+from app.core.conditional import ConditionalGetMiddleware, ContentHashStaticFiles
 from app.core.config import settings
+from app.core.database import dispose_engines, warm_up_pool
+from app.core.log import setup_logging, stop_logging
+from app.core.db_routing import DatabaseRoutingMiddleware
+from app.core.metrics import MetricsMiddleware
+from app.services.curriculum import curriculum_cache
+from app.services.message_archive import message_archive
+from app.services.message_buffer import message_buffer
+from app.services.message_partitions import message_partitions
+from app.services.progress import progress_scheduler
+from app.services.rate_limiter import rate_limiter
+from app.services.identity_cache import identity_cache
+from app.services.latency_rollup import latency_rollup
+from app.services.reminders import reminder_scheduler
 import traceback
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
-    title="AI Tutor API",
-    version="1.0.0",
-    description="Backend для AI Tutor системы"
-)
+STATIC_DIR = Path(__file__).parent / "static"
+
+startup.record("import", time.perf_counter() - _import_started)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup.phase("lifespan"):
+        if settings.DB_POOL_WARMUP:
+            await warm_up_pool(settings.DB_POOL_WARMUP)
+        await message_partitions.start()
+        await message_buffer.start()
+        await rate_limiter.start()
+        await identity_cache.warm_up()
+        await latency_rollup.start()
+        if settings.REMINDER_SCHEDULER_ENABLED:
+            await reminder_scheduler.start()
+        if settings.MESSAGE_ARCHIVE_ENABLED:
+            await message_archive.start()
+    startup.report()
+    try:
+        yield
+    finally:
+        await message_archive.stop()
+        await reminder_scheduler.stop()
+        await latency_rollup.stop()
+        # Дописываем накопленные сообщения и счётчики до закрытия соединений
+        await rate_limiter.stop()
+        await message_buffer.stop()
+        await message_partitions.stop()
+        await curriculum_cache.stop()
+        await progress_scheduler.stop()
+        await dispose_engines()
+        stop_logging()
+
 
 # Middleware для логирования ошибок
-@app.middleware("http")
 async def log_exceptions(request: Request, call_next):
     try:
         response = await call_next(request)
         # Логируем 500 ошибки даже если они не выбросили исключение
         if response.status_code == 500:
-            logger.error(f"500 error in {request.url.path} - response status is 500")
+            logger.error("500 error in %s - response status is 500", request.url.path)
         return response
     except Exception as e:
-        error_msg = f"Exception in {request.url.path}: {e}\n{traceback.format_exc()}"
-        logger.error(error_msg)
-        print(f"\n{'='*80}\nERROR:\n{error_msg}\n{'='*80}\n")
+        logger.exception("Exception in %s: %s", request.url.path, e)
         # В режиме DEBUG отдаем текст ошибки в ответ, чтобы проще было отладить
         from fastapi.responses import PlainTextResponse
         if settings.DEBUG:
@@ -38,17 +88,72 @@ async def log_exceptions(request: Request, call_next):
             )
         raise
 
-# Сессии для аутентификации админ-панели
-app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
-
-# Админка
-admin = setup_admin(app)
 
-@app.get("/")
 def root():
     """Редирект на админку"""
     return RedirectResponse(url="/admin")
 
-@app.get("/health")
+
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+def metrics():
+    """Метрики в формате Prometheus"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def create_app() -> FastAPI:
+    """
+    Собирает приложение. Подключения к БД здесь нет: движок и пул создаются при первом
+    запросе или в lifespan (DB_POOL_WARMUP). Время этапов — в логе после старта и в /metrics.
+    """
+    with startup.phase("create_app"):
+        setup_logging()
+
+        app = FastAPI(
+            title="AI Tutor API",
+            version="1.0.0",
+            description="Backend для AI Tutor системы",
+            lifespan=lifespan,
+        )
+        app.middleware("http")(log_exceptions)
+
+        # Сессии для аутентификации админ-панели
+        app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
+
+        # GET-запросы читают из реплик (если настроены), запись и read-after-write — из primary
+        app.add_middleware(DatabaseRoutingMiddleware)
+
+        # Время запросов и SQL-статистика для /metrics
+        app.add_middleware(MetricsMiddleware)
+
+        # ETag по содержимому и 304 для GET API; снаружи — gzip/brotli по Accept-Encoding
+        app.add_middleware(ConditionalGetMiddleware)
+        app.add_middleware(CompressionMiddleware)
+
+        # Статика (CSS админки) с ETag по содержимому
+        app.mount("/static", ContentHashStaticFiles(directory=STATIC_DIR), name="static")
+
+        # Админка
+        with startup.phase("admin"):
+            app.state.admin = setup_admin(app)
+
+        # API v1
+        app.include_router(materials.router, prefix="/api/v1")
+        app.include_router(messages.router, prefix="/api/v1")
+        app.include_router(students.router, prefix="/api/v1")
+
+        app.get("/")(root)
+        app.get("/health")(health_check)
+        app.get("/metrics", include_in_schema=False)(metrics)
+    return app
+
+
+def __getattr__(name: str):
+    # uvicorn app.main:app — приложение собирается при первом обращении, а не при импорте модуля
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
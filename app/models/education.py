@@ -6,11 +6,13 @@ from datetime import datetime, date
 from typing import Optional, List
 from sqlalchemy import (
     Column, BigInteger, String, Text, Boolean, DateTime, Date, Integer,
-    ForeignKey, UniqueConstraint, Index, LargeBinary, Numeric
+    ForeignKey, UniqueConstraint, Index, Numeric, Computed, DDL, event
 )
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlalchemy.orm import relationship, Mapped, mapped_column, deferred
 from sqlalchemy.sql import func
 from app.core.database import Base
+from app.core import histogram
 
 
 # 1. PROGRAMS
@@ -128,7 +130,8 @@ class CourseMaterial(Base):
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     external_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
-    file_data: Mapped[Optional[bytes]] = deferred(mapped_column(LargeBinary, nullable=True))
+    # Сам файл лежит в blob-хранилище (app/core/storage.py), в строке только SHA-256
+    file_hash: Mapped[Optional[str]] = mapped_column(String(64), ForeignKey('blobs.sha256'), nullable=True)
     file_size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
     file_mimetype: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
     material_type: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
@@ -141,6 +144,10 @@ class CourseMaterial(Base):
     module: Mapped[Optional["CourseModule"]] = relationship("CourseModule", back_populates="materials", lazy='selectin')
     topic: Mapped[Optional["Topic"]] = relationship("Topic", back_populates="materials", lazy='selectin')
     
+    __table_args__ = (
+        Index('idx_course_materials_file_hash', 'file_hash'),
+    )
+    
     def __str__(self):
         return self.title
 
@@ -165,6 +172,8 @@ class StudentModuleProgress(Base):
     
     __table_args__ = (
         UniqueConstraint('student_id', 'module_id'),
+        # Пересчёт прогресса по модулю/программе (app.services.progress)
+        Index('idx_student_module_progress_module', 'module_id'),
     )
     
     def __str__(self):
@@ -175,7 +184,9 @@ class StudentModuleProgress(Base):
 class Message(Base):
     __tablename__ = "messages"
     
-    message_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # Таблица секционирована по месяцам created_at (app/services/message_partitions.py);
+    # ключ секционирования обязан входить в первичный ключ, для ORM идентичность — message_id
+    message_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     student_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('students.student_id', ondelete='CASCADE'), nullable=False)
     role: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
     sender_type: Mapped[str] = mapped_column(String(20), nullable=False)
@@ -183,15 +194,43 @@ class Message(Base):
     processing_ms: Mapped[Optional[int]] = mapped_column(Integer, server_default='0')
     telegram_user_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
     message_type: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    # Полнотекстовый индекс (russian + english), вычисляется Postgres
+    search_vector: Mapped[Optional[str]] = deferred(mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('russian'::regconfig, coalesce(text_content, '')), 'A') || "
+            "setweight(to_tsvector('english'::regconfig, coalesce(text_content, '')), 'B')",
+            persisted=True,
+        ),
+    ))
     
     # Relationships
     student: Mapped["Student"] = relationship("Student", back_populates="messages")
     
+    __table_args__ = (
+        # Keyset-пагинация истории студента: WHERE student_id = ? AND (created_at, message_id) < (?, ?)
+        Index('idx_messages_student_created', 'student_id', 'created_at', 'message_id'),
+        Index('idx_messages_created_at', 'created_at'),
+        Index('idx_messages_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('idx_messages_text_trgm', 'text_content', postgresql_using='gin',
+              postgresql_ops={'text_content': 'gin_trgm_ops'}),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+    __mapper_args__ = {'primary_key': [message_id]}
+    
     def __str__(self):
         return f"{self.sender_type}: {self.text_content[:30]}..."
 
 
+# Секция по умолчанию: строки вне помесячных секций не теряются, пока те не созданы
+event.listen(
+    Message.__table__,
+    'after_create',
+    DDL("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"),
+)
+
+
 # 8. RATE LIMITS
 class RateLimit(Base):
     __tablename__ = "rate_limits"
@@ -227,6 +266,11 @@ class ScheduleItem(Base):
     # Relationships
     student: Mapped["Student"] = relationship("Student", back_populates="schedule_items")
     
+    __table_args__ = (
+        # Планировщик напоминаний читает ближайшее окно событий диапазоном по event_date
+        Index('idx_schedule_items_event_date', 'event_date'),
+    )
+    
     def __str__(self):
         return f"{self.event_name} ({self.event_date})"
 
@@ -269,6 +313,11 @@ class TestResult(Base):
     student: Mapped["Student"] = relationship("Student", back_populates="test_results")
     test: Mapped["AttestationTest"] = relationship("AttestationTest", back_populates="results")
     
+    __table_args__ = (
+        # Инкрементальная выгрузка по watermark: WHERE created_at > :since
+        Index('idx_test_results_created_at', 'created_at'),
+    )
+    
     def __str__(self):
         return f"Test Result ID: {self.result_id} (Score: {self.score})"
 
@@ -290,3 +339,110 @@ class Feedback(Base):
     
     def __str__(self):
         return f"Feedback ID: {self.id} (Rating: {self.rating})"
+
+
+# 13. BLOBS
+class Blob(Base):
+    """Файл в blob-хранилище, адресуемый по SHA-256; ref_count — число ссылающихся материалов и сегментов архива"""
+    __tablename__ = "blobs"
+    
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    mimetype: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    ref_count: Mapped[int] = mapped_column(Integer, server_default='0', nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # Последний put_file: gc не трогает свежие файлы, ссылка на которые ещё не закоммичена
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
+
+
+# 14. LATENCY ROLLUPS
+class LatencyRollup(Base):
+    """
+    Гистограмма processing_ms за час или сутки по программе и типу сообщения.
+    histogram[i] — число сообщений в корзине i из app.core.histogram.BOUNDS_MS.
+    """
+    __tablename__ = "latency_rollups"
+    
+    rollup_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    granularity: Mapped[str] = mapped_column(String(10), nullable=False)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    program_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('programs.program_id', ondelete='CASCADE'), nullable=False)
+    # '' — сообщения без message_type (NULL в уникальном ключе не совпадал бы сам с собой)
+    message_type: Mapped[str] = mapped_column(String(50), nullable=False, server_default='')
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sum_ms: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    max_ms: Mapped[int] = mapped_column(Integer, nullable=False)
+    histogram: Mapped[List[int]] = mapped_column(ARRAY(Integer), nullable=False)
+    
+    # Relationships
+    program: Mapped["Program"] = relationship("Program")
+    
+    __table_args__ = (
+        UniqueConstraint('granularity', 'bucket_start', 'program_id', 'message_type'),
+    )
+    
+    @property
+    def avg_ms(self) -> Optional[float]:
+        return round(self.sum_ms / self.count, 1) if self.count else None
+    
+    @property
+    def p50_ms(self) -> Optional[float]:
+        return histogram.percentile(self.histogram, 50, self.max_ms)
+    
+    @property
+    def p95_ms(self) -> Optional[float]:
+        return histogram.percentile(self.histogram, 95, self.max_ms)
+    
+    @property
+    def p99_ms(self) -> Optional[float]:
+        return histogram.percentile(self.histogram, 99, self.max_ms)
+    
+    def __str__(self):
+        return f"{self.granularity} {self.bucket_start} (program {self.program_id})"
+
+
+# 15. JOB WATERMARKS
+class JobWatermark(Base):
+    """Граница, до которой фоновая задача уже обработала данные"""
+    __tablename__ = "job_watermarks"
+    
+    job_name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    watermark: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __str__(self):
+        return f"{self.job_name}: {self.watermark}"
+
+
+# 16. MESSAGE ARCHIVE
+class MessageArchiveSegment(Base):
+    """
+    Сообщения студента за месяц (UTC), вынесенные из messages в blob-хранилище:
+    сжатый JSONL, строки по возрастанию (created_at, message_id). См. app/services/message_archive.py.
+    """
+    __tablename__ = "message_archive_segments"
+    
+    segment_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    student_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('students.student_id', ondelete='CASCADE'), nullable=False)
+    month: Mapped[date] = mapped_column(Date, nullable=False)
+    blob_sha256: Mapped[str] = mapped_column(String(64), ForeignKey('blobs.sha256'), nullable=False)
+    codec: Mapped[str] = mapped_column(String(10), nullable=False)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    student: Mapped["Student"] = relationship("Student")
+    
+    __table_args__ = (
+        UniqueConstraint('student_id', 'month'),
+        Index('idx_message_archive_segments_month', 'month'),
+        Index('idx_message_archive_segments_blob', 'blob_sha256'),
+    )
+    
+    def __str__(self):
+        return f"Archive {self.student_id} {self.month:%Y-%m} ({self.message_count})"
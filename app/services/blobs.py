@@ -0,0 +1,221 @@
+"""
+Учёт ссылок на файлы в blob-хранилище (файлы материалов и сегменты архива сообщений)
+и перенос старых course_materials.file_data.
+
+Запуск переноса (между миграциями 0002 и 0003):
+    python -m app.services.blobs migrate-file-data --batch-size 50
+Пересчёт счётчиков ссылок и удаление осиротевших файлов:
+    python -m app.services.blobs gc
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import BinaryIO, Optional
+
+from sqlalchemy import select, text, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.storage import get_blob_store, hash_file
+from app.models.education import Blob, CourseMaterial
+
+logger = logging.getLogger(__name__)
+
+# Сколько байт переносимого файла держать в памяти, прежде чем сбросить на диск
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+MIGRATION_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class StoredFile:
+    sha256: str
+    size: int
+    mimetype: Optional[str]
+
+
+async def _lock(session, digest: str) -> None:
+    # Сериализуем put/release одного и того же хэша между воркерами
+    await session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:h))"), {"h": digest})
+
+
+async def put_file(fileobj: BinaryIO, mimetype: Optional[str] = None, digest: Optional[str] = None,
+                   size: Optional[int] = None) -> StoredFile:
+    """
+    Сохраняет файл в хранилище (если такого содержимого ещё нет) и увеличивает счётчик ссылок.
+    Транзакция коммитится сразу: строка blobs должна существовать до сохранения материала (FK).
+    """
+    if digest is None or size is None:
+        digest, size = await asyncio.to_thread(hash_file, fileobj)
+    store = get_blob_store()
+
+    async with async_session() as session, session.begin():
+        await _lock(session, digest)
+        if not await store.exists(digest):
+            await store.save(digest, fileobj)
+        await session.execute(
+            insert(Blob)
+            .values(sha256=digest, size=size, mimetype=mimetype, ref_count=1)
+            .on_conflict_do_update(
+                index_elements=[Blob.sha256],
+                set_={"ref_count": Blob.ref_count + 1, "updated_at": func.now()},
+            )
+        )
+    return StoredFile(sha256=digest, size=size, mimetype=mimetype)
+
+
+async def release(digest: Optional[str]) -> bool:
+    """
+    Уменьшает счётчик ссылок. Если на файл больше никто не ссылается — удаляет
+    строку и сам файл. Возвращает True, если файл удалён.
+    """
+    if not digest:
+        return False
+    async with async_session() as session, session.begin():
+        await _lock(session, digest)
+        await session.execute(
+            text("UPDATE blobs SET ref_count = GREATEST(ref_count - 1, 0) WHERE sha256 = :h"),
+            {"h": digest},
+        )
+        return await _delete_if_orphan(session, digest)
+
+
+async def _delete_if_orphan(session, digest: str) -> bool:
+    deleted = await session.scalar(
+        text(
+            "DELETE FROM blobs WHERE sha256 = :h AND ref_count = 0 "
+            "AND NOT EXISTS (SELECT 1 FROM course_materials WHERE file_hash = :h) "
+            "AND NOT EXISTS (SELECT 1 FROM message_archive_segments WHERE blob_sha256 = :h) "
+            "RETURNING sha256"
+        ),
+        {"h": digest},
+    )
+    if deleted:
+        # Удаляем под той же advisory-блокировкой, чтобы параллельный put_file не потерял файл
+        await get_blob_store().delete(digest)
+        return True
+    return False
+
+
+async def collect_garbage(grace: Optional[float] = None) -> int:
+    """
+    Пересчитывает ref_count по course_materials и сегментам архива сообщений, удаляет файлы без ссылок.
+    Файлы, сохранённые за последние grace секунд, не трогает: put_file коммитит +1 раньше, чем
+    материал или сегмент со ссылкой на файл, и пересчёт в этом окне удалил бы нужный файл.
+    """
+    grace = settings.BLOB_GC_GRACE_SECONDS if grace is None else grace
+    params = {"grace": timedelta(seconds=grace)}
+    async with async_session() as session, session.begin():
+        # Каскадные удаления (например, программы или студента) не проходят через админку и не вызывают release()
+        await session.execute(text(
+            "UPDATE blobs b SET ref_count = c.cnt FROM ("
+            "  SELECT b2.sha256,"
+            "    (SELECT count(*) FROM course_materials m WHERE m.file_hash = b2.sha256)"
+            "    + (SELECT count(*) FROM message_archive_segments s WHERE s.blob_sha256 = b2.sha256) AS cnt"
+            "  FROM blobs b2"
+            ") c WHERE c.sha256 = b.sha256 AND b.ref_count <> c.cnt AND b.updated_at < now() - :grace"
+        ), params)
+        orphans = (await session.scalars(
+            select(Blob.sha256).where(Blob.ref_count == 0, Blob.updated_at < func.now() - params["grace"])
+        )).all()
+
+    removed = 0
+    for digest in orphans:
+        async with async_session() as session, session.begin():
+            await _lock(session, digest)
+            if await _delete_if_orphan(session, digest):
+                removed += 1
+    return removed
+
+
+async def _spool_file_data(session, material_id: int, spool: BinaryIO) -> None:
+    """Копирует bytea из строки во временный файл кусками, не загружая его целиком"""
+    offset = 1
+    while True:
+        chunk = await session.scalar(
+            text("SELECT substring(file_data FROM :offset FOR :length) FROM course_materials WHERE material_id = :id"),
+            {"offset": offset, "length": MIGRATION_CHUNK_SIZE, "id": material_id},
+        )
+        if not chunk:
+            break
+        spool.write(chunk)
+        offset += len(chunk)
+
+
+async def migrate_file_data(batch_size: int = 50) -> int:
+    """Переносит course_materials.file_data в blob-хранилище, оставляя в строке только хэш"""
+    migrated = 0
+    last_id = 0
+    while True:
+        async with async_session() as session:
+            ids = (await session.scalars(
+                text(
+                    "SELECT material_id FROM course_materials "
+                    "WHERE material_id > :last AND file_data IS NOT NULL AND file_hash IS NULL "
+                    "ORDER BY material_id LIMIT :limit"
+                ),
+                {"last": last_id, "limit": batch_size},
+            )).all()
+        if not ids:
+            break
+
+        for material_id in ids:
+            last_id = material_id
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+                async with async_session() as session:
+                    await _spool_file_data(session, material_id, spool)
+                    mimetype = await session.scalar(
+                        select(CourseMaterial.file_mimetype).where(CourseMaterial.material_id == material_id)
+                    )
+                stored = await put_file(spool, mimetype)
+
+            async with async_session() as session, session.begin():
+                await session.execute(
+                    text(
+                        "UPDATE course_materials SET file_hash = :h, file_size = :size, file_data = NULL "
+                        "WHERE material_id = :id"
+                    ),
+                    {"h": stored.sha256, "size": stored.size, "id": material_id},
+                )
+            migrated += 1
+            logger.info("Material %s moved to blob %s (%s bytes)", material_id, stored.sha256, stored.size)
+
+    return migrated
+
+
+async def _count_pending() -> int:
+    async with async_session() as session:
+        return await session.scalar(
+            select(func.count()).select_from(CourseMaterial).where(
+                text("file_data IS NOT NULL AND file_hash IS NULL")
+            )
+        )
+
+
+async def _run(args: argparse.Namespace) -> None:
+    if args.command == "migrate-file-data":
+        print(f"Осталось перенести: {await _count_pending()}")
+        print(f"Перенесено материалов: {await migrate_file_data(args.batch_size)}")
+    elif args.command == "gc":
+        print(f"Удалено файлов: {await collect_garbage(args.grace)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Blob-хранилище материалов")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate-file-data", help="Перенести file_data в хранилище")
+    migrate.add_argument("--batch-size", type=int, default=50)
+    gc = sub.add_parser("gc", help="Пересчитать ссылки и удалить осиротевшие файлы")
+    gc.add_argument("--grace", type=float, default=None,
+                    help="Не трогать файлы, сохранённые за последние N секунд (по умолчанию BLOB_GC_GRACE_SECONDS)")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
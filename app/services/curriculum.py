@@ -0,0 +1,191 @@
+"""
+Снапшоты учебного плана: Program → CourseModule → Topic → CourseMaterial.
+
+Дерево программы собирается одним SQL-запросом (json_build_object/json_agg) вместо обхода
+ленивых relationship, сериализуется один раз и отдаётся из памяти с ETag.
+Правки через админку перестраивают снапшот затронутой программы в фоне; изменения
+в обход админки (или в другом воркере) подхватываются через CURRICULUM_CACHE_TTL.
+file_data/содержимое файлов в снапшот не попадает — только метаданные и ссылка на скачивание.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models.education import Program, CourseModule, Topic, CourseMaterial
+
+logger = logging.getLogger(__name__)
+
+_MATERIAL_JSON = """
+    json_build_object(
+        'material_id', m.material_id,
+        'title', m.title,
+        'material_type', m.material_type,
+        'content', m.content,
+        'external_url', m.external_url,
+        'order_index', m.order_index,
+        'is_public', m.is_public,
+        'has_file', m.file_hash IS NOT NULL,
+        'file_size', m.file_size,
+        'file_mimetype', m.file_mimetype
+    ) ORDER BY m.order_index NULLS LAST, m.material_id
+"""
+
+CURRICULUM_SQL = text(f"""
+SELECT json_build_object(
+    'program_id', p.program_id,
+    'name', p.name,
+    'description', p.description,
+    'total_hours', p.total_hours,
+    'materials', COALESCE((
+        SELECT json_agg({_MATERIAL_JSON}) FROM course_materials m
+        WHERE m.program_id = p.program_id AND m.module_id IS NULL AND m.topic_id IS NULL
+    ), '[]'::json),
+    'modules', COALESCE((
+        SELECT json_agg(json_build_object(
+            'module_id', cm.module_id,
+            'name', cm.name,
+            'description', cm.description,
+            'order_index', cm.order_index,
+            'total_hours', cm.total_hours,
+            'lecture_hours', cm.lecture_hours,
+            'practice_hours', cm.practice_hours,
+            'self_study_hours', cm.self_study_hours,
+            'materials', COALESCE((
+                SELECT json_agg({_MATERIAL_JSON}) FROM course_materials m
+                WHERE m.module_id = cm.module_id AND m.topic_id IS NULL
+            ), '[]'::json),
+            'topics', COALESCE((
+                SELECT json_agg(json_build_object(
+                    'topic_id', t.topic_id,
+                    'name', t.name,
+                    'description', t.description,
+                    'order_index', t.order_index,
+                    'lecture_hours', t.lecture_hours,
+                    'practice_hours', t.practice_hours,
+                    'self_study_hours', t.self_study_hours,
+                    'is_intermediate_assessment', t.is_intermediate_assessment,
+                    'is_final_assessment', t.is_final_assessment,
+                    'materials', COALESCE((
+                        SELECT json_agg({_MATERIAL_JSON}) FROM course_materials m
+                        WHERE m.topic_id = t.topic_id
+                    ), '[]'::json)
+                ) ORDER BY t.order_index, t.topic_id)
+                FROM topics t WHERE t.module_id = cm.module_id
+            ), '[]'::json)
+        ) ORDER BY cm.order_index, cm.module_id)
+        FROM course_modules cm WHERE cm.program_id = p.program_id
+    ), '[]'::json)
+)::text
+FROM programs p
+WHERE p.program_id = :program_id
+""")
+
+
+@dataclass
+class CurriculumSnapshot:
+    program_id: int
+    version: str
+    etag: str
+    body: bytes
+    built_at: datetime
+    expires_at: float
+
+
+class CurriculumCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._snapshots: Dict[int, CurriculumSnapshot] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._pending: Set[int] = set()
+        # Ссылки на фоновые перестройки: иначе задачу может собрать GC, а stop() её не дождётся
+        self._rebuilds: Set[asyncio.Task] = set()
+        self.builds = 0
+
+    async def get(self, program_id: int) -> Optional[CurriculumSnapshot]:
+        snapshot = self._snapshots.get(program_id)
+        if snapshot is not None and snapshot.expires_at > time.monotonic():
+            return snapshot
+        return await self.rebuild(program_id)
+
+    async def rebuild(self, program_id: int) -> Optional[CurriculumSnapshot]:
+        lock = self._locks.setdefault(program_id, asyncio.Lock())
+        async with lock:
+            started = time.perf_counter()
+            async with async_session() as session:
+                program_json = await session.scalar(CURRICULUM_SQL, {"program_id": program_id})
+            if program_json is None:
+                self._snapshots.pop(program_id, None)
+                return None
+
+            # Версия зависит только от содержимого — одинакова во всех воркерах и после рестарта
+            version = hashlib.sha256(program_json.encode()).hexdigest()[:16]
+            built_at = datetime.now(timezone.utc)
+            body = (
+                f'{{"version":"{version}","built_at":"{built_at.isoformat()}","program":'.encode()
+                + program_json.encode()
+                + b"}"
+            )
+            previous = self._snapshots.get(program_id)
+            if previous is not None and previous.version == version:
+                # Содержимое не изменилось — сохраняем тело, чтобы ETag и built_at остались прежними
+                body, built_at = previous.body, previous.built_at
+            snapshot = CurriculumSnapshot(
+                program_id=program_id,
+                version=version,
+                etag=f'"{version}"',
+                body=body,
+                built_at=built_at,
+                expires_at=time.monotonic() + self.ttl,
+            )
+            self._snapshots[program_id] = snapshot
+            self.builds += 1
+            logger.debug("Curriculum %s rebuilt in %.1f ms", program_id, (time.perf_counter() - started) * 1000)
+            return snapshot
+
+    def invalidate(self, program_ids: Iterable[Optional[int]]) -> None:
+        """Планирует фоновую перестройку снапшотов; повторные вызовы до перестройки схлопываются"""
+        for program_id in program_ids:
+            if program_id is None or program_id in self._pending:
+                continue
+            self._pending.add(program_id)
+            task = asyncio.create_task(self._rebuild_later(program_id))
+            self._rebuilds.add(task)
+            task.add_done_callback(self._rebuilds.discard)
+
+    async def stop(self) -> None:
+        """Дожидается запущенных перестроек (перед закрытием соединений с БД)"""
+        if self._rebuilds:
+            await asyncio.gather(*self._rebuilds, return_exceptions=True)
+
+    async def _rebuild_later(self, program_id: int) -> None:
+        self._pending.discard(program_id)
+        try:
+            await self.rebuild(program_id)
+        except Exception:
+            # Не оставляем устаревший снапшот: следующий запрос соберёт его заново
+            self._snapshots.pop(program_id, None)
+            logger.exception("Не удалось перестроить учебный план программы %s", program_id)
+
+    async def programs_for(self, model) -> Set[int]:
+        """Программы, чей учебный план затрагивает объект админки"""
+        if isinstance(model, (Program, CourseModule, CourseMaterial)):
+            return {model.program_id} if model.program_id is not None else set()
+        if isinstance(model, Topic) and model.module_id is not None:
+            async with async_session() as session:
+                program_id = await session.scalar(
+                    select(CourseModule.program_id).where(CourseModule.module_id == model.module_id)
+                )
+            return {program_id} if program_id is not None else set()
+        return set()
+
+
+curriculum_cache = CurriculumCache(ttl=settings.CURRICULUM_CACHE_TTL)
@@ -0,0 +1,181 @@
+"""
+Кэш сопоставления идентификаторов мессенджеров (Telegram/Max) со студентом.
+
+LRU с TTL: ключ — (поле, значение), например ("telegram_user_id", 12345).
+Неизвестные идентификаторы тоже кэшируются, но на короткий IDENTITY_CACHE_NEGATIVE_TTL —
+иначе каждое сообщение незарегистрированного пользователя шло бы в БД.
+Правки и удаления через StudentAdmin обновляют кэш сразу; изменения, сделанные
+в обход админки или в другом воркере, видны не позже чем через TTL.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import select, or_
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models.education import Student
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_FIELDS = ("telegram_user_id", "telegram_chat_id", "max_user_id", "max_chat_id")
+
+CacheKey = Tuple[str, int]
+
+
+@dataclass(frozen=True)
+class StudentIdentity:
+    student_id: int
+    program_id: int
+    status: Optional[str]
+    telegram_user_id: Optional[int] = None
+    telegram_chat_id: Optional[int] = None
+    max_user_id: Optional[int] = None
+    max_chat_id: Optional[int] = None
+
+
+@dataclass
+class IdentityCacheStats:
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    size: int = 0
+    max_size: int = 0
+
+
+_COLUMNS = [
+    Student.student_id, Student.program_id, Student.status,
+    Student.telegram_user_id, Student.telegram_chat_id, Student.max_user_id, Student.max_chat_id,
+]
+
+
+class IdentityCache:
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[Optional[StudentIdentity], float]]" = OrderedDict()
+        self._by_student: Dict[int, Set[CacheKey]] = {}
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self.stats = IdentityCacheStats(max_size=max_size)
+
+    async def resolve(self, field: str, value: int) -> Optional[StudentIdentity]:
+        if field not in IDENTITY_FIELDS:
+            raise ValueError(f"Неизвестное поле идентификатора: {field}")
+        key = (field, value)
+
+        cached = self._entries.get(key)
+        if cached is not None:
+            identity, expires_at = cached
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                if identity is None:
+                    self.stats.negative_hits += 1
+                else:
+                    self.stats.hits += 1
+                return identity
+            self.stats.expirations += 1
+            self._discard(key)
+
+        # Параллельные промахи по одному ключу делают один запрос
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        self.stats.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            identity = await self._load(field, value)
+            self._store(key, identity)
+            future.set_result(identity)
+            return identity
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим; помечаем как полученное, чтобы не было предупреждения
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _load(self, field: str, value: int) -> Optional[StudentIdentity]:
+        async with async_session() as session:
+            row = (await session.execute(
+                select(*_COLUMNS).where(getattr(Student, field) == value)
+            )).first()
+        return StudentIdentity(*row) if row else None
+
+    def _store(self, key: CacheKey, identity: Optional[StudentIdentity]) -> None:
+        ttl = self.ttl if identity is not None else self.negative_ttl
+        self._discard(key)
+        self._entries[key] = (identity, time.monotonic() + ttl)
+        if identity is not None:
+            self._by_student.setdefault(identity.student_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            old_key, _ = next(iter(self._entries.items()))
+            self._discard(old_key)
+            self.stats.evictions += 1
+
+    def _discard(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[0] is not None:
+            keys = self._by_student.get(entry[0].student_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_student[entry[0].student_id]
+
+    def put(self, identity: StudentIdentity) -> None:
+        """Кладёт (или заменяет) все идентификаторы студента, вытесняя отрицательные записи"""
+        self.invalidate_student(identity.student_id)
+        for field in IDENTITY_FIELDS:
+            value = getattr(identity, field)
+            if value is not None:
+                self._store((field, value), identity)
+
+    def update_from_model(self, student: Student) -> None:
+        self.put(StudentIdentity(*(getattr(student, column.key) for column in _COLUMNS)))
+
+    def invalidate_student(self, student_id: int) -> None:
+        for key in list(self._by_student.get(student_id, ())):
+            self._discard(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_student.clear()
+
+    async def warm_up(self) -> int:
+        """Загружает самых свежих студентов одним запросом (примерно половину ёмкости кэша)"""
+        limit = max(self.max_size // 2, 1)
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(*_COLUMNS)
+                .where(or_(*(getattr(Student, field).is_not(None) for field in IDENTITY_FIELDS)))
+                .order_by(Student.created_at.desc())
+                .limit(limit)
+            )).all()
+        for row in reversed(rows):
+            self.put(StudentIdentity(*row))
+        logger.info("Identity cache: прогрето %s студентов", len(rows))
+        return len(rows)
+
+    def get_stats(self) -> dict:
+        self.stats.size = len(self._entries)
+        lookups = self.stats.hits + self.stats.negative_hits + self.stats.misses
+        result = asdict(self.stats)
+        result["hit_ratio"] = round((self.stats.hits + self.stats.negative_hits) / lookups, 4) if lookups else None
+        return result
+
+
+identity_cache = IdentityCache(
+    max_size=settings.IDENTITY_CACHE_MAX_SIZE,
+    ttl=settings.IDENTITY_CACHE_TTL,
+    negative_ttl=settings.IDENTITY_CACHE_NEGATIVE_TTL,
+)
@@ -0,0 +1,333 @@
+"""
+Rollup'ы задержек ответа бота (Message.processing_ms) для перцентилей p50/p95/p99.
+
+Раз в LATENCY_ROLLUP_INTERVAL секунд закрытые часы (старше LATENCY_ROLLUP_LAG — чтобы
+успели записаться сообщения из write-behind буфера) сворачиваются в latency_rollups:
+по часу, программе и message_type — число, сумма, максимум и лог-гистограмма
+(app.core.histogram). Суточные строки собираются из часовых в LATENCY_ROLLUP_TIMEZONE.
+Докуда данные уже свёрнуты, хранится в job_watermarks, поэтому после рестарта задача
+продолжает с того же места. Час пересобирается целиком, так что повторный прогон безопасен.
+
+processing_ms = 0 — значение по умолчанию для сообщений без замера (входящие), они не учитываются.
+
+    python -m app.services.latency_rollup run
+    python -m app.services.latency_rollup rebuild --since 2026-10-01T00:00:00+00:00
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core import histogram
+from app.core.config import settings
+from app.core.database import async_session
+from app.models.education import JobWatermark, LatencyRollup, Message
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "latency_rollup"
+HOUR = "hour"
+DAY = "day"
+
+HOURLY_SQL = text("""
+SELECT
+    date_trunc('hour', m.created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS bucket_start,
+    s.program_id,
+    COALESCE(m.message_type, '') AS message_type,
+    width_bucket(m.processing_ms, CAST(:bounds AS int[])) AS bucket,
+    count(*) AS n,
+    sum(m.processing_ms) AS sum_ms,
+    max(m.processing_ms) AS max_ms
+FROM messages m
+JOIN students s ON s.student_id = m.student_id
+WHERE m.created_at >= :start AND m.created_at < :end AND m.processing_ms > 0
+GROUP BY 1, 2, 3, 4
+""")
+
+GroupKey = Tuple[datetime, int, str]
+
+
+@dataclass
+class _Acc:
+    count: int = 0
+    sum_ms: int = 0
+    max_ms: int = 0
+    histogram: Optional[List[int]] = None
+
+    def add(self, count: int, sum_ms: int, max_ms: int, hist: Sequence[int]) -> None:
+        self.count += count
+        self.sum_ms += sum_ms
+        self.max_ms = max(self.max_ms, max_ms)
+        self.histogram = histogram.merge(self.histogram or histogram.empty(), hist)
+
+
+@dataclass
+class RollupResult:
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    hourly_rows: int = 0
+    daily_rows: int = 0
+    elapsed_ms: float = 0.0
+    # Окно было ограничено LATENCY_ROLLUP_MAX_HOURS — остались несвёрнутые часы
+    behind: bool = False
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class LatencyRollupJob:
+    def __init__(self, interval: float, lag: float, max_hours: int, tz: str):
+        self.interval = interval
+        self.lag = lag
+        self.max_hours = max_hours
+        self.tz = ZoneInfo(tz)
+        self._task: Optional[asyncio.Task] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    def _day_start(self, value: datetime) -> datetime:
+        local = value.astimezone(self.tz)
+        return datetime.combine(local.date(), datetime.min.time(), tzinfo=self.tz)
+
+    async def run_once(self) -> RollupResult:
+        result = RollupResult()
+        started = time.perf_counter()
+        async with async_session() as session, session.begin():
+            # Несколько воркеров: сворачивает тот, кто взял блокировку, остальные пропускают
+            if not await session.scalar(text("SELECT pg_try_advisory_xact_lock(hashtext(:job))"), {"job": JOB_NAME}):
+                return result
+
+            watermark = await session.scalar(select(JobWatermark.watermark).where(JobWatermark.job_name == JOB_NAME))
+            if watermark is None:
+                first = await session.scalar(select(func.min(Message.created_at)))
+                if first is None:
+                    return result
+                watermark = _floor_hour(first)
+
+            end = _floor_hour(datetime.now(timezone.utc) - timedelta(seconds=self.lag))
+            if end > watermark + timedelta(hours=self.max_hours):
+                end = watermark + timedelta(hours=self.max_hours)
+                result.behind = True
+            if end <= watermark:
+                return result
+            result.start, result.end = watermark, end
+
+            hourly = await self._hourly(session, watermark, end)
+            await session.execute(delete(LatencyRollup).where(
+                LatencyRollup.granularity == HOUR,
+                LatencyRollup.bucket_start >= watermark,
+                LatencyRollup.bucket_start < end,
+            ))
+            await self._insert(session, HOUR, hourly)
+            result.hourly_rows = len(hourly)
+
+            # Сутки, которых коснулось окно, пересобираются из часовых строк целиком
+            day_from = self._day_start(watermark)
+            day_to = self._day_start(end - timedelta(microseconds=1)) + timedelta(days=1)
+            daily = await self._daily(session, day_from, day_to)
+            await session.execute(delete(LatencyRollup).where(
+                LatencyRollup.granularity == DAY,
+                LatencyRollup.bucket_start >= day_from,
+                LatencyRollup.bucket_start < day_to,
+            ))
+            await self._insert(session, DAY, daily)
+            result.daily_rows = len(daily)
+
+            await session.execute(
+                pg_insert(JobWatermark)
+                .values(job_name=JOB_NAME, watermark=end)
+                .on_conflict_do_update(index_elements=[JobWatermark.job_name],
+                                       set_={"watermark": end, "updated_at": func.now()})
+            )
+
+        result.elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info("Latency rollup %s — %s: %s часовых, %s суточных строк за %.1f ms",
+                    result.start, result.end, result.hourly_rows, result.daily_rows, result.elapsed_ms)
+        return result
+
+    async def _hourly(self, session, start: datetime, end: datetime) -> Dict[GroupKey, _Acc]:
+        groups: Dict[GroupKey, _Acc] = {}
+        rows = await session.execute(HOURLY_SQL, {"bounds": list(histogram.BOUNDS_MS), "start": start, "end": end})
+        for row in rows:
+            acc = groups.setdefault((row.bucket_start, row.program_id, row.message_type), _Acc())
+            hist = histogram.empty()
+            hist[row.bucket] = row.n
+            acc.add(row.n, row.sum_ms, row.max_ms, hist)
+        return groups
+
+    async def _daily(self, session, day_from: datetime, day_to: datetime) -> Dict[GroupKey, _Acc]:
+        groups: Dict[GroupKey, _Acc] = {}
+        rows = await session.execute(
+            select(LatencyRollup.bucket_start, LatencyRollup.program_id, LatencyRollup.message_type,
+                   LatencyRollup.count, LatencyRollup.sum_ms, LatencyRollup.max_ms, LatencyRollup.histogram)
+            .where(LatencyRollup.granularity == HOUR,
+                   LatencyRollup.bucket_start >= day_from,
+                   LatencyRollup.bucket_start < day_to)
+        )
+        for bucket_start, program_id, message_type, count, sum_ms, max_ms, hist in rows:
+            key = (self._day_start(bucket_start), program_id, message_type)
+            groups.setdefault(key, _Acc()).add(count, sum_ms, max_ms, hist)
+        return groups
+
+    @staticmethod
+    async def _insert(session, granularity: str, groups: Dict[GroupKey, _Acc]) -> None:
+        if not groups:
+            return
+        await session.execute(insert(LatencyRollup), [
+            {
+                "granularity": granularity,
+                "bucket_start": bucket_start,
+                "program_id": program_id,
+                "message_type": message_type,
+                "count": acc.count,
+                "sum_ms": acc.sum_ms,
+                "max_ms": acc.max_ms,
+                "histogram": acc.histogram,
+            }
+            for (bucket_start, program_id, message_type), acc in groups.items()
+        ])
+
+    async def rewind(self, since: datetime) -> None:
+        """Сдвигает watermark назад: следующий прогон пересоберёт rollup'ы начиная с since"""
+        since = _floor_hour(since)
+        async with async_session() as session, session.begin():
+            await session.execute(
+                pg_insert(JobWatermark)
+                .values(job_name=JOB_NAME, watermark=since)
+                .on_conflict_do_update(index_elements=[JobWatermark.job_name],
+                                       set_={"watermark": since, "updated_at": func.now()})
+            )
+
+    async def catch_up(self) -> List[RollupResult]:
+        results = [await self.run_once()]
+        while results[-1].behind:
+            results.append(await self.run_once())
+        return results
+
+    async def start(self) -> None:
+        self._stopped = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="latency-rollup")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await self.catch_up()
+            except Exception:
+                logger.exception("Latency rollup: ошибка свёртки")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+latency_rollup = LatencyRollupJob(
+    interval=settings.LATENCY_ROLLUP_INTERVAL,
+    lag=settings.LATENCY_ROLLUP_LAG,
+    max_hours=settings.LATENCY_ROLLUP_MAX_HOURS,
+    tz=settings.LATENCY_ROLLUP_TIMEZONE,
+)
+
+
+@dataclass
+class LatencyPoint:
+    bucket_start: Optional[datetime]
+    program_id: Optional[int]
+    message_type: Optional[str]
+    count: int
+    avg_ms: Optional[float]
+    max_ms: int
+    percentiles: Dict[str, Optional[float]]
+
+
+async def query_percentiles(
+    session,
+    granularity: str,
+    date_from: datetime,
+    date_to: datetime,
+    percentiles: Iterable[float] = (50, 95, 99),
+    program_id: Optional[int] = None,
+    message_type: Optional[str] = None,
+    group_by: Optional[str] = None,
+) -> Tuple[List[LatencyPoint], LatencyPoint]:
+    """
+    Перцентили по rollup'ам (сырые сообщения не читаются). Возвращает ряд по bucket_start
+    (с разбивкой по program/message_type, если задан group_by) и итог за весь период.
+    """
+    stmt = select(LatencyRollup.bucket_start, LatencyRollup.program_id, LatencyRollup.message_type,
+                  LatencyRollup.count, LatencyRollup.sum_ms, LatencyRollup.max_ms, LatencyRollup.histogram) \
+        .where(LatencyRollup.granularity == granularity,
+               LatencyRollup.bucket_start >= date_from,
+               LatencyRollup.bucket_start < date_to) \
+        .order_by(LatencyRollup.bucket_start)
+    if program_id is not None:
+        stmt = stmt.where(LatencyRollup.program_id == program_id)
+    if message_type is not None:
+        stmt = stmt.where(LatencyRollup.message_type == message_type)
+
+    series: Dict[tuple, _Acc] = {}
+    total = _Acc()
+    for bucket_start, row_program, row_type, count, sum_ms, max_ms, hist in await session.execute(stmt):
+        key = (
+            bucket_start,
+            row_program if group_by == "program" else None,
+            row_type if group_by == "message_type" else None,
+        )
+        series.setdefault(key, _Acc()).add(count, sum_ms, max_ms, hist)
+        total.add(count, sum_ms, max_ms, hist)
+
+    percentiles = list(percentiles)
+    points = [_point(key, acc, percentiles) for key, acc in series.items()]
+    return points, _point((None, None, None), total, percentiles)
+
+
+def _point(key: tuple, acc: _Acc, percentiles: List[float]) -> LatencyPoint:
+    hist = acc.histogram or histogram.empty()
+    return LatencyPoint(
+        bucket_start=key[0],
+        program_id=key[1],
+        message_type=key[2],
+        count=acc.count,
+        avg_ms=round(acc.sum_ms / acc.count, 1) if acc.count else None,
+        max_ms=acc.max_ms,
+        percentiles={f"p{q:g}": histogram.percentile(hist, q, acc.max_ms) for q in percentiles},
+    )
+
+
+async def _run(args: argparse.Namespace) -> None:
+    if args.command == "rebuild":
+        await latency_rollup.rewind(datetime.fromisoformat(args.since))
+    for result in await latency_rollup.catch_up():
+        if result.start is None:
+            print("Нечего сворачивать")
+            continue
+        print(f"{result.start} — {result.end}: часовых строк {result.hourly_rows}, "
+              f"суточных {result.daily_rows}, {result.elapsed_ms:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rollup'ы задержек processing_ms")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("run", help="Свернуть все закрытые часы после watermark")
+    rebuild = sub.add_parser("rebuild", help="Пересобрать rollup'ы начиная с даты")
+    rebuild.add_argument("--since", required=True, help="ISO 8601, например 2026-10-01T00:00:00+00:00")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+Холодный архив истории сообщений.
+
+Сообщения старше MESSAGE_ARCHIVE_AFTER_DAYS (целыми месяцами UTC) выносятся из messages
+в blob-хранилище (app/core/storage.py: локальный диск или S3): сегмент на студента и месяц —
+JSONL по возрастанию (created_at, message_id), сжатый MESSAGE_ARCHIVE_CODEC (gzip из
+стандартной библиотеки или zstd — нужен пакет zstandard). Сегменты — ссылки в blobs, gc их
+не удалит; метаданные — в message_archive_segments.
+
+Месяц со своей секцией (app/services/message_partitions.py) архивируется без DELETE:
+сегменты пишутся по всем студентам месяца, затем, если все строки секции попали в
+сегменты, секция удаляется целиком. Строки вне своей секции (messages_default или
+несекционированная таблица) удаляются вместе с записью сегмента в одной транзакции.
+Сообщения, пришедшие в уже архивный месяц, следующий прогон сливает с его сегментом.
+
+История студента (GET /api/v1/messages) дочитывает архив, когда страница выходит за
+горячие данные, курсор общий. Распакованные сегменты кэшируются в памяти
+(MESSAGE_ARCHIVE_CACHE_SEGMENTS штук).
+
+    python -m app.services.message_archive run
+    python -m app.services.message_archive restore --month 2026-03
+"""
+
+import argparse
+import asyncio
+import gzip
+import io
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import distinct, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.database import async_session, get_engine
+from app.core.storage import get_blob_store
+from app.models.education import Blob, Message, MessageArchiveSegment
+from app.services import blobs
+from app.services.message_partitions import add_months, month_start, months, partition_ddl, partition_name
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "message_archive"
+FIELDS = (
+    "message_id", "student_id", "role", "sender_type", "text_content",
+    "processing_ms", "telegram_user_id", "message_type", "created_at",
+)
+MIMETYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+READ_CHUNK_SIZE = 1024 * 1024
+
+DELETE_ROWS_SQL = text(
+    "DELETE FROM messages WHERE message_id = ANY(:ids) AND created_at >= :start AND created_at < :end"
+)
+INSERT_ROWS_SQL = text(
+    f"INSERT INTO messages ({', '.join(FIELDS)}) VALUES ({', '.join(':' + name for name in FIELDS)}) "
+    "ON CONFLICT DO NOTHING"
+)
+
+Position = Tuple[datetime, int]
+
+
+def _row_hash(alias: str = "") -> str:
+    # Отпечаток строки, который Postgres считает одинаково при архивации и перед DROP секции
+    prefix = f"{alias}." if alias else ""
+    return f"md5(ROW({', '.join(prefix + name for name in FIELDS)})::text)"
+
+
+# Строки секции, которых нет в сегментах или которые изменились после записи сегмента.
+# unnest + LEFT JOIN — хэш-соединение, а не сравнение каждой строки со всем массивом
+CHANGED_ROWS_SQL = """
+SELECT count(*) FROM {partition} p
+LEFT JOIN unnest(CAST(:ids AS bigint[]), CAST(:hashes AS text[])) AS c(id, row_hash) ON c.id = p.message_id
+WHERE c.id IS NULL OR c.row_hash <> """ + _row_hash("p")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("Для MESSAGE_ARCHIVE_CODEC=zstd установите zstandard") from e
+    return zstandard
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        # mtime=0: одинаковое содержимое даёт одинаковый файл и тот же blob
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if codec == "zstd":
+        return _zstandard().ZstdCompressor(level=10).compress(data)
+    raise ValueError(f"Неизвестный кодек архива: {codec}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        return _zstandard().ZstdDecompressor().decompress(data)
+    raise ValueError(f"Неизвестный кодек архива: {codec}")
+
+
+def encode_segment(records: Sequence[dict], codec: str) -> bytes:
+    lines = [
+        json.dumps({**record, "created_at": record["created_at"].isoformat()}, ensure_ascii=False,
+                   separators=(",", ":"))
+        for record in records
+    ]
+    return compress(("\n".join(lines) + "\n").encode(), codec)
+
+
+def decode_segment(data: bytes, codec: str) -> List[dict]:
+    records = []
+    for line in decompress(data, codec).splitlines():
+        record = json.loads(line)
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+        records.append(record)
+    return records
+
+
+def _month_bounds(month: date) -> Tuple[datetime, datetime]:
+    return (
+        datetime.combine(month, dtime.min, tzinfo=timezone.utc),
+        datetime.combine(add_months(month, 1), dtime.min, tzinfo=timezone.utc),
+    )
+
+
+class _SegmentCache:
+    """LRU распакованных сегментов; ключ — SHA-256 содержимого, поэтому записи не устаревают"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, List[dict]]" = OrderedDict()
+
+    def get(self, digest: str) -> Optional[List[dict]]:
+        records = self._items.get(digest)
+        if records is not None:
+            self._items.move_to_end(digest)
+        return records
+
+    def put(self, digest: str, records: List[dict]) -> None:
+        if self.max_size <= 0:
+            return
+        self._items[digest] = records
+        self._items.move_to_end(digest)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+_cache = _SegmentCache(settings.MESSAGE_ARCHIVE_CACHE_SEGMENTS)
+
+
+async def load_segment(digest: str, codec: str, size: int) -> List[dict]:
+    """Записи сегмента по возрастанию (created_at, message_id); список общий для кэша — не изменять"""
+    records = _cache.get(digest)
+    if records is not None:
+        return records
+    buffer = io.BytesIO()
+    async for chunk in get_blob_store().iter_range(digest, 0, size - 1, READ_CHUNK_SIZE):
+        buffer.write(chunk)
+    records = await asyncio.to_thread(decode_segment, buffer.getvalue(), codec)
+    _cache.put(digest, records)
+    return records
+
+
+async def read_history(
+    session,
+    student_id: int,
+    order: str,
+    limit: int,
+    position: Optional[Position] = None,
+    filters: Optional[Dict[str, Optional[str]]] = None,
+) -> List[dict]:
+    """
+    Архивные сообщения студента в порядке order ("desc" | "asc") строго после position
+    (как keyset-курсор истории), не больше limit. filters — точное совпадение полей, None — без фильтра.
+    """
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    stmt = (
+        select(MessageArchiveSegment.blob_sha256, MessageArchiveSegment.codec, Blob.size)
+        .join(Blob, Blob.sha256 == MessageArchiveSegment.blob_sha256)
+        .where(MessageArchiveSegment.student_id == student_id)
+    )
+    descending = order == "desc"
+    if position is not None:
+        bound = month_start(position[0])
+        stmt = stmt.where(MessageArchiveSegment.month <= bound if descending else MessageArchiveSegment.month >= bound)
+    stmt = stmt.order_by(MessageArchiveSegment.month.desc() if descending else MessageArchiveSegment.month.asc())
+
+    result: List[dict] = []
+    for digest, codec, size in (await session.execute(stmt)).all():
+        records = await load_segment(digest, codec, size)
+        for record in (reversed(records) if descending else records):
+            if position is not None:
+                key = (record["created_at"], record["message_id"])
+                if (key >= position) if descending else (key <= position):
+                    continue
+            if any(record[name] != value for name, value in filters.items()):
+                continue
+            result.append(record)
+            if len(result) >= limit:
+                return result
+    return result
+
+
+@dataclass
+class ArchiveResult:
+    months: List[date] = field(default_factory=list)
+    segments: int = 0
+    messages: int = 0
+    dropped_partitions: List[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+
+class MessageArchiveJob:
+    def __init__(self, interval: float, after_days: float, codec: str, lock_timeout: str = "5s"):
+        self.interval = interval
+        self.after_days = after_days
+        self.codec = codec
+        self.lock_timeout = lock_timeout
+        self._task: Optional[asyncio.Task] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    def cutoff(self, now: Optional[datetime] = None) -> date:
+        """Первый месяц, который остаётся в горячем хранилище"""
+        now = now or datetime.now(timezone.utc)
+        return month_start(now - timedelta(days=self.after_days))
+
+    async def run_once(self, now: Optional[datetime] = None) -> ArchiveResult:
+        result = ArchiveResult()
+        started = time.perf_counter()
+        # Один архиватор на базу: сессионная блокировка держится всё время прогона
+        async with get_engine().connect() as lock_conn:
+            if not await lock_conn.scalar(text("SELECT pg_try_advisory_lock(hashtext(:job))"), {"job": JOB_NAME}):
+                return result
+            await lock_conn.commit()
+            try:
+                cutoff = self.cutoff(now)
+                async with async_session() as session:
+                    first = await session.scalar(select(func.min(Message.created_at)))
+                if first is not None:
+                    for month in months(first, add_months(cutoff, -1)):
+                        await self.archive_month(month, result)
+            finally:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(hashtext(:job))"), {"job": JOB_NAME})
+                await lock_conn.commit()
+
+        result.elapsed_ms = (time.perf_counter() - started) * 1000
+        if result.months:
+            logger.info("Архив сообщений: месяцы %s, сегментов %s, сообщений %s, удалены секции %s, %.0f ms",
+                        ", ".join(f"{m:%Y-%m}" for m in result.months), result.segments, result.messages,
+                        ", ".join(result.dropped_partitions) or "—", result.elapsed_ms)
+        return result
+
+    async def archive_month(self, month: date, result: ArchiveResult) -> None:
+        start, end = _month_bounds(month)
+        partition = partition_name(month)
+        async with async_session() as session:
+            students = (await session.scalars(
+                select(distinct(Message.student_id))
+                .where(Message.created_at >= start, Message.created_at < end)
+            )).all()
+            own_partition = bool(await session.scalar(text("SELECT to_regclass(:p) IS NOT NULL"), {"p": partition}))
+        if not students:
+            return
+
+        result.months.append(month)
+        covered: Dict[int, str] = {}
+        for student_id in students:
+            archived, hashes = await self._archive_student(student_id, month, start, end,
+                                                           delete_rows=not own_partition)
+            covered.update(hashes)
+            if archived:
+                result.segments += 1
+                result.messages += archived
+        if own_partition and await self._drop_partition(partition, covered):
+            result.dropped_partitions.append(partition)
+
+    async def _archive_student(self, student_id: int, month: date, start: datetime, end: datetime,
+                               delete_rows: bool) -> Tuple[int, Dict[int, str]]:
+        """
+        Пишет сегмент студента за месяц. Возвращает число заархивированных горячих строк
+        и отпечатки (message_id -> md5 строки) горячих строк в том виде, в каком они в сегменте.
+        """
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(*(getattr(Message, name) for name in FIELDS), literal_column(_row_hash()).label("row_hash"))
+                .where(Message.student_id == student_id, Message.created_at >= start, Message.created_at < end)
+                .order_by(Message.created_at, Message.message_id)
+            )).mappings().all()
+            existing = (await session.execute(
+                select(MessageArchiveSegment.blob_sha256, MessageArchiveSegment.codec,
+                       MessageArchiveSegment.message_count, Blob.size)
+                .join(Blob, Blob.sha256 == MessageArchiveSegment.blob_sha256)
+                .where(MessageArchiveSegment.student_id == student_id, MessageArchiveSegment.month == month)
+            )).first()
+        if not rows:
+            return 0, {}
+        ids = [row["message_id"] for row in rows]
+        hashes = {row["message_id"]: row["row_hash"] for row in rows}
+        hot = {row["message_id"]: {name: row[name] for name in FIELDS} for row in rows}
+
+        # Сливаем с уже архивными: в сегменте могут быть строки, которых в messages больше нет
+        # (месяц архивировался удалением, потом для него появилась секция — миграция 0010 или restore)
+        merged = {}
+        if existing is not None:
+            for record in await load_segment(existing.blob_sha256, existing.codec, existing.size):
+                merged[record["message_id"]] = record
+            if not delete_rows and all(merged.get(message_id) == record for message_id, record in hot.items()):
+                # Секция месяца цела, все её строки студента уже в сегменте и не менялись
+                return 0, hashes
+        merged.update(hot)
+        records = sorted(merged.values(), key=lambda r: (r["created_at"], r["message_id"]))
+
+        data = await asyncio.to_thread(encode_segment, records, self.codec)
+        stored = await blobs.put_file(io.BytesIO(data), MIMETYPES[self.codec])
+        values = {
+            "blob_sha256": stored.sha256,
+            "codec": self.codec,
+            "message_count": len(records),
+            "first_created_at": records[0]["created_at"],
+            "last_created_at": records[-1]["created_at"],
+        }
+        async with async_session() as session, session.begin():
+            await session.execute(
+                pg_insert(MessageArchiveSegment)
+                .values(student_id=student_id, month=month, **values)
+                .on_conflict_do_update(index_elements=["student_id", "month"],
+                                       set_={**values, "archived_at": func.now()})
+            )
+            if delete_rows:
+                await session.execute(DELETE_ROWS_SQL, {"ids": ids, "start": start, "end": end})
+        if existing is not None:
+            await blobs.release(existing.blob_sha256)
+        return len(rows), hashes
+
+    async def _drop_partition(self, partition: str, covered: Dict[int, str]) -> bool:
+        """Удаляет секцию месяца, если все её строки есть в сегментах в текущем виде"""
+        async with get_engine().begin() as conn:
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{self.lock_timeout}'"))
+            # SHARE: запись в секцию ждёт до конца транзакции, чтение не блокируется
+            await conn.execute(text(f"LOCK TABLE {partition} IN SHARE MODE"))
+            # Сверяем строки секции с отпечатками записанного в сегменты, а не с message_count:
+            # в сегментах бывают и строки, которых в секции нет, а UPDATE после записи сегмента
+            # иначе пропал бы вместе с секцией
+            changed = await conn.scalar(
+                text(CHANGED_ROWS_SQL.format(partition=partition)),
+                {"ids": list(covered), "hashes": list(covered.values())},
+            )
+            if changed:
+                logger.warning("Архив сообщений: %s — %s строк секции нет в сегментах или они изменились; "
+                               "секция оставлена до следующего прогона", partition, changed)
+                return False
+            await conn.execute(text(f"DROP TABLE {partition}"))
+        return True
+
+    async def start(self) -> None:
+        self._stopped = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="message-archive")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Архив сообщений: ошибка архивации")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+message_archive = MessageArchiveJob(
+    interval=settings.MESSAGE_ARCHIVE_INTERVAL,
+    after_days=settings.MESSAGE_ARCHIVE_AFTER_DAYS,
+    codec=settings.MESSAGE_ARCHIVE_CODEC,
+)
+
+
+async def restore(month: date) -> int:
+    """
+    Возвращает сообщения месяца из архива в messages и удаляет его сегменты. Если месяц
+    старше MESSAGE_ARCHIVE_AFTER_DAYS, следующий прогон архивирует его снова.
+    """
+    month = month_start(month)
+    try:
+        # Своя секция, если таблица секционирована; иначе строки лягут в messages_default
+        async with get_engine().begin() as conn:
+            await conn.execute(text(partition_ddl(month)))
+    except Exception as e:
+        logger.warning("Секция %s не создана: %s", partition_name(month), e)
+
+    restored = 0
+    async with async_session() as session:
+        segments = (await session.execute(
+            select(MessageArchiveSegment.segment_id, MessageArchiveSegment.blob_sha256,
+                   MessageArchiveSegment.codec, Blob.size)
+            .join(Blob, Blob.sha256 == MessageArchiveSegment.blob_sha256)
+            .where(MessageArchiveSegment.month == month)
+        )).all()
+    for segment in segments:
+        records = await load_segment(segment.blob_sha256, segment.codec, segment.size)
+        async with async_session() as session, session.begin():
+            await session.execute(INSERT_ROWS_SQL, [dict(record) for record in records])
+            await session.execute(
+                text("DELETE FROM message_archive_segments WHERE segment_id = :id"), {"id": segment.segment_id}
+            )
+        await blobs.release(segment.blob_sha256)
+        restored += len(records)
+    return restored
+
+
+async def _run(args: argparse.Namespace) -> None:
+    if args.command == "run":
+        result = await message_archive.run_once()
+        print(f"Месяцев: {len(result.months)}, сегментов: {result.segments}, сообщений: {result.messages}, "
+              f"удалено секций: {len(result.dropped_partitions)}")
+    elif args.command == "restore":
+        print(f"Возвращено сообщений: {await restore(date.fromisoformat(args.month + '-01'))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Холодный архив сообщений")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("run", help="Заархивировать месяцы старше MESSAGE_ARCHIVE_AFTER_DAYS")
+    restore_cmd = sub.add_parser("restore", help="Вернуть месяц из архива в messages")
+    restore_cmd.add_argument("--month", required=True, help="YYYY-MM")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Write-behind буфер для сообщений бота.
+
+Вместо INSERT-транзакции на каждое сообщение записи копятся в памяти и сбрасываются
+в messages пачками через COPY (asyncpg) — по размеру пачки или по возрасту самой старой записи.
+Когда буфер заполнен, put_many() ждёт освобождения места (back-pressure) и по таймауту
+бросает BufferFull. При остановке приложения буфер сбрасывается полностью.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.database import get_engine
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "student_id", "role", "sender_type", "text_content",
+    "processing_ms", "telegram_user_id", "message_type", "created_at",
+)
+MessageRecord = Tuple[int, Optional[str], str, str, Optional[int], Optional[int], Optional[str], datetime]
+
+
+class BufferFull(Exception):
+    """В буфере нет места и оно не освободилось за отведённое время"""
+
+
+@dataclass
+class _Entry:
+    record: MessageRecord
+    enqueued_at: float
+    # Future на последней записи пачки из put_many(wait=True)
+    done: Optional[asyncio.Future] = None
+
+
+@dataclass
+class BufferStats:
+    enqueued: int = 0
+    written: int = 0
+    dropped: int = 0
+    flushes: int = 0
+    failed_flushes: int = 0
+    last_flush_ms: float = 0.0
+    pending: int = 0
+
+
+class MessageWriteBuffer:
+    def __init__(self, max_size: int, flush_size: int, flush_interval: float, put_timeout: float):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._pending: Deque[_Entry] = deque()
+        self._cond: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = BufferStats()
+
+    async def start(self) -> None:
+        self._cond = asyncio.Condition()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="message-write-buffer")
+
+    async def stop(self) -> None:
+        """Останавливает фоновый сброс и дописывает всё, что осталось в буфере"""
+        if self._task is None:
+            return
+        self._stopping = True
+        async with self._cond:
+            self._cond.notify_all()
+        await self._task
+        self._task = None
+
+    async def put_many(self, records: Sequence[MessageRecord], wait: bool = False) -> None:
+        """
+        Ставит записи в очередь. Пачка добавляется целиком или не добавляется вовсе.
+        wait=True — дождаться, пока записи окажутся в БД.
+        """
+        if self._task is None or self._stopping:
+            raise BufferFull("Буфер сообщений не запущен")
+        if len(records) > self.max_size:
+            raise ValueError(f"Пачка больше буфера ({len(records)} > {self.max_size})")
+
+        done = asyncio.get_running_loop().create_future() if wait else None
+        async with self._cond:
+            try:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: len(self._pending) + len(records) <= self.max_size),
+                    timeout=self.put_timeout,
+                )
+            except asyncio.TimeoutError:
+                raise BufferFull("Буфер сообщений переполнен")
+
+            now = time.monotonic()
+            for record in records:
+                self._pending.append(_Entry(record, now))
+            if done is not None and self._pending:
+                self._pending[-1].done = done
+            self.stats.enqueued += len(records)
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify_all()
+
+        if done is not None:
+            await done
+
+    def _due(self) -> bool:
+        if self._stopping or len(self._pending) >= self.flush_size:
+            return True
+        return bool(self._pending) and time.monotonic() - self._pending[0].enqueued_at >= self.flush_interval
+
+    async def _run(self) -> None:
+        shutdown_failures = 0
+        while True:
+            async with self._cond:
+                try:
+                    await asyncio.wait_for(self._cond.wait_for(self._due), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                if not self._pending:
+                    if self._stopping:
+                        return
+                    continue
+                batch = [self._pending.popleft() for _ in range(min(self.flush_size, len(self._pending)))]
+
+            ok = await self._flush(batch)
+            async with self._cond:
+                if not ok:
+                    # Соединение с БД недоступно — возвращаем пачку в начало очереди
+                    self._pending.extendleft(reversed(batch))
+                self._cond.notify_all()
+            if not ok:
+                shutdown_failures += self._stopping
+                if shutdown_failures > 3:
+                    self.stats.dropped += len(self._pending)
+                    logger.error("Не удалось сбросить %s сообщений при остановке", len(self._pending))
+                    self._fail_waiters(self._pending, RuntimeError("Буфер остановлен без записи"))
+                    self._pending.clear()
+                    return
+                await asyncio.sleep(min(self.flush_interval * 2, 5))
+
+    async def _flush(self, batch: List[_Entry]) -> bool:
+        started = time.perf_counter()
+        try:
+            try:
+                await self._copy([entry.record for entry in batch])
+                self.stats.written += len(batch)
+            except (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError):
+                # Плохая запись валит весь COPY — пишем по одной, отбрасывая невалидные
+                logger.warning("COPY пачки из %s сообщений отклонён, пишем построчно", len(batch))
+                await self._insert_one_by_one(batch)
+        except Exception:
+            self.stats.failed_flushes += 1
+            logger.exception("Ошибка записи пачки из %s сообщений", len(batch))
+            return False
+
+        self.stats.flushes += 1
+        self.stats.last_flush_ms = (time.perf_counter() - started) * 1000
+        for entry in batch:
+            if entry.done is not None and not entry.done.done():
+                entry.done.set_result(None)
+        return True
+
+    async def _copy(self, records: List[MessageRecord]) -> None:
+        async with get_engine().connect() as conn:
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table("messages", records=records, columns=COLUMNS)
+
+    async def _insert_one_by_one(self, batch: List[_Entry]) -> None:
+        placeholders = ", ".join(f"${i}" for i in range(1, len(COLUMNS) + 1))
+        query = f"INSERT INTO messages ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+        written = dropped = 0
+        async with get_engine().connect() as conn:
+            raw = (await conn.get_raw_connection()).driver_connection
+            # Одна транзакция на пачку, savepoint на строку: при обрыве посередине не записано
+            # ничего, и повтор пачки из _run не создаст дубликатов
+            async with raw.transaction():
+                for entry in batch:
+                    try:
+                        async with raw.transaction():
+                            await raw.execute(query, *entry.record)
+                        written += 1
+                    except (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError) as e:
+                        dropped += 1
+                        logger.error("Сообщение отброшено (%s): student_id=%s", e, entry.record[0])
+        self.stats.written += written
+        self.stats.dropped += dropped
+
+    @staticmethod
+    def _fail_waiters(entries, exc: Exception) -> None:
+        for entry in entries:
+            if entry.done is not None and not entry.done.done():
+                entry.done.set_exception(exc)
+
+    def get_stats(self) -> BufferStats:
+        self.stats.pending = len(self._pending)
+        return self.stats
+
+
+message_buffer = MessageWriteBuffer(
+    max_size=settings.MESSAGE_BUFFER_MAX_SIZE,
+    flush_size=settings.MESSAGE_BUFFER_FLUSH_SIZE,
+    flush_interval=settings.MESSAGE_BUFFER_FLUSH_INTERVAL,
+    put_timeout=settings.MESSAGE_BUFFER_PUT_TIMEOUT,
+)
@@ -0,0 +1,351 @@
+"""
+Помесячные секции messages (PARTITION BY RANGE (created_at)).
+
+Секция на календарный месяц UTC: messages_y2026m10 — [2026-10-01, 2026-11-01). Запросы
+с условием на created_at (история студента, поиск с датами, rollup'ы задержек, выгрузки
+по watermark) читают только нужные секции; VACUUM и перестроение индексов идут по одной
+секции, а старые месяцы можно отсоединять целиком вместо DELETE.
+
+Секции создаются заранее: раз в MESSAGE_PARTITIONS_INTERVAL секунд (и при старте) задача
+проверяет, что есть секции с текущего месяца на MESSAGE_PARTITIONS_AHEAD месяцев вперёд.
+messages_default принимает строки вне созданных секций, чтобы вставка не падала; секцию
+на месяц, строки которого уже лежат в default, Postgres создать не даст — это пишется в лог.
+
+Перевод существующей таблицы (между миграциями 0010 и 0011; пока он не сделан, задача
+ничего не делает). 0010 создаёт пустую секционированную messages_partitioned и триггер,
+повторяющий в ней UPDATE/DELETE уже скопированных строк. migrate копирует строки порциями
+по message_id (каждая порция — своя транзакция, прерванный перенос продолжается с места
+остановки), догоняет вставленное за время копирования и короткой транзакцией под
+EXCLUSIVE-блокировкой (чтение не блокируется, запись ждёт) докопирует последние строки
+и меняет таблицы местами. Строки, закоммиченные позже строк с большими id, догоняются
+антиджойном до блокировки; под ней перепроверяется только свежий хвост. Старая таблица
+остаётся как messages_legacy, её удаляет 0011.
+
+    python -m app.services.message_partitions migrate --batch-size 20000 --pause 0.1
+    python -m app.services.message_partitions ensure --ahead 6
+    python -m app.services.message_partitions list
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timezone
+from typing import Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import get_engine
+
+logger = logging.getLogger(__name__)
+
+TABLE = "messages"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+IS_PARTITIONED_SQL = text(
+    "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+)
+
+PARTITIONS_SQL = text("""
+SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound, c.reltuples::bigint AS rows_estimate
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = to_regclass(:table)
+ORDER BY c.relname
+""")
+
+
+# Таблица, которую миграция 0010 создаёт рядом со старой messages
+STAGING_TABLE = f"{TABLE}_partitioned"
+LEGACY_TABLE = f"{TABLE}_legacy"
+COPY_COLUMNS = (
+    "message_id", "student_id", "role", "sender_type", "text_content",
+    "processing_ms", "telegram_user_id", "message_type", "created_at",
+)
+# Индексы и ограничения новой таблицы: имя до переключения -> после
+STAGING_RENAMES = {
+    f"{STAGING_TABLE}_pkey": f"{TABLE}_pkey",
+    "idx_messages_partitioned_student_created": "idx_messages_student_created",
+    "idx_messages_partitioned_created_at": "idx_messages_created_at",
+    "idx_messages_partitioned_search_vector": "idx_messages_search_vector",
+    "idx_messages_partitioned_text_trgm": "idx_messages_text_trgm",
+}
+STAGING_FOREIGN_KEYS = {f"{STAGING_TABLE}_student_id_fkey": f"{TABLE}_student_id_fkey"}
+SYNC_TRIGGER = "messages_partitioned_sync"
+
+_columns = ", ".join(COPY_COLUMNS)
+# created_at в старой таблице допускал NULL; такие строки получают время переноса
+_select_columns = _columns.replace("created_at", "coalesce(created_at, now())")
+
+COPY_BATCH_SQL = text(f"""
+WITH batch AS (
+    SELECT {_select_columns} FROM {TABLE}
+    WHERE message_id > :after AND message_id <= :upto
+    ORDER BY message_id
+    LIMIT :limit
+    -- UPDATE/DELETE этих строк дождутся коммита порции, и триггер повторит их в новой таблице
+    FOR SHARE
+), copied AS (
+    INSERT INTO {STAGING_TABLE} ({_columns}) SELECT * FROM batch
+    ON CONFLICT DO NOTHING
+)
+SELECT max(message_id) AS last_id, count(*) AS n FROM batch
+""")
+
+# Строки с message_id ниже уже скопированных: транзакция с меньшими id закоммитилась позже
+# (например, порция отложенной записи), и проход по возрастанию message_id её пропустил.
+# Без блокировки — по всей таблице (:since = 0), под блокировкой — только по свежему хвосту
+COPY_MISSING_SQL = text(f"""
+INSERT INTO {STAGING_TABLE} ({_columns})
+SELECT {_select_columns} FROM {TABLE} m
+WHERE m.message_id >= :since
+  AND NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} p WHERE p.message_id = m.message_id)
+FOR SHARE OF m
+""")
+COUNT_SINCE_SQL = "SELECT count(*) FROM {table} WHERE message_id >= :since"
+
+SECONDARY_OBJECTS_SQL = text("""
+SELECT 'INDEX' AS kind, indexrelid::regclass::text AS name FROM pg_index WHERE indrelid = to_regclass(:table)
+UNION ALL
+SELECT 'CONSTRAINT', conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'f'
+""")
+
+
+def month_start(value: Union[date, datetime]) -> date:
+    if isinstance(value, datetime):
+        value = value.astimezone(timezone.utc) if value.tzinfo else value
+        value = value.date()
+    return value.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months(first: date, last: date) -> Iterator[date]:
+    """Первые числа месяцев от first до last включительно"""
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_ddl(month: date, table: str = TABLE) -> str:
+    """CREATE TABLE секции месяца; table — родитель (миграция создаёт секции до переименования)"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+        f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+class MessagePartitionJob:
+    def __init__(self, interval: float, ahead: int):
+        self.interval = interval
+        self.ahead = ahead
+        self._task: Optional[asyncio.Task] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    async def ensure(self, now: Optional[datetime] = None, ahead: Optional[int] = None) -> List[str]:
+        """Создаёт недостающие секции с текущего месяца на ahead месяцев вперёд, возвращает их имена"""
+        current = month_start(now or datetime.now(timezone.utc))
+        ahead = self.ahead if ahead is None else ahead
+        engine = get_engine()
+        async with engine.connect() as conn:
+            if not await _is_partitioned(conn):
+                logger.debug("Секции messages: таблица не секционирована, пропуск")
+                return []
+            existing = {row.name for row in await conn.execute(PARTITIONS_SQL, {"table": TABLE})}
+
+        created = []
+        for month in months(current, add_months(current, ahead)):
+            name = partition_name(month)
+            if name in existing:
+                continue
+            # Каждая секция — своя транзакция: месяц с конфликтом в default не мешает остальным
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text(partition_ddl(month)))
+            except Exception:
+                logger.exception("Секции messages: не удалось создать %s (строки месяца уже в %s?)",
+                                 name, DEFAULT_PARTITION)
+                continue
+            created.append(name)
+
+        if created:
+            logger.info("Секции messages: созданы %s", ", ".join(created))
+        return created
+
+    async def start(self) -> None:
+        self._stopped = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="message-partitions")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await self.ensure()
+            except Exception:
+                logger.exception("Секции messages: ошибка проверки")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _is_partitioned(conn) -> bool:
+    return bool(await conn.scalar(IS_PARTITIONED_SQL, {"table": TABLE}))
+
+
+async def _copy(conn, after: int, upto: int, limit: int) -> Tuple[int, int]:
+    """Одна порция строк с message_id в (after, upto]; возвращает (последний message_id, число строк)"""
+    row = (await conn.execute(COPY_BATCH_SQL, {"after": after, "upto": upto, "limit": limit})).one()
+    return (row.last_id, row.n) if row.n else (after, 0)
+
+
+async def migrate(batch_size: int = 20000, pause: float = 0.0, lock_timeout: str = "5s") -> int:
+    """
+    Переносит строки messages в messages_partitioned и меняет таблицы местами.
+    Возвращает число скопированных строк; после переключения ничего не делает.
+    """
+    engine = get_engine()
+    async with engine.connect() as conn:
+        if await _is_partitioned(conn):
+            logger.info("messages уже секционирована")
+            return 0
+        if await conn.scalar(text("SELECT to_regclass(:t) IS NULL"), {"t": STAGING_TABLE}):
+            raise RuntimeError(f"Нет таблицы {STAGING_TABLE} — сначала alembic upgrade 0010")
+        # Продолжаем с места остановки: новая таблица заполняется строго по возрастанию message_id
+        after = await conn.scalar(text(f"SELECT coalesce(max(message_id), 0) FROM {STAGING_TABLE}"))
+
+    copied = 0
+    started = time.perf_counter()
+    # Проходы до текущего max(message_id), пока за проход не наберётся меньше одной порции —
+    # тогда под блокировкой останется докопировать совсем немного
+    while True:
+        async with engine.connect() as conn:
+            upto = await conn.scalar(text(f"SELECT coalesce(max(message_id), 0) FROM {TABLE}"))
+        in_pass = 0
+        while after < upto:
+            async with engine.begin() as conn:
+                after, n = await _copy(conn, after, upto, batch_size)
+            if not n:
+                break
+            in_pass += n
+            copied += n
+            logger.info("Секции messages: скопировано %s строк, message_id до %s из %s (%.0f строк/с)",
+                        copied, after, upto, copied / max(time.perf_counter() - started, 1e-9))
+            if pause:
+                await asyncio.sleep(pause)
+        if in_pass < batch_size:
+            break
+
+    # Догоняем строки, закоммиченные позже строк с большими id, — тоже без блокировки, пока
+    # за проход не наберётся меньше порции. Под блокировкой перепроверяется только хвост
+    # с message_id от максимума, снятого перед последним проходом
+    while True:
+        async with engine.connect() as conn:
+            since = await conn.scalar(text(f"SELECT coalesce(max(message_id), 0) FROM {TABLE}"))
+        async with engine.begin() as conn:
+            missing = (await conn.execute(COPY_MISSING_SQL, {"since": 0})).rowcount
+        copied += missing
+        if missing:
+            logger.info("Секции messages: докопировано %s пропущенных строк", missing)
+        if missing < batch_size:
+            break
+
+    copied += await _switch(since, lock_timeout)
+    return copied
+
+
+async def _switch(since: int, lock_timeout: str) -> int:
+    """Под блокировкой записи докопирует строки с message_id >= since и меняет таблицы местами"""
+    async with get_engine().begin() as conn:
+        # Не ждём дольше lock_timeout долгие транзакции на messages — лучше повторить запуск
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+        await conn.execute(text(f"LOCK TABLE {TABLE} IN EXCLUSIVE MODE"))
+        tail = (await conn.execute(COPY_MISSING_SQL, {"since": since})).rowcount
+
+        # Сверка только по хвосту: полный count(*) под блокировкой остановил бы запись надолго
+        old_count = await conn.scalar(text(COUNT_SINCE_SQL.format(table=TABLE)), {"since": since})
+        new_count = await conn.scalar(text(COUNT_SINCE_SQL.format(table=STAGING_TABLE)), {"since": since})
+        if old_count != new_count:
+            # Транзакция откатится, таблицы останутся на месте
+            raise RuntimeError(
+                f"Секции messages: с message_id {since} в {TABLE} {old_count} строк, "
+                f"в {STAGING_TABLE} {new_count} — переключение отменено"
+            )
+
+        sequence = await conn.scalar(text(f"SELECT pg_get_serial_sequence('{TABLE}', 'message_id')"))
+        await conn.execute(text(f"DROP TRIGGER IF EXISTS {SYNC_TRIGGER} ON {TABLE}"))
+        await conn.execute(text(f"DROP FUNCTION IF EXISTS {SYNC_TRIGGER}()"))
+
+        await conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}"))
+        for kind, name in (await conn.execute(SECONDARY_OBJECTS_SQL, {"table": LEGACY_TABLE})).all():
+            if kind == "INDEX":
+                await conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name}_legacy"'))
+            else:
+                await conn.execute(text(f'ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT "{name}" TO "{name}_legacy"'))
+
+        await conn.execute(text(f"ALTER TABLE {STAGING_TABLE} RENAME TO {TABLE}"))
+        for old, new in STAGING_RENAMES.items():
+            await conn.execute(text(f"ALTER INDEX {old} RENAME TO {new}"))
+        for old, new in STAGING_FOREIGN_KEYS.items():
+            await conn.execute(text(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {old} TO {new}"))
+        # Последовательность переходит к новой таблице, иначе DROP messages_legacy удалит её
+        await conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} ALTER COLUMN message_id DROP DEFAULT"))
+        await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.message_id"))
+
+    logger.info("Секции messages: таблицы переключены (под блокировкой скопировано %s строк), "
+                "старая — %s", tail, LEGACY_TABLE)
+    return tail
+
+
+
+message_partitions = MessagePartitionJob(
+    interval=settings.MESSAGE_PARTITIONS_INTERVAL,
+    ahead=settings.MESSAGE_PARTITIONS_AHEAD,
+)
+
+
+async def _run(args: argparse.Namespace) -> None:
+    if args.command == "migrate":
+        print(f"Скопировано строк: {await migrate(args.batch_size, args.pause, args.lock_timeout)}")
+    elif args.command == "ensure":
+        created = await message_partitions.ensure(ahead=args.ahead)
+        print("Созданы: " + (", ".join(created) if created else "нет"))
+    else:
+        async with get_engine().connect() as conn:
+            for row in await conn.execute(PARTITIONS_SQL, {"table": TABLE}):
+                print(f"{row.name:24} {row.rows_estimate:>12} {row.bound}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Помесячные секции messages")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate_cmd = sub.add_parser("migrate", help="Перенести messages в секционированную таблицу")
+    migrate_cmd.add_argument("--batch-size", type=int, default=20000)
+    migrate_cmd.add_argument("--pause", type=float, default=0.0, help="Пауза между порциями, с")
+    migrate_cmd.add_argument("--lock-timeout", default="5s", help="Сколько ждать блокировку при переключении")
+    ensure = sub.add_parser("ensure", help="Создать секции с текущего месяца вперёд")
+    ensure.add_argument("--ahead", type=int, default=settings.MESSAGE_PARTITIONS_AHEAD,
+                        help="На сколько месяцев вперёд")
+    sub.add_parser("list", help="Секции и оценка числа строк")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Поиск по истории сообщений.
+
+- полнотекстовый: сгенерированный столбец messages.search_vector (russian + english) и GIN-индекс;
+  запрос — websearch_to_tsquery, так что работают кавычки, OR и минус
+- подстрочный: ILIKE '%...%' по text_content, который ускоряет GIN-индекс pg_trgm
+  (индекс помогает начиная с 3 символов)
+"""
+
+from typing import Optional, Tuple
+
+from sqlalchemy import func, literal, or_, cast
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.sql import ColumnElement
+
+from app.models.education import Message
+
+FULLTEXT = "fulltext"
+SUBSTRING = "substring"
+
+
+def _tsquery(term: str) -> ColumnElement:
+    ru = func.websearch_to_tsquery(cast(literal("russian"), REGCONFIG), term)
+    en = func.websearch_to_tsquery(cast(literal("english"), REGCONFIG), term)
+    return ru.op("||")(en)
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def substring_clause(term: str) -> ColumnElement:
+    return Message.text_content.ilike(_like_pattern(term), escape="\\")
+
+
+def fulltext_clause(term: str) -> Tuple[ColumnElement, ColumnElement]:
+    """Условие и выражение ранга для полнотекстового поиска"""
+    query = _tsquery(term)
+    return Message.search_vector.op("@@")(query), func.ts_rank_cd(Message.search_vector, query)
+
+
+def search_clause(term: str, mode: Optional[str] = None) -> Tuple[ColumnElement, Optional[ColumnElement]]:
+    """
+    Возвращает (условие WHERE, ранг или None).
+    Без явного режима ищем и по словоформам, и по подстроке: оба условия индексируемые,
+    Postgres объединяет их через BitmapOr.
+    """
+    term = term.strip()
+    if mode == SUBSTRING:
+        return substring_clause(term), None
+    condition, rank = fulltext_clause(term)
+    if mode == FULLTEXT:
+        return condition, rank
+    return or_(condition, substring_clause(term)), rank
@@ -0,0 +1,219 @@
+"""
+Пересчёт StudentModuleProgress: total_topics, topics_completed, progress_percentage.
+
+Поля хранятся в строках прогресса и устаревают, когда в модуль добавляют или из него
+удаляют темы. Пересчёт делается одним UPDATE ... FROM на программу/модуль/всю таблицу:
+число тем считается агрегатом по topics, переписываются только строки, где что-то изменилось.
+
+topics_completed приходит от бота (какие темы пройдены, в БД не хранится), поэтому
+здесь он только ограничивается сверху новым числом тем. status не трогаем.
+
+Правки тем через TopicAdmin пересчитывают затронутые модули в фоне; после изменений
+в обход админки — CLI:
+    python -m app.services.progress recompute --program-id 1 --dry-run
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Iterable, List, Optional, Sequence, Set
+
+from sqlalchemy import text
+
+from app.core.database import async_session
+
+logger = logging.getLogger(__name__)
+
+# Ключевое ограничение на scope подставляется из фиксированного набора, параметры — через bind
+_SCOPES = {
+    "all": "TRUE",
+    "programs": "cm.program_id = ANY(CAST(:ids AS bigint[]))",
+    "modules": "cm.module_id = ANY(CAST(:ids AS bigint[]))",
+}
+
+_COMPUTED_CTE = """
+WITH totals AS (
+    SELECT cm.module_id, count(t.topic_id)::int AS total_topics
+    FROM course_modules cm
+    LEFT JOIN topics t ON t.module_id = cm.module_id
+    WHERE {scope}
+    GROUP BY cm.module_id
+), computed AS (
+    SELECT
+        p.progress_id,
+        p.student_id,
+        p.module_id,
+        p.total_topics AS old_total,
+        p.topics_completed AS old_completed,
+        p.progress_percentage AS old_percentage,
+        tt.total_topics AS new_total,
+        LEAST(COALESCE(p.topics_completed, 0), tt.total_topics) AS new_completed,
+        CASE WHEN tt.total_topics = 0 THEN 0
+             ELSE round(100.0 * LEAST(COALESCE(p.topics_completed, 0), tt.total_topics) / tt.total_topics, 2)
+        END::numeric(5, 2) AS new_percentage
+    FROM student_module_progress p
+    JOIN totals tt ON tt.module_id = p.module_id
+)
+"""
+
+_CHANGED = (
+    "(c.old_total, c.old_completed, c.old_percentage) "
+    "IS DISTINCT FROM (c.new_total, c.new_completed, c.new_percentage)"
+)
+
+DIFF_SQL = _COMPUTED_CTE + f"""
+SELECT
+    (SELECT count(*) FROM computed) AS scanned,
+    c.progress_id, c.student_id, c.module_id,
+    c.old_total, c.new_total, c.old_completed, c.new_completed, c.old_percentage, c.new_percentage
+FROM computed c
+WHERE {_CHANGED}
+ORDER BY c.module_id, c.progress_id
+"""
+
+UPDATE_SQL = _COMPUTED_CTE + f"""
+, updated AS (
+    UPDATE student_module_progress p
+    SET total_topics = c.new_total,
+        topics_completed = c.new_completed,
+        progress_percentage = c.new_percentage
+    FROM computed c
+    WHERE p.progress_id = c.progress_id AND {_CHANGED}
+    RETURNING p.progress_id
+)
+SELECT (SELECT count(*) FROM computed) AS scanned, (SELECT count(*) FROM updated) AS changed
+"""
+
+
+@dataclass
+class ProgressChange:
+    progress_id: int
+    student_id: int
+    module_id: int
+    old_total: Optional[int]
+    new_total: int
+    old_completed: Optional[int]
+    new_completed: int
+    old_percentage: Optional[Decimal]
+    new_percentage: Decimal
+
+
+@dataclass
+class RecomputeResult:
+    scope: str
+    dry_run: bool
+    rows_scanned: int = 0
+    rows_changed: int = 0
+    elapsed_ms: float = 0.0
+    # Только для dry-run: первые изменения (полный список может быть огромным)
+    changes: List[ProgressChange] = field(default_factory=list)
+
+
+async def recompute(
+    program_ids: Optional[Sequence[int]] = None,
+    module_ids: Optional[Sequence[int]] = None,
+    dry_run: bool = False,
+    sample_size: int = 20,
+) -> RecomputeResult:
+    """
+    Пересчитывает прогресс по программам, модулям или (без аргументов) по всей таблице.
+    dry_run=True ничего не пишет и возвращает, что изменилось бы.
+    """
+    if program_ids and module_ids:
+        raise ValueError("Укажите либо program_ids, либо module_ids")
+    if program_ids:
+        scope, params = "programs", {"ids": list(program_ids)}
+    elif module_ids:
+        scope, params = "modules", {"ids": list(module_ids)}
+    else:
+        scope, params = "all", {}
+
+    result = RecomputeResult(scope=scope, dry_run=dry_run)
+    started = time.perf_counter()
+    async with async_session() as session:
+        if dry_run:
+            rows = await session.execute(text(DIFF_SQL.format(scope=_SCOPES[scope])), params)
+            for row in rows:
+                result.rows_scanned = row.scanned
+                result.rows_changed += 1
+                if len(result.changes) < sample_size:
+                    result.changes.append(ProgressChange(*row[1:]))
+            if not result.rows_changed:
+                result.rows_scanned = await session.scalar(
+                    text(_COMPUTED_CTE.format(scope=_SCOPES[scope]) + "SELECT count(*) FROM computed"), params
+                )
+        else:
+            async with session.begin():
+                row = (await session.execute(text(UPDATE_SQL.format(scope=_SCOPES[scope])), params)).one()
+                result.rows_scanned, result.rows_changed = row.scanned, row.changed
+    result.elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(
+        "Progress recompute (%s%s): %s строк, изменено %s за %.1f ms",
+        scope, ", dry-run" if dry_run else "", result.rows_scanned, result.rows_changed, result.elapsed_ms,
+    )
+    return result
+
+
+class ProgressRecomputeScheduler:
+    """Фоновый пересчёт модулей после правок тем; повторные вызовы до запуска схлопываются"""
+
+    def __init__(self):
+        self._pending: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, module_ids: Iterable[Optional[int]]) -> None:
+        self._pending.update(module_id for module_id in module_ids if module_id is not None)
+        if self._pending and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(), name="progress-recompute")
+
+    async def stop(self) -> None:
+        """Дожидается запущенного пересчёта (перед закрытием соединений с БД)"""
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while self._pending:
+            module_ids, self._pending = sorted(self._pending), set()
+            try:
+                await recompute(module_ids=module_ids)
+            except Exception:
+                logger.exception("Не удалось пересчитать прогресс модулей %s", module_ids)
+
+
+progress_scheduler = ProgressRecomputeScheduler()
+
+
+async def _run(args: argparse.Namespace) -> None:
+    result = await recompute(program_ids=args.program_id, module_ids=args.module_id, dry_run=args.dry_run)
+    for change in result.changes:
+        print(
+            f"progress_id={change.progress_id} student={change.student_id} module={change.module_id}: "
+            f"тем {change.old_total} → {change.new_total}, пройдено {change.old_completed} → {change.new_completed}, "
+            f"% {change.old_percentage} → {change.new_percentage}"
+        )
+    if result.dry_run and result.rows_changed > len(result.changes):
+        print(f"... и ещё {result.rows_changed - len(result.changes)}")
+    action = "Изменилось бы" if result.dry_run else "Изменено"
+    print(f"Просмотрено строк: {result.rows_scanned}. {action}: {result.rows_changed}. "
+          f"Время: {result.elapsed_ms:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пересчёт прогресса студентов по модулям")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("recompute", help="Пересчитать total_topics/topics_completed/progress_percentage")
+    scope = run.add_mutually_exclusive_group()
+    scope.add_argument("--program-id", type=int, action="append", help="Можно указать несколько раз")
+    scope.add_argument("--module-id", type=int, action="append", help="Можно указать несколько раз")
+    run.add_argument("--dry-run", action="store_true", help="Показать изменения без записи")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Лимитер запросов к GPT: счётчики в памяти, периодическая запись в rate_limits.
+
+Проверка квоты — синхронная операция без await, поэтому в рамках event loop она атомарна
+и не ходит в БД. Накопленные приращения раз в RATE_LIMIT_FLUSH_INTERVAL секунд пишутся
+одним upsert на все затронутые (student_id, limit_date). Кроме дневной квоты действует
+token bucket на всплески (RATE_LIMIT_BURST запросов, пополнение RATE_LIMIT_REFILL_PER_MINUTE).
+
+Счётчики каждого процесса отдельные; при записи значения из БД (включая приращения других
+воркеров) возвращаются через RETURNING и подмешиваются в локальное состояние.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models.education import RateLimit
+
+logger = logging.getLogger(__name__)
+
+UPSERT_SQL = text(
+    "INSERT INTO rate_limits (student_id, limit_date, request_count) "
+    "SELECT v.student_id, v.limit_date, v.request_count "
+    "FROM unnest(CAST(:ids AS bigint[]), CAST(:dates AS date[]), CAST(:counts AS int[])) "
+    "AS v(student_id, limit_date, request_count) "
+    # Студента могли удалить, пока приращение ждало записи — такие строки пропускаем
+    "JOIN students s ON s.student_id = v.student_id "
+    "ON CONFLICT (student_id, limit_date) "
+    "DO UPDATE SET request_count = rate_limits.request_count + EXCLUDED.request_count "
+    "RETURNING student_id, limit_date, request_count"
+)
+
+
+@dataclass
+class RateDecision:
+    allowed: bool
+    remaining: int
+    retry_after: Optional[float] = None
+
+
+@dataclass
+class RateLimiterStats:
+    requests_counted: int = 0
+    requests_rejected: int = 0
+    flushes: int = 0
+    rows_written: int = 0
+    pending_rows: int = 0
+
+    @property
+    def db_writes_saved(self) -> int:
+        # Без лимитера каждый учтённый запрос — отдельный read-modify-write в rate_limits
+        return max(self.requests_counted - self.rows_written - self.pending_rows, 0)
+
+
+class RateLimiter:
+    def __init__(self, daily_limit: int, burst: int, refill_per_minute: float, flush_interval: float, tz: str):
+        self.daily_limit = daily_limit
+        self.burst = burst
+        self.refill_per_second = refill_per_minute / 60.0
+        self.flush_interval = flush_interval
+        self.tz = ZoneInfo(tz)
+        self._counts: Dict[Tuple[int, date], int] = {}
+        self._pending: Dict[Tuple[int, date], int] = {}
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self.stats = RateLimiterStats()
+
+    def today(self) -> date:
+        return datetime.now(self.tz).date()
+
+    async def start(self) -> None:
+        await self.load()
+        self._stopped = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="rate-limiter-flush")
+
+    async def stop(self) -> None:
+        # Не отменяем задачу: отмена посреди flush() потеряла бы снятые приращения
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def load(self) -> None:
+        """Восстанавливает сегодняшние счётчики из rate_limits"""
+        today = self.today()
+        async with async_session() as session:
+            rows = await session.execute(
+                select(RateLimit.student_id, RateLimit.request_count).where(RateLimit.limit_date == today)
+            )
+            self._counts = {(student_id, today): count or 0 for student_id, count in rows}
+        logger.info("Rate limiter: загружено %s счётчиков за %s", len(self._counts), today)
+
+    def check_and_consume(self, student_id: int, cost: int = 1) -> RateDecision:
+        """Проверяет квоту и, если запрос разрешён, сразу списывает его"""
+        today = self.today()
+        key = (student_id, today)
+        used = self._counts.get(key, 0)
+        if used + cost > self.daily_limit:
+            self.stats.requests_rejected += 1
+            return RateDecision(allowed=False, remaining=max(self.daily_limit - used, 0),
+                                retry_after=self._seconds_until_tomorrow())
+
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(student_id, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.refill_per_second)
+        if tokens < cost:
+            self._buckets[student_id] = (tokens, now)
+            self.stats.requests_rejected += 1
+            retry_after = (cost - tokens) / self.refill_per_second if self.refill_per_second else None
+            return RateDecision(allowed=False, remaining=self.daily_limit - used, retry_after=retry_after)
+
+        self._buckets[student_id] = (tokens - cost, now)
+        self._counts[key] = used + cost
+        self._pending[key] = self._pending.get(key, 0) + cost
+        self.stats.requests_counted += cost
+        return RateDecision(allowed=True, remaining=self.daily_limit - used - cost)
+
+    def _seconds_until_tomorrow(self) -> float:
+        now = datetime.now(self.tz)
+        midnight = datetime.combine(now.date(), datetime.min.time(), tzinfo=self.tz)
+        return 86400 - (now - midnight).total_seconds()
+
+    async def flush(self) -> None:
+        """Пишет накопленные приращения одним upsert"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        keys = list(pending)
+        try:
+            async with async_session() as session, session.begin():
+                rows = (await session.execute(UPSERT_SQL, {
+                    "ids": [student_id for student_id, _ in keys],
+                    "dates": [day for _, day in keys],
+                    "counts": [pending[key] for key in keys],
+                })).all()
+        except Exception:
+            logger.exception("Rate limiter: не удалось записать %s счётчиков", len(pending))
+            for key, delta in pending.items():
+                self._pending[key] = self._pending.get(key, 0) + delta
+            return
+
+        for student_id, day, count in rows:
+            key = (student_id, day)
+            # Значение в БД уже включает приращения других воркеров; добавляем то, что накопилось за время записи
+            self._counts[key] = count + self._pending.get(key, 0)
+        self.stats.flushes += 1
+        self.stats.rows_written += len(rows)
+        self._evict_old_days()
+
+    def _evict_old_days(self) -> None:
+        today = self.today()
+        for key in [key for key in self._counts if key[1] < today and key not in self._pending]:
+            del self._counts[key]
+        idle = time.monotonic() - self.burst / self.refill_per_second if self.refill_per_second else None
+        if idle is not None:
+            # Полностью пополненные корзины хранить незачем
+            for student_id in [sid for sid, (_, updated) in self._buckets.items() if updated < idle]:
+                del self._buckets[student_id]
+
+    async def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    def get_stats(self) -> dict:
+        self.stats.pending_rows = len(self._pending)
+        return {
+            "requests_counted": self.stats.requests_counted,
+            "requests_rejected": self.stats.requests_rejected,
+            "flushes": self.stats.flushes,
+            "rows_written": self.stats.rows_written,
+            "pending_rows": self.stats.pending_rows,
+            "db_writes_saved": self.stats.db_writes_saved,
+            "students_tracked": len(self._counts),
+        }
+
+
+rate_limiter = RateLimiter(
+    daily_limit=settings.RATE_LIMIT_DAILY,
+    burst=settings.RATE_LIMIT_BURST,
+    refill_per_minute=settings.RATE_LIMIT_REFILL_PER_MINUTE,
+    flush_interval=settings.RATE_LIMIT_FLUSH_INTERVAL,
+    tz=settings.RATE_LIMIT_TIMEZONE,
+)
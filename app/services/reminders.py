@@ -0,0 +1,309 @@
+"""
+Планировщик напоминаний о событиях расписания (ScheduleItem).
+
+Вместо периодического обхода всей schedule_items планировщик читает по индексу
+idx_schedule_items_event_date только ближайшее окно событий (REMINDER_WINDOW), держит их
+в куче по времени срабатывания (event_date - REMINDER_LEAD) и спит до ближайшего.
+Сработавшие напоминания отдаются зарегистрированным обработчикам пачками.
+
+Правки расписания через ScheduleItemAdmin доходят до планировщика без пересканирования:
+админка шлёт NOTIFY с schedule_id (и напрямую будит планировщик, если он в этом же процессе),
+планировщик перечитывает одну строку. Докуда напоминания уже отправлены, хранится
+в job_watermarks — после рестарта пропущенные напоминания досылаются, если событие
+было не раньше REMINDER_CATCH_UP назад.
+
+Планировщик работает в одном процессе: лидер выбирается сессионной advisory-блокировкой
+на выделенном соединении (через пулер в transaction mode LISTEN и блокировка не работают —
+используйте прямое подключение). event_date хранится без часового пояса и трактуется
+как время в REMINDER_TIMEZONE.
+"""
+
+import asyncio
+import heapq
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.database import async_session, get_engine
+from app.models.education import JobWatermark, ScheduleItem
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "reminders"
+CHANNEL = "schedule_items_changed"
+
+_COLUMNS = [
+    ScheduleItem.schedule_id, ScheduleItem.student_id, ScheduleItem.event_name,
+    ScheduleItem.event_date, ScheduleItem.event_type,
+]
+
+
+@dataclass(frozen=True)
+class DueReminder:
+    schedule_id: int
+    student_id: int
+    event_name: str
+    event_date: datetime
+    event_type: Optional[str]
+    fire_at: datetime
+
+
+ReminderCallback = Callable[[List[DueReminder]], Awaitable[None]]
+
+
+async def log_reminders(reminders: List[DueReminder]) -> None:
+    for reminder in reminders:
+        logger.info("Напоминание: студент %s, «%s» в %s",
+                    reminder.student_id, reminder.event_name, reminder.event_date)
+
+
+class ReminderScheduler:
+    def __init__(self, lead: float, window: float, catch_up: float, batch_size: int, tz: str):
+        self.lead = timedelta(seconds=lead)
+        self.window = timedelta(seconds=window)
+        self.catch_up = timedelta(seconds=catch_up)
+        self.batch_size = batch_size
+        self.tz = ZoneInfo(tz)
+        self._callbacks: List[ReminderCallback] = []
+        # Куча (fire_at, schedule_id, version); запись устарела, если version не совпадает с _entries
+        self._heap: List[Tuple[datetime, int, int]] = []
+        self._entries: Dict[int, Tuple[int, DueReminder]] = {}
+        self._fired: Dict[int, datetime] = {}
+        self._version = 0
+        self._loaded_until: Optional[datetime] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._reloads: Set[asyncio.Task] = set()
+        self.is_leader = False
+        self.fired_total = 0
+
+    def on_due(self, callback: ReminderCallback) -> ReminderCallback:
+        self._callbacks.append(callback)
+        return callback
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz).replace(tzinfo=None)
+
+    async def start(self) -> None:
+        self._stopped = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="reminder-scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopped.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                async with get_engine().connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    if await raw.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", JOB_NAME):
+                        try:
+                            await self._lead(raw)
+                        finally:
+                            self.is_leader = False
+                            await raw.execute("SELECT pg_advisory_unlock(hashtext($1))", JOB_NAME)
+            except Exception:
+                logger.exception("Планировщик напоминаний: ошибка, перезапуск")
+            # Не лидер или соединение потеряно — пробуем снова позже
+            await self._sleep(self.window.total_seconds() / 4)
+
+    async def _lead(self, raw) -> None:
+        self.is_leader = True
+        listening = False
+        try:
+            await raw.add_listener(CHANNEL, self._on_notify)
+            listening = True
+        except Exception:
+            logger.warning("LISTEN %s недоступен: правки из других процессов подхватятся только "
+                           "при загрузке следующего окна", CHANNEL)
+        try:
+            await self._load_initial()
+            while not self._stopped.is_set():
+                now = self.now()
+                if now + self.lead + self.window / 2 >= self._loaded_until:
+                    await self._load_window(self._loaded_until, now + self.lead + self.window)
+                due = self._pop_due(now)
+                if due:
+                    await self._fire(due)
+                    continue
+                await self._sleep(self._seconds_until_next(now))
+        finally:
+            if listening:
+                await raw.remove_listener(CHANNEL, self._on_notify)
+            self._heap.clear()
+            self._entries.clear()
+
+    async def _sleep(self, seconds: float) -> None:
+        # Событие сбрасываем после пробуждения: reload()/stop() во время обработки не теряются
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(seconds, 0.05))
+        except asyncio.TimeoutError:
+            pass
+        if not self._stopped.is_set():
+            self._wakeup.clear()
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        refresh_at = self._loaded_until - self.lead - self.window / 2
+        next_at = min(self._heap[0][0], refresh_at) if self._heap else refresh_at
+        return (next_at - now).total_seconds()
+
+    async def _load_initial(self) -> None:
+        async with async_session() as session:
+            watermark = await session.scalar(select(JobWatermark.watermark).where(JobWatermark.job_name == JOB_NAME))
+        now = self.now()
+        # event_date > начала окна догоняния: без watermark — с текущего момента
+        since = now - self.catch_up
+        if watermark is not None:
+            since = max(since, watermark.astimezone(self.tz).replace(tzinfo=None) + self.lead)
+        else:
+            since = max(since, now)
+        self._loaded_until = since
+        await self._load_window(since, now + self.lead + self.window)
+
+    async def _load_window(self, start: datetime, end: datetime) -> None:
+        """События с start < event_date <= end — диапазонное чтение по индексу event_date"""
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(*_COLUMNS)
+                .where(ScheduleItem.event_date > start, ScheduleItem.event_date <= end)
+                .order_by(ScheduleItem.event_date, ScheduleItem.schedule_id)
+            )).all()
+        for row in rows:
+            self._push(self._reminder(row))
+        self._loaded_until = end
+        logger.debug("Напоминания: загружено %s событий до %s", len(rows), end)
+
+    def _reminder(self, row) -> DueReminder:
+        return DueReminder(*row, fire_at=row.event_date - self.lead)
+
+    def _push(self, reminder: DueReminder) -> None:
+        if self._fired.get(reminder.schedule_id) == reminder.fire_at:
+            return
+        self._version += 1
+        self._entries[reminder.schedule_id] = (self._version, reminder)
+        heapq.heappush(self._heap, (reminder.fire_at, reminder.schedule_id, self._version))
+
+    def _pop_due(self, now: datetime) -> List[DueReminder]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            _, schedule_id, version = heapq.heappop(self._heap)
+            entry = self._entries.get(schedule_id)
+            if entry is None or entry[0] != version:
+                continue
+            del self._entries[schedule_id]
+            due.append(entry[1])
+        return due
+
+    async def _fire(self, reminders: List[DueReminder]) -> None:
+        for callback in self._callbacks or [log_reminders]:
+            try:
+                await callback(reminders)
+            except Exception:
+                # Не зацикливаемся на сбойной пачке: ошибка в логе, watermark двигаем дальше
+                logger.exception("Обработчик напоминаний %r упал на пачке из %s", callback, len(reminders))
+        self.fired_total += len(reminders)
+        for reminder in reminders:
+            self._fired[reminder.schedule_id] = reminder.fire_at
+        horizon = self.now() - self.catch_up - self.lead
+        self._fired = {sid: fire_at for sid, fire_at in self._fired.items() if fire_at >= horizon}
+        drained = self._drained_until(reminders)
+        if drained is not None:
+            await self._save_watermark(drained)
+
+    def _drained_until(self, reminders: List[DueReminder]) -> Optional[datetime]:
+        """
+        Последний fire_at, все напоминания которого уже отправлены. Пачка ограничена batch_size
+        и может разрезать напоминания с одним fire_at: после рестарта _load_initial читает
+        строго после watermark, так что watermark на недоотправленный fire_at их бы потерял.
+        """
+        last = max(reminder.fire_at for reminder in reminders)
+        # Устаревшие записи на вершине кучи не считаются
+        while self._heap:
+            _, schedule_id, version = self._heap[0]
+            entry = self._entries.get(schedule_id)
+            if entry is not None and entry[0] == version:
+                break
+            heapq.heappop(self._heap)
+        if not self._heap or self._heap[0][0] != last:
+            return last
+        earlier = [reminder.fire_at for reminder in reminders if reminder.fire_at < last]
+        return max(earlier) if earlier else None
+
+    async def _save_watermark(self, fire_at: datetime) -> None:
+        watermark = fire_at.replace(tzinfo=self.tz)
+        async with async_session() as session, session.begin():
+            await session.execute(
+                pg_insert(JobWatermark)
+                .values(job_name=JOB_NAME, watermark=watermark)
+                .on_conflict_do_update(
+                    index_elements=[JobWatermark.job_name],
+                    # Напоминания, перенесённые админкой на более раннее время, не откатывают watermark назад
+                    set_={"watermark": func.greatest(JobWatermark.watermark, watermark), "updated_at": func.now()},
+                )
+            )
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            schedule_id = int(payload)
+        except ValueError:
+            return
+        task = asyncio.get_running_loop().create_task(self.reload(schedule_id))
+        self._reloads.add(task)
+        task.add_done_callback(self._reloads.discard)
+
+    async def reload(self, schedule_id: int) -> None:
+        """Перечитывает одно событие после правки или удаления"""
+        if not self.is_leader:
+            return
+        async with async_session() as session:
+            row = (await session.execute(
+                select(*_COLUMNS).where(ScheduleItem.schedule_id == schedule_id)
+            )).first()
+        self._entries.pop(schedule_id, None)
+        if row is not None and self._loaded_until is not None:
+            reminder = self._reminder(row)
+            now = self.now()
+            # Вне загруженного окна — событие подхватит загрузка следующего окна; прошедшие не напоминаем
+            if row.event_date <= self._loaded_until and row.event_date > now - self.catch_up:
+                self._push(reminder)
+        self._wakeup.set()
+
+    async def notify_changed(self, schedule_id: int) -> None:
+        """Сообщает планировщику (в любом процессе) о правке события"""
+        async with async_session() as session:
+            await session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                  {"channel": CHANNEL, "payload": str(schedule_id)})
+            await session.commit()
+        if self.is_leader:
+            # Тот же процесс: не ждём доставки NOTIFY
+            await self.reload(schedule_id)
+
+    def get_stats(self) -> dict:
+        return {
+            "leader": self.is_leader,
+            "queued": len(self._entries),
+            "loaded_until": self._loaded_until,
+            "next_fire_at": self._heap[0][0] if self._heap else None,
+            "fired_total": self.fired_total,
+        }
+
+
+reminder_scheduler = ReminderScheduler(
+    lead=settings.REMINDER_LEAD,
+    window=settings.REMINDER_WINDOW,
+    catch_up=settings.REMINDER_CATCH_UP,
+    batch_size=settings.REMINDER_BATCH_SIZE,
+    tz=settings.REMINDER_TIMEZONE,
+)
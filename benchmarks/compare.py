@@ -0,0 +1,77 @@
+"""
+Сравнение двух прогонов benchmarks/run.py.
+
+    python -m benchmarks.compare before.json after.json --threshold 10
+
+Печатает по сценариям p50/p95, число запросов и пик памяти «было → стало». Код выхода 1,
+если p95 какого-либо сценария вырос больше чем на --threshold процентов (и больше чем на
+--min-delta-ms — чтобы не ловить шум на быстрых ответах) или выросло число SQL-запросов.
+"""
+
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+
+def _change(before: Optional[float], after: Optional[float]) -> str:
+    if before is None or after is None:
+        return "—"
+    if before == 0:
+        return "+0.0%" if after == 0 else "+∞"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(before: dict, after: dict, threshold: float, min_delta_ms: float) -> List[str]:
+    """Печатает таблицу и возвращает список регрессий"""
+    regressions = []
+    names = list(before["results"]) + [name for name in after["results"] if name not in before["results"]]
+    print(f"{'сценарий':45} {'p50, ms':>27} {'p95, ms':>27} {'запросы':>11} {'память':>10}")
+    for name in names:
+        old, new = before["results"].get(name), after["results"].get(name)
+        if old is None or new is None:
+            print(f"{name:45} {'только в ' + ('новом' if old is None else 'старом') + ' прогоне':>22}")
+            continue
+        old_p50, new_p50 = old["latency_ms"]["p50"], new["latency_ms"]["p50"]
+        old_p95, new_p95 = old["latency_ms"]["p95"], new["latency_ms"]["p95"]
+        old_q, new_q = old["queries"]["p50"], new["queries"]["p50"]
+        old_mem, new_mem = old.get("peak_memory_kib"), new.get("peak_memory_kib")
+        print(f"{name:45} {old_p50:8.1f} → {new_p50:8.1f} {_change(old_p50, new_p50):>7}"
+              f" {old_p95:8.1f} → {new_p95:8.1f} {_change(old_p95, new_p95):>7}"
+              f" {old_q:4g} → {new_q:<4g}"
+              f" {_change(old_mem, new_mem):>10}")
+
+        if new["status"] != old["status"]:
+            regressions.append(f"{name}: HTTP {old['status']} → {new['status']}")
+        if new_p95 - old_p95 > min_delta_ms and new_p95 > old_p95 * (1 + threshold / 100):
+            regressions.append(f"{name}: p95 {old_p95:.1f} → {new_p95:.1f} ms ({_change(old_p95, new_p95)})")
+        if new_q > old_q:
+            regressions.append(f"{name}: SQL-запросов {old_q:g} → {new_q:g}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарка")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10, help="Допустимый рост p95, %%")
+    parser.add_argument("--min-delta-ms", type=float, default=1, help="Рост p95 меньше этого не считается регрессией")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    if before["meta"].get("dataset") != after["meta"].get("dataset"):
+        print("Внимание: прогоны сделаны на разных наборах данных", file=sys.stderr)
+
+    regressions = compare(before, after, args.threshold, args.min_delta_ms)
+    if regressions:
+        print("\nРегрессии:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
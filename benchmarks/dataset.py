@@ -0,0 +1,275 @@
+"""
+Синтетический набор данных: фиксированный для бенчмарков (benchmarks/run.py) и большие
+объёмы для нагрузочного тестирования (benchmarks/generate.py).
+
+Набор детерминирован seed'ом и не зависит от числа процессов-генераторов: каждая порция
+строк (chunk) строится своим Random(f"{seed}:{table}:{chunk}"), ключи проставляются явно.
+Активность студентов распределена по Zipf с показателем skew: несколько «болтунов»
+с большой долей всех сообщений и длинный хвост почти молчащих (skew=0 — равномерно).
+message_id растёт вместе с created_at, как в рабочей базе.
+
+Модуль не импортирует приложение: порции строятся в отдельных процессах и возвращаются
+как CSV (bytes) для COPY ... (FORMAT csv) — их дёшево передавать между процессами.
+"""
+
+import csv
+import io
+import random
+from bisect import bisect_right
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Конец периода данных фиксирован: created_at не зависит от даты прогона
+EPOCH = datetime(2026, 9, 1, tzinfo=timezone.utc)
+TELEGRAM_USER_BASE = 100_000_000
+TELEGRAM_CHAT_BASE = 500_000_000
+TEXT_POOL_SIZE = 8192
+
+FIRST_NAMES = ["Иван", "Мария", "Алексей", "Ольга", "Дмитрий", "Анна", "Сергей", "Елена", "Павел", "Наталья"]
+LAST_NAMES = ["Иванов", "Петрова", "Смирнов", "Кузнецова", "Попов", "Соколова", "Лебедев", "Новикова", "Морозов", "Волкова"]
+PATRONYMICS = ["Иванович", "Сергеевна", "Алексеевич", "Дмитриевна", None]
+WORDS = [
+    "функция", "переменная", "цикл", "условие", "модуль", "тест", "задание", "лекция", "практика",
+    "ошибка", "пример", "объяснение", "проверка", "оценка", "материал", "вопрос", "ответ", "срок",
+    "класс", "объект", "список", "словарь", "строка", "число", "запрос", "база", "данные", "индекс",
+]
+MESSAGE_TYPES = ["text", "question", "answer", "command", None]
+EVENT_TYPES = ["lecture", "practice", "exam", "deadline"]
+
+Table = Tuple[Sequence[str], List[tuple]]
+
+MESSAGE_COLUMNS = ("message_id", "student_id", "role", "sender_type", "text_content", "processing_ms",
+                   "telegram_user_id", "message_type", "created_at")
+# Таблицы, которые строятся по порциям студентов, в порядке загрузки
+STUDENT_TABLES = {
+    "students": ("student_id", "first_name", "last_name", "patronymic", "phone", "program_id",
+                 "telegram_user_id", "telegram_chat_id", "status", "created_at"),
+    "student_module_progress": ("progress_id", "student_id", "module_id", "status", "topics_completed",
+                                "total_topics", "progress_percentage"),
+    "test_results": ("result_id", "student_id", "test_id", "score", "passed", "created_at"),
+    "schedule_items": ("schedule_id", "student_id", "event_name", "event_date", "event_type", "description"),
+    "feedback": ("id", "student_id", "telegram_user_id", "rating", "message_id", "comment", "created_at"),
+}
+_CHILD_TABLES = ("test_results", "schedule_items", "feedback")
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    seed: int = 42
+    programs: int = 5
+    modules_per_program: int = 6
+    topics_per_module: int = 8
+    materials_per_topic: int = 2
+    students: int = 1000
+    messages: int = 100_000
+    days: int = 30
+    # Показатель Zipf для числа сообщений на студента; 0 — равномерно
+    skew: float = 1.0
+    # Средние на студента (фактически — равномерно от 0 до удвоенного среднего)
+    test_results_per_student: float = 5
+    schedule_items_per_student: float = 5
+    feedback_per_student: float = 1
+    chunk_size: int = 50_000
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def chunk_count(self, total: int) -> int:
+        return (total + self.chunk_size - 1) // self.chunk_size
+
+    def chunk_range(self, chunk: int, total: int) -> Tuple[int, int]:
+        """Ключи [start, stop) порции, нумерация с 1"""
+        start = chunk * self.chunk_size + 1
+        return start, min(start + self.chunk_size, total + 1)
+
+
+def _rng(spec: DatasetSpec, table: str, chunk: int = 0) -> random.Random:
+    return random.Random(f"{spec.seed}:{table}:{chunk}")
+
+
+def _words(rnd: random.Random, low: int, high: int) -> Optional[str]:
+    count = rnd.randint(low, high)
+    return " ".join(rnd.choice(WORDS) for _ in range(count)) if count else None
+
+
+def _csv(rows: List[tuple]) -> bytes:
+    # None пишется пустым полем без кавычек — в FORMAT csv это NULL; пустых строк в наборе нет
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def period_start(spec: DatasetSpec) -> datetime:
+    return EPOCH - timedelta(days=spec.days)
+
+
+def student_program(spec: DatasetSpec, student_id: int) -> int:
+    return (student_id - 1) % spec.programs + 1
+
+
+def program_modules(spec: DatasetSpec, program_id: int) -> range:
+    first = (program_id - 1) * spec.modules_per_program + 1
+    return range(first, first + spec.modules_per_program)
+
+
+def curriculum(spec: DatasetSpec) -> Dict[str, Table]:
+    """Программы, модули, темы, материалы и тесты — маленькие таблицы, строятся целиком"""
+    rnd = _rng(spec, "curriculum")
+    programs = [
+        (pid, f"Программа {pid}", _words(rnd, 5, 15), rnd.randint(72, 256), EPOCH - timedelta(days=365))
+        for pid in range(1, spec.programs + 1)
+    ]
+    modules, topics, materials, tests = [], [], [], []
+    for pid in range(1, spec.programs + 1):
+        for order, mid in enumerate(program_modules(spec, pid), start=1):
+            modules.append((mid, pid, f"Модуль {order}: {rnd.choice(WORDS)}", _words(rnd, 5, 20), order, 24, 8, 8, 8))
+            # test_id совпадает с module_id: по одному тесту на модуль
+            tests.append((mid, mid, f"Тест по модулю {mid}", _words(rnd, 3, 10), 60, 3, 30, True))
+            for topic_order in range(1, spec.topics_per_module + 1):
+                tid = len(topics) + 1
+                topics.append((tid, mid, f"Тема {topic_order}: {rnd.choice(WORDS)}", _words(rnd, 5, 20),
+                               topic_order, 2, 2, 2, topic_order == spec.topics_per_module, False))
+                for material_order in range(1, spec.materials_per_topic + 1):
+                    materials.append((len(materials) + 1, pid, mid, tid, f"Материал {tid}.{material_order}",
+                                      _words(rnd, 50, 200), None, "text", material_order, rnd.random() < 0.5))
+    return {
+        "programs": (("program_id", "name", "description", "total_hours", "created_at"), programs),
+        "course_modules": (("module_id", "program_id", "name", "description", "order_index", "total_hours",
+                            "lecture_hours", "practice_hours", "self_study_hours"), modules),
+        "topics": (("topic_id", "module_id", "name", "description", "order_index", "lecture_hours",
+                    "practice_hours", "self_study_hours", "is_intermediate_assessment", "is_final_assessment"), topics),
+        "course_materials": (("material_id", "program_id", "module_id", "topic_id", "title", "content",
+                              "external_url", "material_type", "order_index", "is_public"), materials),
+        "attestation_tests": (("test_id", "module_id", "title", "description", "passing_score", "max_attempts",
+                               "time_limit_minutes", "is_active"), tests),
+    }
+
+
+@lru_cache(maxsize=4)
+def _child_counts(spec: DatasetSpec) -> Dict[str, Tuple[List[int], List[int]]]:
+    """
+    Число строк дочерних таблиц у каждого студента и первый ключ его строк (префиксные суммы).
+    Считается целиком в каждом процессе — так ключи не зависят от порядка загрузки порций.
+    """
+    rnd = _rng(spec, "counts")
+    means = {
+        "test_results": spec.test_results_per_student,
+        "schedule_items": spec.schedule_items_per_student,
+        "feedback": spec.feedback_per_student,
+    }
+    result = {}
+    for table in _CHILD_TABLES:
+        counts = [round(rnd.random() * 2 * means[table]) for _ in range(spec.students)]
+        result[table] = (counts, list(accumulate(counts, initial=1))[:-1])
+    return result
+
+
+def row_totals(spec: DatasetSpec) -> Dict[str, int]:
+    """Ожидаемое число строк по таблицам (rate_limits не входят: выводятся из сообщений)"""
+    totals = {table: len(rows) for table, (_, rows) in curriculum(spec).items()}
+    totals["students"] = spec.students
+    totals["student_module_progress"] = spec.students * spec.modules_per_program
+    for table, (counts, _) in _child_counts(spec).items():
+        totals[table] = sum(counts)
+    totals["messages"] = spec.messages
+    return totals
+
+
+def student_chunk(spec: DatasetSpec, chunk: int) -> Dict[str, bytes]:
+    """Студенты порции и все их дочерние строки (кроме сообщений), CSV по таблицам"""
+    rnd = _rng(spec, "students", chunk)
+    start, stop = spec.chunk_range(chunk, spec.students)
+    children = _child_counts(spec)
+    begin = period_start(spec)
+    period = spec.days * 86400
+    tables: Dict[str, List[tuple]] = {table: [] for table in STUDENT_TABLES}
+
+    for sid in range(start, stop):
+        index = sid - 1
+        pid = student_program(spec, sid)
+        modules = program_modules(spec, pid)
+        tables["students"].append((
+            sid, rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES), rnd.choice(PATRONYMICS),
+            # Телефон и Telegram-идентификаторы уникальны по построению
+            f"+79{sid:09d}", pid, TELEGRAM_USER_BASE + sid, TELEGRAM_CHAT_BASE + sid,
+            "active" if rnd.random() < 0.9 else "inactive",
+            begin - timedelta(seconds=rnd.randrange(period * 3)),
+        ))
+
+        for offset, mid in enumerate(modules):
+            done = rnd.randint(0, spec.topics_per_module)
+            status = "completed" if done == spec.topics_per_module else ("in_progress" if done else "not_started")
+            percentage = Decimal(100 * done / spec.topics_per_module).quantize(Decimal("0.01"))
+            tables["student_module_progress"].append((
+                index * spec.modules_per_program + offset + 1, sid, mid, status, done, spec.topics_per_module, percentage,
+            ))
+
+        counts, first_ids = children["test_results"]
+        for n in range(counts[index]):
+            score = rnd.randint(0, 100)
+            tables["test_results"].append((
+                first_ids[index] + n, sid, rnd.choice(modules), score, score >= 60,
+                begin + timedelta(seconds=rnd.randrange(period)),
+            ))
+
+        counts, first_ids = children["schedule_items"]
+        for n in range(counts[index]):
+            event_date = begin + timedelta(days=rnd.randint(0, 2 * spec.days), hours=rnd.randint(9, 20))
+            tables["schedule_items"].append((
+                first_ids[index] + n, sid, f"Занятие: {rnd.choice(WORDS)}", event_date.replace(tzinfo=None),
+                rnd.choice(EVENT_TYPES), _words(rnd, 0, 10),
+            ))
+
+        counts, first_ids = children["feedback"]
+        for n in range(counts[index]):
+            tables["feedback"].append((
+                first_ids[index] + n, sid, TELEGRAM_USER_BASE + sid, rnd.randint(1, 5),
+                rnd.randint(1, spec.messages) if spec.messages else None, _words(rnd, 0, 15),
+                (begin + timedelta(seconds=rnd.randrange(period))).replace(tzinfo=None),
+            ))
+
+    return {table: _csv(rows) for table, rows in tables.items()}
+
+
+@lru_cache(maxsize=4)
+def _activity(spec: DatasetSpec) -> Tuple[List[int], List[float]]:
+    """Студенты, перемешанные seed'ом, и накопленные веса Zipf: первый в списке — самый активный"""
+    population = list(range(1, spec.students + 1))
+    _rng(spec, "activity").shuffle(population)
+    return population, list(accumulate(1 / rank ** spec.skew for rank in range(1, spec.students + 1)))
+
+
+@lru_cache(maxsize=4)
+def _text_pool(spec: DatasetSpec) -> List[str]:
+    rnd = _rng(spec, "texts")
+    return [_words(rnd, 3, 40) for _ in range(TEXT_POOL_SIZE)]
+
+
+def message_chunk(spec: DatasetSpec, chunk: int) -> bytes:
+    """Сообщения порции в CSV: студент по Zipf, created_at растёт вместе с message_id"""
+    rnd = _rng(spec, "messages", chunk)
+    start, stop = spec.chunk_range(chunk, spec.messages)
+    population, cum_weights = _activity(spec)
+    total_weight = cum_weights[-1]
+    texts = _text_pool(spec)
+    begin = period_start(spec)
+    step = spec.days * 86400 / spec.messages
+    uniform = rnd.random
+
+    rows = []
+    for message_id in range(start, stop):
+        sid = population[bisect_right(cum_weights, uniform() * total_weight)]
+        created_at = begin + timedelta(seconds=(message_id - 1 + uniform()) * step)
+        if uniform() < 0.5:
+            role, sender, processing_ms = "user", "student", 0
+        else:
+            role, sender, processing_ms = "assistant", "bot", int(rnd.lognormvariate(6.5, 0.6))
+        rows.append((
+            message_id, sid, role, sender, texts[int(uniform() * TEXT_POOL_SIZE)], processing_ms,
+            TELEGRAM_USER_BASE + sid, MESSAGE_TYPES[int(uniform() * len(MESSAGE_TYPES))], created_at,
+        ))
+    return _csv(rows)